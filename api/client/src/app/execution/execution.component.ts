@@ -178,6 +178,11 @@ export class ExecutionComponent implements OnInit, AfterViewChecked, OnDestroy {
 			console.log(event);
 			this.workflowStatusEventHandler(event)
 		});
+
+		this.workflowStatusSocket.on('logs', (data: any[]) => {
+			const events = plainToClass(WorkflowStatus, data);
+			events.forEach(event => this.workflowStatusEventHandler(event));
+		});
 	}
 
 	/**
@@ -190,7 +195,8 @@ export class ExecutionComponent implements OnInit, AfterViewChecked, OnDestroy {
 
 		if (matchingWorkflowStatus) {
 			matchingWorkflowStatus.status = workflowStatus.status;
-			matchingWorkflowStatus.node_statuses = workflowStatus.node_statuses;
+			// Batched updates leave node statuses out, they arrive on the node status socket
+			if (workflowStatus.node_statuses) matchingWorkflowStatus.node_statuses = workflowStatus.node_statuses;
 
 			switch (workflowStatus.status) {
 				case WorkflowStatuses.PENDING:
@@ -241,6 +247,11 @@ export class ExecutionComponent implements OnInit, AfterViewChecked, OnDestroy {
 			console.log(event);
 			this.nodeStatusEventHandler(event)
 		});
+
+		this.nodeStatusSocket.on('logs', (data: any[]) => {
+			const events = plainToClass(NodeStatus, data);
+			events.forEach(event => this.nodeStatusEventHandler(event));
+		});
 	}
 
 	/**
@@ -77,6 +77,11 @@ export class PlaybookComponent implements OnInit, OnDestroy {
 			console.log(event);
 			this.workflowStatusEventHandler(event, executionId)
 		});
+
+		this.workflowStatusSocket.on('logs', (data: any[]) => {
+			const events = plainToClass(WorkflowStatus, data);
+			events.forEach(event => this.workflowStatusEventHandler(event, executionId));
+		});
 	}
 
 	/**
@@ -359,6 +359,11 @@ export class WorkflowEditorComponent implements OnInit, AfterViewChecked, OnDest
 			console.log('action', event);
 			this.nodeStatusEventHandler(event)
 		});
+
+		this.nodeStatusSocket.on('logs', (data) => {
+			const events = plainToClass(NodeStatus, (data as any[]));
+			events.forEach(event => this.nodeStatusEventHandler(event));
+		});
 	}
 
 	/**
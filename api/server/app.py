@@ -17,7 +17,7 @@ from api.server.endpoints import (appapi, auth, dashboards, global_variables, re
                                   settings, umpire, users, workflowqueue, workflows)
 from api.server.scheduler import Scheduler
 from api.server.security import (get_raw_jwt, verify_token_in_decoded, verify_token_not_blacklisted,
-                                 user_has_correct_roles, get_roles_by_resource_permission)
+                                 user_has_correct_roles, get_roles_by_resource_permission, auth_cache)
 from api.server.utils.problems import ProblemException
 from api.server.utils.socketio import sio, init_sio
 from common.minio_helper import push_all_apps_to_minio
@@ -76,6 +76,11 @@ async def workflow_results_listener():
     asyncio.create_task(results.update_workflow_status())
 
 
+@_app.on_event("startup")
+async def auth_cache_listener():
+    asyncio.create_task(auth_cache.listen())
+
+
 @_app.on_event("shutdown")
 async def close_connections():
     await sio.disconnect()
@@ -113,7 +118,7 @@ async def permissions_accepted_for_resource_middleware(request: Request, call_ne
         request_method = request.method
         accepted_roles = set()
         resource_permission = ""
-        gated_endpoints = ["users", "roles", "apps", "scheduler", "umpire", "dashboards", "settings"]
+        gated_endpoints = ["users", "roles", "apps", "scheduler", "umpire", "dashboards", "settings", "results"]
 
         # move_on = ["personal_user", "umpire", "globals", "workflows", "console", "auth", "workflowqueue", "appapi",
         #            "streams", "docs", "redoc", "openapi.json", ""]
@@ -265,6 +270,11 @@ _walkoff.include_router(workflows.router,
                         tags=["workflows"],
                         dependencies=[Depends(get_mongo_c)])
 
+_walkoff.include_router(results.router,
+                        prefix="/results",
+                        tags=["results"],
+                        dependencies=[Depends(get_mongo_c)])
+
 
 @_app.get("/walkoff/login")
 async def login_page():
@@ -58,6 +58,12 @@ class MongoManager(object):
             role_d = roles_col.find_one({"id_": role["id_"]})
             if not role_d:
                 roles_col.insert_one(role)
+            else:
+                # Default roles created by an older release lack resources added since, e.g. results
+                existing = {resource["name"] for resource in role_d.get("resources", [])}
+                missing = [resource for resource in role["resources"] if resource["name"] not in existing]
+                if missing:
+                    roles_col.update_one({"id_": role["id_"]}, {"$push": {"resources": {"$each": missing}}})
 
         for user_name, user in default_users.items():
             user_d = users_col.find_one({"id_": user["id_"]})
@@ -4,10 +4,10 @@ from typing import List
 from uuid import UUID
 
 from pydantic import BaseModel
+from starlette.requests import Request
 
-from api.server.db.user import UserModel
 from api.server.db.user_init import DefaultRoleUUID
-from common import async_mongo_helpers as mongo_helpers
+from api.server.security import auth_cache, get_jwt_identity
 
 logger = logging.getLogger("API")
 
@@ -85,22 +85,39 @@ async def default_permissions(curr_user_id, walkoff_db, resource_name):
                             role_permissions=role_permissions)
 
 
+class AuthContext:
+    """ The current user and their roles, loaded once and then used to answer any number of permission checks """
+
+    def __init__(self, user_id: UUID, roles):
+        self.user_id = user_id
+        self.roles = set(roles)
+
+    def check(self, resource, permission: str):
+        if resource:
+            permission_model = resource.permissions
+            if permission_model.creator == self.user_id:
+                return True
+            role_permissions = permission_model.role_permissions
+            for role_perm_elem in role_permissions:
+                if role_perm_elem.role in self.roles:
+                    if permission in role_perm_elem.permissions:
+                        return True
+
+            return False
+
+        else:
+            return False
+
+
+async def get_auth_context(request: Request, walkoff_db):
+    """ Returns the AuthContext of the request's user, which is only looked up on the first call for a request """
+    auth = getattr(request.state, "auth_context", None)
+    if auth is None:
+        curr_user_id = await get_jwt_identity(request)
+        auth = request.state.auth_context = AuthContext(curr_user_id, await auth_cache.roles_of(curr_user_id,
+                                                                                                 walkoff_db))
+    return auth
+
+
 async def auth_check(resource, curr_user_id: UUID, permission: str, walkoff_db):
-    user_col = walkoff_db.users
-    curr_user = await mongo_helpers.get_item(user_col, UserModel, curr_user_id)
-    curr_roles = curr_user.roles
-
-    if resource:
-        permission_model = resource.permissions
-        if permission_model.creator == curr_user_id:
-            return True
-        role_permissions = permission_model.role_permissions
-        for role_perm_elem in role_permissions:
-            if role_perm_elem.role in curr_roles:
-                if permission in role_perm_elem.permissions:
-                    return True
-
-        return False
-
-    else:
-        return False
+    return AuthContext(curr_user_id, await auth_cache.roles_of(curr_user_id, walkoff_db)).check(resource, permission)
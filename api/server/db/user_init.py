@@ -15,7 +15,8 @@ default_resource_permissions_internal_user = [
     {"name": "roles", "permissions": ["create", "read", "update", "delete"]},
     {"name": "scheduler", "permissions": ["create", "read", "update", "delete", "execute"]},
     {"name": "users", "permissions": ["create", "read", "update", "delete"]},
-    {"name": "umpire", "permissions": ["create", "read", "update", "delete"]}
+    {"name": "umpire", "permissions": ["create", "read", "update", "delete"]},
+    {"name": "results", "permissions": ["read"]}
 ]
 
 default_resource_permissions_super_admin = [
@@ -30,7 +31,8 @@ default_resource_permissions_super_admin = [
     {"name": "roles", "permissions": ["create", "read", "update", "delete"]},
     {"name": "scheduler", "permissions": ["create", "read", "update", "delete", "execute"]},
     {"name": "users", "permissions": ["create", "read", "update", "delete"]},
-    {"name": "umpire", "permissions": ["create", "read", "update", "delete"]}
+    {"name": "umpire", "permissions": ["create", "read", "update", "delete"]},
+    {"name": "results", "permissions": ["read"]}
 ]
 
 default_resource_permissions_admin = [
@@ -45,7 +47,8 @@ default_resource_permissions_admin = [
     {"name": "roles", "permissions": ["create", "read", "update", "delete"]},
     {"name": "scheduler", "permissions": ["create", "read", "update", "delete", "execute"]},
     {"name": "users", "permissions": ["create", "read", "update", "delete"]},
-    {"name": "umpire", "permissions": ["create", "read", "update", "delete"]}
+    {"name": "umpire", "permissions": ["create", "read", "update", "delete"]},
+    {"name": "results", "permissions": ["read"]}
 ]
 
 default_resource_permissions_app_developer = [
@@ -60,7 +63,8 @@ default_resource_permissions_app_developer = [
     {"name": "roles", "permissions": ["read"]},
     {"name": "scheduler", "permissions": ["create", "read", "update", "delete", "execute"]},
     {"name": "users", "permissions": ["read"]},
-    {"name": "umpire", "permissions": ["create", "read", "update", "delete"]}
+    {"name": "umpire", "permissions": ["create", "read", "update", "delete"]},
+    {"name": "results", "permissions": []}
 ]
 
 default_resource_permissions_workflow_developer = [
@@ -75,7 +79,8 @@ default_resource_permissions_workflow_developer = [
     {"name": "roles", "permissions": ["read"]},
     {"name": "scheduler", "permissions": ["create", "read", "update", "delete", "execute"]},
     {"name": "users", "permissions": ["read"]},
-    {"name": "umpire", "permissions": ["read"]}
+    {"name": "umpire", "permissions": ["read"]},
+    {"name": "results", "permissions": []}
 ]
 
 default_resource_permissions_workflow_operator = [
@@ -90,7 +95,8 @@ default_resource_permissions_workflow_operator = [
     {"name": "roles", "permissions": ["read"]},
     {"name": "scheduler", "permissions": ["read"]},
     {"name": "users", "permissions": ["read"]},
-    {"name": "umpire", "permissions": []}
+    {"name": "umpire", "permissions": []},
+    {"name": "results", "permissions": []}
 ]
 
 
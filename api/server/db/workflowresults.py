@@ -15,6 +15,7 @@ class UpdateMessage(BaseModel):
     workflow_id: UUID
     message: str
     type: str
+    node_id: UUID = None
 
 
 class NodeStatus(BaseModel):
@@ -11,7 +11,7 @@ from api.server.db.user import UserModel
 from api.server.fastapi_config import FastApiConfig
 from api.server.security import (create_access_token, create_refresh_token, get_jwt_identity,
                                  get_raw_jwt, decode_token, verify_jwt_refresh_token_in_request,
-                                 verify_token_in_decoded, verify_token_not_blacklisted)
+                                 verify_token_in_decoded, verify_token_not_blacklisted, publish_auth_change)
 from api.server.utils.problems import ProblemException
 from common import async_mongo_helpers as mongo_helpers
 
@@ -83,7 +83,9 @@ async def refresh(*, walkoff_db: AsyncIOMotorDatabase = Depends(get_mongo_d),
     user = await mongo_helpers.get_item(user_col, UserModel, current_user_id, raise_exc=False)
 
     if user is None:
-        await revoke_token(decoded_token=await get_raw_jwt(request), walkoff_db=walkoff_db)
+        decoded_token = await get_raw_jwt(request)
+        await revoke_token(decoded_token=decoded_token, walkoff_db=walkoff_db)
+        await publish_auth_change(f"revoked:{decoded_token['jti']}")
         raise ProblemException(
             HTTPStatus.UNAUTHORIZED,
             "Could not grant access token.",
@@ -118,6 +120,7 @@ async def logout(json_in: TokenModel, request: Request, walkoff_db: AsyncIOMotor
         if user is not None:
             await user.logout()
         await revoke_token(walkoff_db=walkoff_db, decoded_token=decoded_refresh_token)
+        await publish_auth_change(f"revoked:{decoded_refresh_token['jti']}")
         return None
     else:
         raise ProblemException(
@@ -4,52 +4,63 @@ from copy import deepcopy
 from typing import List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from motor.motor_asyncio import AsyncIOMotorCollection
 from starlette.requests import Request
 
 from api.server.db.global_variable import GlobalVariable
 from api.server.db.mongo import get_mongo_c, get_mongo_d
-from api.server.db.permissions import auth_check, default_permissions, creator_only_permissions, AccessLevel, \
+from api.server.db.permissions import get_auth_context, default_permissions, creator_only_permissions, AccessLevel, \
     append_super_and_internal
 from api.server.security import get_jwt_identity
 from api.server.utils.problems import UniquenessException, UnauthorizedException, DoesNotExistException
 from common import async_mongo_helpers as mongo_helpers
-from common.config import config
+from common.config import config, static
 from common.helpers import fernet_encrypt, fernet_decrypt
+from common.redis_helpers import connect_to_aioredis_pool
 
 logger = logging.getLogger("API")
 
 router = APIRouter()
 
 
+async def bump_globals_version():
+    """ Tells workers that any globals they have cached are now stale """
+    async with connect_to_aioredis_pool(config.REDIS_URI) as conn:
+        await conn.incr(static.REDIS_GLOBALS_VERSION)
+
+
 @router.get("/",
             response_model=List[GlobalVariable],
             response_description="List of all Global Variables currently loaded in WALKOFF",
             status_code=200)
 async def read_all_globals(request: Request, to_decrypt: str = False,
                            global_col: AsyncIOMotorCollection = Depends(get_mongo_c),
-                           page: int = 1):
+                           page: int = 1, ids: List[UUID] = Query(None)):
     """
-    Returns a list of all Global Variables currently loaded in WALKOFF.
+    Returns a list of all Global Variables currently loaded in WALKOFF, or only those in ids if given.
     Pagination is currently not supported.
     """
     walkoff_db = get_mongo_d(request)
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
     # Pagination is currently not supported.
     if page > 1:
         return []
 
     key = config.get_from_file(config.ENCRYPTION_KEY_PATH, mode='rb')
-    query = await mongo_helpers.get_all_items(global_col, GlobalVariable)
+    if ids:
+        query = await mongo_helpers.get_all_items(global_col, GlobalVariable, query={"id_": {"$in": ids}},
+                                                  num_per_page=len(ids))
+    else:
+        query = await mongo_helpers.get_all_items(global_col, GlobalVariable)
 
     ret = []
     if to_decrypt == "false":
         return query
     else:
         for global_var in query:
-            to_read = await auth_check(global_var, curr_user_id, "read", walkoff_db)
+            to_read = auth.check(global_var, "read")
             if to_read:
                 temp_var = deepcopy(global_var)
                 temp_var.value = fernet_decrypt(key, global_var.value)
@@ -68,11 +79,11 @@ async def read_global(request: Request, global_var: UUID, to_decrypt: str = "fal
     Returns the Global Variable for the specified id.
     """
     walkoff_db = get_mongo_d(request)
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
     global_variable = await mongo_helpers.get_item(global_col, GlobalVariable, global_var)
 
-    to_read = await auth_check(global_variable, curr_user_id, "read", walkoff_db)
+    to_read = auth.check(global_variable, "read")
     if to_read:
         if to_decrypt == "false":
             return global_variable.value
@@ -93,16 +104,18 @@ async def delete_global(request: Request, global_var: UUID,
     Deletes a specific Global Variable (fetched by id).
     """
     walkoff_db = get_mongo_d(request)
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
     global_variable = await mongo_helpers.get_item(global_col, GlobalVariable, global_var)
     if not global_variable:
         raise DoesNotExistException("delete", "Global Variable", global_var)
     global_id = global_variable.id_
 
-    to_delete = await auth_check(global_variable, curr_user_id, "delete", walkoff_db)
+    to_delete = auth.check(global_variable, "delete")
     if to_delete:
-        return await mongo_helpers.delete_item(global_col, GlobalVariable, global_id)
+        deleted = await mongo_helpers.delete_item(global_col, GlobalVariable, global_id)
+        await bump_globals_version()
+        return deleted
     else:
         raise UnauthorizedException("delete data for", "Global Variable", global_variable.name)
 
@@ -131,10 +144,12 @@ async def create_global(request: Request, new_global: GlobalVariable,
     try:
         key = config.get_from_file(config.ENCRYPTION_KEY_PATH, mode='rb')
         new_global.value = fernet_encrypt(key, new_global.value)
-        return await mongo_helpers.create_item(global_col, GlobalVariable, new_global)
+        created = await mongo_helpers.create_item(global_col, GlobalVariable, new_global)
     except Exception as e:
         logger.info(e)
         raise UniquenessException("global_variable", "create", new_global.name)
+    await bump_globals_version()
+    return created
 
 
 @router.put("/{global_var}",
@@ -148,6 +163,7 @@ async def update_global(request: Request, updated_global: GlobalVariable, global
     """
     walkoff_db = get_mongo_d(request)
     curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
     old_global = await mongo_helpers.get_item(global_col, GlobalVariable, global_var)
     if not old_global:
@@ -157,7 +173,7 @@ async def update_global(request: Request, updated_global: GlobalVariable, global
     new_permissions = updated_global.permissions
     access_level = new_permissions.access_level
 
-    to_update = await auth_check(old_global, curr_user_id, "update", walkoff_db)
+    to_update = auth.check(old_global, "update")
     if to_update:
         if access_level == AccessLevel.CREATOR_ONLY:
             updated_global.permissions = await creator_only_permissions(curr_user_id)
@@ -170,7 +186,9 @@ async def update_global(request: Request, updated_global: GlobalVariable, global
         # try:
         key = config.get_from_file(config.ENCRYPTION_KEY_PATH, mode='rb')
         updated_global.value = fernet_encrypt(key, updated_global.value)
-        return await mongo_helpers.update_item(global_col, GlobalVariable, global_id, updated_global)
+        updated = await mongo_helpers.update_item(global_col, GlobalVariable, global_id, updated_global)
+        await bump_globals_version()
+        return updated
         # except Exception as e:
         #     logger.info(e)
         #     raise UniquenessException("global_variable", "update", updated_global.name)
@@ -1,52 +1,267 @@
+import asyncio
 import json
 import logging
-import re
+import math
+import os
+import socket
+import time
 import traceback
+import zlib
+from typing import Dict
+from uuid import UUID
 
-import jsonpatch
+import aioredis
 from fastapi import APIRouter
+from pymongo import UpdateOne
 
 from api.server.db.mongo import mongo
 from api.server.db.workflowresults import WorkflowStatus, UpdateMessage
-from api.server.utils.socketio import sio
-from common import async_mongo_helpers as mongo_helpers
+from api.server.utils.socketio import status_emitter
 from common.config import config, static
-from common.redis_helpers import connect_to_aioredis_pool
+from common.helpers import mongo_update_from_patches
+from common.message_types import StatusEnum
+from common.redis_helpers import connect_to_aioredis_pool, results_partitions, xack_xdel
 
 logger = logging.getLogger("API")
 router = APIRouter()
 
 WORKFLOW_STREAM_GLOB = "workflow_stream"
 ACTION_STREAM_GLOB = "action_stream"
+FINISHED = (StatusEnum.COMPLETED.value, StatusEnum.ABORTED.value)
 
 
 async def update_workflow_status():
     async with connect_to_aioredis_pool(config.REDIS_URI) as redis:
-        wfq_col = mongo.async_client.walkoff_db.workflowqueue
-        node_id_regex = r"/node_statuses/([0-9a-f]{8}\-[0-9a-f]{4}\-[0-9a-f]{4}\-[0-9a-f]{4}\-[0-9a-f]{12})"
+        await ResultsConsumer(redis, mongo.async_client.walkoff_db.workflowqueue).run()
+
+
+@router.get("/lag", response_model=Dict[UUID, int],
+            response_description="Milliseconds between each execution's last status update being sent and written")
+async def read_results_lag():
+    async with connect_to_aioredis_pool(config.REDIS_URI) as redis:
+        lag = await redis.hgetall(static.REDIS_RESULTS_LAG)
+    return {execution_id.decode(): int(ms) for execution_id, ms in lag.items()}
+
+
+# Only the lease holder may renew or give up a lease
+RENEW_LEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class ResultsConsumer:
+    """
+        Writes status updates from the results queue partitions this API process holds a lease on. A partition is owned
+        by one process at a time so each execution's updates are written in order, and the partitions are shared out
+        evenly between the live API processes. Updates are only acked once written to Mongo. Anything a previous owner
+        read but didn't ack is claimed and replayed before new updates are read, which is safe as the same $sets are
+        applied again in the same order.
+    """
+    def __init__(self, redis, wfq_col, name=None):
+        self.redis = redis
+        self.wfq_col = wfq_col
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.partitions = results_partitions()
+        self.batch_size = max(config.get_int("API_RESULTS_BATCH_SIZE", 500), 1)
+        self.lease_ms = int(config.get_float("API_RESULTS_LEASE", 10) * 1000)
+        self.owned = set()
+        self.replaying = set()  # owned partitions with updates read by this or a previous owner but not yet acked
+
+    @staticmethod
+    def lease_key(partition):
+        return f"{partition}:owner"
+
+    async def run(self):
+        for partition in self.partitions:
+            try:
+                await self.redis.xgroup_create(partition, static.REDIS_RESULTS_GROUP, latest_id="0", mkstream=True)
+            except aioredis.ReplyError as e:
+                logger.debug(f"Issue creating results group for {partition}: {e!r}")
+
+        interval = self.lease_ms / 3000
+        balanced_at = None
         while True:
             try:
+                now = time.monotonic()
+                if balanced_at is None or now - balanced_at >= interval:
+                    await self.balance()
+                    balanced_at = now
+
+                if len(self.owned) < 1:
+                    await asyncio.sleep(interval)
+                    continue
+
                 logger.debug("Waiting for results...")
-                message = (await redis.brpop(static.REDIS_RESULTS_QUEUE))[1]
-                message = UpdateMessage(**json.loads(message.decode()))
-
-                old_workflow_status = await mongo_helpers.get_item(wfq_col, WorkflowStatus, message.execution_id,
-                                                                   id_key="execution_id")
-                patch = jsonpatch.JsonPatch.from_string(message.message)
-                new_workflow_status = WorkflowStatus(**patch.apply(old_workflow_status.dict()))
-                update_wfs: WorkflowStatus = await mongo_helpers.update_item(wfq_col, WorkflowStatus,
-                                                                             message.execution_id,
-                                                                             new_workflow_status,
-                                                                             id_key="execution_id")
-
-                if message.type == "workflow":
-                    update_wfs.to_response()
-                    await sio.emit(static.SIO_EVENT_LOG, json.loads(update_wfs.json()),
-                                   namespace=static.SIO_NS_WORKFLOW)
-                else:
-                    for patch in json.loads(message.message):
-                        node_id = re.search(node_id_regex, patch["path"], re.IGNORECASE).group(1)
-                        await sio.emit(static.SIO_EVENT_LOG, json.loads(update_wfs.node_statuses[node_id].json()),
-                                       namespace=static.SIO_NS_NODE)
-            except Exception as e:
+                await self.consume(int(interval * 1000))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
                 traceback.print_exc()
+
+    async def balance(self):
+        """ Renews the leases held, then takes or gives up partitions so this process owns its fair share of them """
+        now = await self.redis.time()
+        await self.redis.zadd(static.REDIS_RESULTS_CONSUMERS, now, self.name)
+        await self.redis.zremrangebyscore(static.REDIS_RESULTS_CONSUMERS, max=now - self.lease_ms / 1000)
+        share = math.ceil(len(self.partitions) / max(await self.redis.zcard(static.REDIS_RESULTS_CONSUMERS), 1))
+
+        for partition in list(self.owned):
+            if not await self.redis.eval(RENEW_LEASE, keys=[self.lease_key(partition)], args=[self.name, self.lease_ms]):
+                logger.info(f"Lost the lease on {partition}")
+                self.owned.discard(partition)
+                self.replaying.discard(partition)
+
+        while len(self.owned) > share:
+            partition = self.owned.pop()
+            self.replaying.discard(partition)
+            await self.redis.eval(RELEASE_LEASE, keys=[self.lease_key(partition)], args=[self.name])
+            logger.info(f"Released {partition}")
+
+        # Each process starts from a different partition so they don't all race for the same leases
+        start = zlib.crc32(self.name.encode()) % len(self.partitions)
+        for partition in self.partitions[start:] + self.partitions[:start]:
+            if len(self.owned) >= share:
+                break
+            if partition not in self.owned and await self.redis.set(self.lease_key(partition), self.name,
+                                                                    pexpire=self.lease_ms,
+                                                                    exist=self.redis.SET_IF_NOT_EXIST):
+                logger.info(f"Acquired {partition}")
+                self.owned.add(partition)
+                await self.reclaim(partition)
+
+    async def reclaim(self, partition):
+        """ Claims the updates other consumers read from partition but never acked, so they're replayed first """
+        start = "-"
+        while True:
+            pending = await self.redis.xpending(partition, static.REDIS_RESULTS_GROUP, start, "+", self.batch_size)
+            if len(pending) < 1:
+                break
+            others = [id_ for id_, consumer, _, _ in pending if consumer.decode() != self.name]
+            if len(others) > 0:
+                await self.redis.xclaim(partition, static.REDIS_RESULTS_GROUP, self.name, 0, *others)
+            ms, seq = pending[-1][0].decode().split("-")
+            start = f"{ms}-{int(seq) + 1}"
+        self.replaying.add(partition)
+
+    async def consume(self, timeout):
+        """ Writes one batch of updates from the owned partitions, replaying any that were never acked first """
+        messages = []
+        if len(self.replaying) > 0:
+            streams = sorted(self.replaying)
+            messages = await self.redis.xread_group(static.REDIS_RESULTS_GROUP, self.name, streams=streams,
+                                                    count=self.batch_size, latest_ids=["0"] * len(streams))
+            self.replaying -= set(streams) - {stream.decode() for stream, _, _ in messages}
+
+        if len(messages) < 1:
+            streams = sorted(self.owned)
+            # Blocking reads need their own connection so they don't stall the other users of the pool
+            with await self.redis as conn:
+                messages = await conn.xread_group(static.REDIS_RESULTS_GROUP, self.name, streams=streams,
+                                                  count=max(self.batch_size // len(streams), 1), timeout=timeout,
+                                                  latest_ids=[">"] * len(streams))
+
+        if len(messages) > 0:
+            await self.ingest(messages)
+
+    async def ingest(self, messages):
+        updates = []
+        ids = {}  # stream -> [ids]
+        lag = {}  # execution id -> milliseconds since its latest update was sent
+        finished = set()
+        now_ms = int(await self.redis.time() * 1000)
+
+        for stream, id_, fields in messages:
+            ids.setdefault(stream.decode(), []).append(id_)
+            try:
+                update = UpdateMessage(**json.loads(fields[static.REDIS_RESULTS_QUEUE.encode()].decode()))
+            except Exception:
+                logger.exception(f"Dropping malformed status update: {fields}")
+                continue
+
+            updates.append(update)
+            execution_id = str(update.execution_id)
+            lag[execution_id] = max(now_ms - int(id_.decode().split("-")[0]), 0)
+            if update.type == "workflow" and any(patch["path"] == "/status" and patch.get("value") in FINISHED
+                                                 for patch in json.loads(update.message)):
+                finished.add(execution_id)
+
+        try:
+            await write_status_updates(self.wfq_col, updates)
+        except Exception:
+            # Left unacked, so they are read again and rewritten before anything newer
+            self.replaying.update(stream for stream in ids if stream in self.owned)
+            raise
+
+        for stream, stream_ids in ids.items():
+            await xack_xdel(self.redis, stream, static.REDIS_RESULTS_GROUP, stream_ids)
+
+        if len(lag) > 0:
+            await self.redis.hmset_dict(static.REDIS_RESULTS_LAG, lag)
+            logger.debug(f"Results lag: {lag}")
+        if len(finished) > 0:
+            await self.redis.hdel(static.REDIS_RESULTS_LAG, *finished)
+
+
+async def write_status_updates(wfq_col, messages):
+    """
+        Writes a batch of status updates to their workflow statuses in order, then hands the statuses they changed to
+        the status emitter. Consecutive updates to the same workflow status are merged into one Mongo update where
+        their fields don't overlap.
+    """
+    updates = []  # [execution id, mongo update]
+    last_update = {}  # execution id -> index in updates of its latest update
+    changed_nodes = {}  # execution id -> {node id: None}, in the order the nodes changed
+    changed_workflows = set()
+
+    for message in messages:
+        patches = json.loads(message.message)
+        i = last_update.get(message.execution_id)
+        merged = mongo_update_from_patches(patches, updates[i][1]) if i is not None else None
+        if merged is not None:
+            updates[i][1] = merged
+        else:
+            last_update[message.execution_id] = len(updates)
+            updates.append([message.execution_id, mongo_update_from_patches(patches)])
+
+        if message.type == "workflow":
+            changed_workflows.add(message.execution_id)
+        elif message.node_id is not None:
+            changed_nodes.setdefault(message.execution_id, {})[str(message.node_id)] = None
+
+    if len(updates) < 1:
+        return
+
+    await wfq_col.bulk_write([UpdateOne({"execution_id": execution_id},
+                                        {op: fields for op, fields in update.items() if len(fields) > 0})
+                              for execution_id, update in updates], ordered=True)
+
+    # Read back only what changed. Node statuses go out on their own namespace, so workflow events leave them out.
+    if changed_workflows:
+        async for wfs_json in wfq_col.find({"execution_id": {"$in": list(changed_workflows)}},
+                                           projection={"_id": False, "node_statuses": False}):
+            workflow_status = json.loads(WorkflowStatus(**wfs_json).json(exclude={"node_statuses"}))
+            status_emitter.emit(static.SIO_NS_WORKFLOW, workflow_status["execution_id"], workflow_status)
+
+    for execution_id, node_ids in changed_nodes.items():
+        projection = {"_id": False, **{f"node_statuses.{node_id}": True for node_id in node_ids}}
+        wfs_json = await wfq_col.find_one({"execution_id": execution_id}, projection=projection)
+        if wfs_json is not None:
+            emit_node_statuses(str(execution_id), wfs_json, node_ids)
+
+
+def emit_node_statuses(execution_id, wfs_json, node_ids):
+    # The statuses were written from JSON patches, so they can be emitted as they are stored
+    node_statuses = wfs_json.get("node_statuses", {})
+    for node_id in node_ids:
+        if node_id in node_statuses:
+            status_emitter.emit(static.SIO_NS_NODE, (execution_id, node_id),
+                                {**node_statuses[node_id], "execution_id": execution_id, "node_id": node_id})
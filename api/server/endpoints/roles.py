@@ -7,6 +7,7 @@ from motor.motor_asyncio import AsyncIOMotorCollection
 from api.server.db.mongo import get_mongo_c
 from api.server.db.role import RoleModel
 from api.server.db.user_init import default_resource_permissions_admin, DefaultRoleUUID, DefaultRoleUUIDS
+from api.server.security import publish_auth_change
 from api.server.utils.problems import (UnauthorizedException, UniquenessException, DoesNotExistException)
 from common import async_mongo_helpers as mongo_helpers
 
@@ -53,7 +54,9 @@ async def create_role(*, role_col: AsyncIOMotorCollection = Depends(get_mongo_c)
     """
     Creates a new role and returns it.
     """
-    return await mongo_helpers.create_item(role_col, RoleModel, new_role)
+    created = await mongo_helpers.create_item(role_col, RoleModel, new_role)
+    await publish_auth_change("roles")
+    return created
 
     # json_data = dict(add_role)
     #
@@ -107,7 +110,9 @@ async def update_role(*, role_col: AsyncIOMotorCollection = Depends(get_mongo_c)
     if new_role.resources:
         role.resources = new_role.resources
 
-    return await mongo_helpers.update_item(role_col, RoleModel, role_id, role)
+    updated = await mongo_helpers.update_item(role_col, RoleModel, role_id, role)
+    await publish_auth_change("roles")
+    return updated
 
     # role = await role_getter(role_col, role_id=role_id)
     # if role.id_ != 1 and role.id_ != 2:
@@ -144,7 +149,9 @@ async def delete_role(*, role_col: AsyncIOMotorCollection = Depends(get_mongo_c)
     if role.id_ in DefaultRoleUUIDS:
         raise UnauthorizedException("delete", "role", role_string)
     else:
-        return await mongo_helpers.delete_item(role_col, RoleModel, role_id)
+        deleted = await mongo_helpers.delete_item(role_col, RoleModel, role_id)
+        await publish_auth_change("roles")
+        return deleted
 
 
 @router.get('/availableresourceactions/',
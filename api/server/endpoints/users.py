@@ -12,7 +12,7 @@ from api.server.db.role import RoleModel
 from api.server.db.user import UserModel, EditUser, EditPersonalUser
 from api.server.db.user_init import DefaultUserUUID as DUsers, DefaultRoleUUID as DRoles, DefaultUserUUID, \
     DefaultRoleUUID
-from api.server.security import get_jwt_identity
+from api.server.security import get_jwt_identity, publish_auth_change
 from api.server.utils.problems import (UnauthorizedException, UniquenessException, InvalidInputException,
                                        DoesNotExistException)
 from common import async_mongo_helpers as mongo_helpers
@@ -132,7 +132,9 @@ async def update_user(*, walkoff_db: AsyncIOMotorDatabase = Depends(get_mongo_d)
         if new_user.new_password:
             await user.hash_and_set_password(new_user.new_password)
 
-        return await mongo_helpers.update_item(user_col, UserModel, user_id, user)
+        updated = await mongo_helpers.update_item(user_col, UserModel, user_id, user)
+        await publish_auth_change(f"user:{user.id_}")
+        return updated
     else:
         raise UnauthorizedException("update the data", "User", f"{new_user.username}")
 
@@ -153,7 +155,9 @@ async def delete_user(*, user_col: AsyncIOMotorCollection = Depends(get_mongo_c)
             or DefaultRoleUUID.SUPER_ADMIN.value in user.roles:
         raise UnauthorizedException("delete", "User", user_string)
     else:
-        return await mongo_helpers.delete_item(user_col, UserModel, user_id)
+        deleted = await mongo_helpers.delete_item(user_col, UserModel, user_id)
+        await publish_auth_change(f"user:{user.id_}")
+        return deleted
 
 
 @router.get("/personal_data/{username}")
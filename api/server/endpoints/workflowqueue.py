@@ -1,7 +1,7 @@
 import datetime
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from http import HTTPStatus
 from typing import List
 from uuid import UUID, uuid4
@@ -12,10 +12,10 @@ from pydantic import ValidationError
 from starlette.requests import Request
 
 from api.server.db.mongo import get_mongo_d, get_mongo_c
-from api.server.db.permissions import auth_check
+from api.server.db.permissions import get_auth_context
 from api.server.db.workflow import WorkflowModel
 from api.server.db.workflowresults import WorkflowStatus, ExecuteWorkflow, ControlWorkflow
-from api.server.security import get_jwt_claims, get_jwt_identity
+from api.server.security import get_jwt_claims
 from api.server.utils.problems import InvalidInputException, ImproperJSONException, DoesNotExistException, \
     UnauthorizedException
 from api.server.utils.socketio import sio
@@ -23,6 +23,7 @@ from common import async_mongo_helpers as mongo_helpers
 from common.config import config, static
 from common.message_types import StatusEnum, message_dumps
 from common.redis_helpers import connect_to_aioredis_pool
+from common.result_store import result_store
 
 router = APIRouter()
 logger = logging.getLogger("API")
@@ -57,15 +58,18 @@ async def get_all_workflow_status(*, walkoff_db: AsyncIOMotorDatabase = Depends(
     """
     workflow_col = walkoff_db.workflows
     wfq_col = walkoff_db.workflowqueue
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
     wf_statuses = await mongo_helpers.get_all_items(wfq_col, WorkflowStatus, page=page, num_per_page=num_per_page,
                                                     projection={"node_statuses": False})
 
     ret = []
+    readable = {}  # workflow id -> whether the user can read it, as many statuses share a workflow
     for wf_status in wf_statuses:
-        wf = await mongo_helpers.get_item(workflow_col, WorkflowModel, wf_status.workflow_id, raise_exc=False)
-        if not wf or await auth_check(wf, curr_user_id, "read", walkoff_db=walkoff_db):
+        if wf_status.workflow_id not in readable:
+            wf = await mongo_helpers.get_item(workflow_col, WorkflowModel, wf_status.workflow_id, raise_exc=False)
+            readable[wf_status.workflow_id] = not wf or auth.check(wf, "read")
+        if readable[wf_status.workflow_id]:
             ret.append(wf_status)
 
 
@@ -83,10 +87,10 @@ async def get_workflow_status(*, walkoff_db: AsyncIOMotorDatabase = Depends(get_
     """
     workflow_col = walkoff_db.workflows
     wfq_col = walkoff_db.workflowqueue
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
     wf_status: WorkflowStatus = await mongo_helpers.get_item(wfq_col, WorkflowStatus, execution, id_key="execution_id")
     wf = await mongo_helpers.get_item(workflow_col, WorkflowModel, wf_status.workflow_id, raise_exc=False)
-    if not wf or await auth_check(wf, curr_user_id, "read", walkoff_db=walkoff_db):
+    if not wf or auth.check(wf, "read"):
         wf_status.to_response()
         return wf_status
     else:
@@ -111,9 +115,9 @@ async def execute_workflow(workflow_to_execute: ExecuteWorkflow, request: Reques
     # workflow = workflow_getter(workflow_id, workflow_status_col)
     # data = dict(workflow_to_execute)
 
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
-    to_execute = await auth_check(workflow, curr_user_id, "execute", walkoff_db=walkoff_db)
+    to_execute = auth.check(workflow, "execute")
     if to_execute:
         if not workflow:
             raise DoesNotExistException("workflow", "execute", workflow_id)
@@ -232,7 +236,7 @@ async def control_workflow(request: Request, execution, workflow_to_control: Con
 
     walkoff_db = get_mongo_d(request)
     workflow_col = walkoff_db.workflows
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
     workflow_id = execution.workflow_id
     data = dict(workflow_to_control)
@@ -243,7 +247,7 @@ async def control_workflow(request: Request, execution, workflow_to_control: Con
     # The resource factory returns the WorkflowStatus model but we want the string of the execution ID
     execution_id = str(execution.execution_id)
 
-    to_execute = await auth_check(workflow, curr_user_id, "execute", walkoff_db=walkoff_db)
+    to_execute = auth.check(workflow, "execute")
     # TODO: add in pause/resume here. Workers need to store and recover state for this
     if to_execute:
         if status.lower() == 'abort':
@@ -309,18 +313,18 @@ async def clear_workflow_status(all_=False, days=30,
     """
     Removes workflow statuses from the execution database."
     """
+    finished = {"status": {"$in": [StatusEnum.ABORTED, StatusEnum.COMPLETED]}}
     if all_:
-        await workflow_status_col.remove({"$or":
-                                              [{"status": StatusEnum.ABORTED}, {"status": StatusEnum.COMPLETED}]},
-                                         projection={'_id': False})
+        query = finished
     elif days > 0:
-        delete_date = datetime.datetime.today() - datetime.timedelta(days=days)
-        temp = await workflow_status_col.find({"$or":
-                                                   [{"status": StatusEnum.ABORTED}, {"status": StatusEnum.COMPLETED}]},
-                                              projection={'_id': False})
-        temp2 = await workflow_status_col.find({"completed_at": {"$lte": delete_date}},
-                                               projection={'_id': False})
-
-        to_delete = list((set(temp)).intersection(set(temp2)))
-        await workflow_status_col.deleteMany(to_delete)
+        delete_date = datetime.today() - timedelta(days=days)
+        # completed_at is stored as str(datetime), which orders the same as the datetime itself
+        query = {**finished, "completed_at": {"$lte": str(delete_date)}}
+    else:
+        return None
+
+    to_delete = await workflow_status_col.find(query, projection={"execution_id": True}).to_list(None)
+    await workflow_status_col.delete_many(query)
+    for status in to_delete:
+        await result_store.delete_execution(status["execution_id"])
     return None
@@ -11,7 +11,7 @@ from starlette.requests import Request
 from starlette.responses import StreamingResponse
 
 from api.server.db.mongo import get_mongo_d
-from api.server.db.permissions import AccessLevel, auth_check, creator_only_permissions, \
+from api.server.db.permissions import AccessLevel, auth_check, creator_only_permissions, get_auth_context, \
     default_permissions, append_super_and_internal
 from api.server.db.workflow import WorkflowModel, CopyWorkflowModel
 from api.server.security import get_jwt_identity
@@ -165,13 +165,13 @@ async def read_all_workflows(*, walkoff_db: AsyncIOMotorDatabase = Depends(get_m
     Returns a list of all Workflows currently loaded in WALKOFF.
     """
     workflow_col = walkoff_db.workflows
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
     ret = []
     query = await mongo_helpers.get_all_items(workflow_col, WorkflowModel)
 
     for workflow in query:
-        to_read = await auth_check(workflow, curr_user_id, "read", walkoff_db=walkoff_db)
+        to_read = auth.check(workflow, "read")
         if to_read:
             ret.append(workflow)
 
@@ -189,11 +189,11 @@ async def read_workflow(*, walkoff_db: AsyncIOMotorDatabase = Depends(get_mongo_
     Returns the Workflow for the specified id or name.
     """
     workflow_col = walkoff_db.workflows
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
     workflow = await mongo_helpers.get_item(workflow_col, WorkflowModel, workflow_name_id)
 
-    to_read = await auth_check(workflow, curr_user_id, "read", walkoff_db=walkoff_db)
+    to_read = auth.check(workflow, "read")
     if to_read:
         if mode == "export":
             workflow_str = workflow.json().encode('utf-8')
@@ -220,9 +220,10 @@ async def update_workflow(*, walkoff_db: AsyncIOMotorDatabase = Depends(get_mong
     """
     workflow_col = walkoff_db.workflows
     curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
     old_workflow = await mongo_helpers.get_item(workflow_col, WorkflowModel, workflow_name_id)
 
-    to_update = await auth_check(old_workflow, curr_user_id, "update", walkoff_db=walkoff_db)
+    to_update = auth.check(old_workflow, "update")
     if to_update:
         await set_permissions(updated_workflow, curr_user_id, walkoff_db)
         try:
@@ -244,10 +245,10 @@ async def delete_workflow(*, walkoff_db: AsyncIOMotorDatabase = Depends(get_mong
     Deletes a specific Workflow object (fetched by id or name).
     """
     workflow_col = walkoff_db.workflows
-    curr_user_id = await get_jwt_identity(request)
+    auth = await get_auth_context(request, walkoff_db)
 
     workflow = await mongo_helpers.get_item(workflow_col, WorkflowModel, workflow_name_id)
-    to_delete = await auth_check(workflow, curr_user_id, "delete", walkoff_db=walkoff_db)
+    to_delete = auth.check(workflow, "delete")
     if to_delete:
         return await mongo_helpers.delete_item(workflow_col, WorkflowModel, workflow.id_)
     else:
@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import time
 import uuid
 from datetime import datetime, timedelta
 from http import HTTPStatus
@@ -16,8 +18,9 @@ from api.server.db.user import UserModel
 from api.server.fastapi_config import FastApiConfig
 from api.server.utils.problems import ProblemException
 from common import async_mongo_helpers as mongo_helpers
-from common.config import config
+from common.config import config, static
 from common.helpers import preset_uuid
+from common.redis_helpers import connect_to_aioredis_pool
 
 app = FastAPI()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
@@ -45,10 +48,10 @@ async def verify_token_not_blacklisted(walkoff_db: AsyncIOMotorDatabase, decoded
     if not FastApiConfig.JWT_BLACKLIST_ENABLED:
         return
     if request_type == 'access':
-        if await is_token_revoked(walkoff_db=walkoff_db, decoded_token=decoded_token):
+        if await auth_cache.is_token_revoked(walkoff_db=walkoff_db, decoded_token=decoded_token):
             raise ProblemException(HTTPStatus.BAD_REQUEST, "Could not verify token.", 'Token has been revoked.')
     if request_type == 'refresh':
-        if await is_token_revoked(walkoff_db=walkoff_db, decoded_token=decoded_token):
+        if await auth_cache.is_token_revoked(walkoff_db=walkoff_db, decoded_token=decoded_token):
             raise ProblemException(HTTPStatus.BAD_REQUEST, "Could not verify token.", 'Token has been revoked.')
 
 
@@ -104,12 +107,11 @@ async def decode_token(to_decode):
 
 
 async def get_raw_jwt(request: Request):
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return None
-
-    jwt_token = auth_header[7:]
-    return await decode_token(jwt_token)
+    # The middlewares and the endpoint share the request's state, so the token is only decoded once per request
+    if not hasattr(request.state, "raw_jwt"):
+        auth_header = request.headers.get('Authorization')
+        request.state.raw_jwt = await decode_token(auth_header[7:]) if auth_header else None
+    return request.state.raw_jwt
 
 
 async def get_jwt_identity(request: Request):
@@ -138,13 +140,115 @@ async def user_has_correct_roles(accepted_roles, request: Request, all_required=
 
 async def get_roles_by_resource_permission(resource_name: str, resource_permission: str,
                                            walkoff_db: AsyncIOMotorDatabase):
-    roles_col = walkoff_db.roles
+    return await auth_cache.roles_for(resource_name, resource_permission, walkoff_db)
+
 
-    all_roles = [RoleModel(**role_json) for role_json in await roles_col.find().to_list(None)]
-    accepted_roles = []
-    for role in all_roles:
-        for resource in role.resources:
-            if resource.name == resource_name and resource_permission in resource.permissions:
-                accepted_roles.append(role)
+async def publish_auth_change(message: str):
+    """
+        Tells every API replica to drop what it has cached about message, which is "roles" after any role changes,
+        "user:<id>" after a user changes, or "revoked:<jti>" after a token is revoked. The change is already written,
+        so failing to publish it is logged rather than failing the request.
+    """
+    auth_cache.invalidate(message)
+    try:
+        async with connect_to_aioredis_pool(config.REDIS_URI) as conn:
+            await conn.publish(static.REDIS_AUTH_CHANNEL, message)
+    except Exception as e:
+        logger.error(f"Could not publish auth change {message}, other API replicas may be out of date: {e!r}")
+
+
+class AuthCache:
+    """
+        A process-wide cache of what authorization reads from Mongo: which roles hold each permission on each
+        resource, the roles of each user, and the tokens known not to be revoked. Whatever changes one of these
+        publishes it on REDIS_AUTH_CHANNEL, and every API replica drops what it had cached. Nothing is cached while the
+        subscription is down, so an invalidation can't be missed.
+    """
+    MAX_UNREVOKED = 10000
+
+    def __init__(self):
+        self.listening = False
+        self.generation = 0  # bumped by every invalidation, so lookups that raced one aren't cached
+        self.resource_roles = None  # resource name -> permission -> {role ids}
+        self.user_roles = {}  # user id -> role ids
+        self.unrevoked = {}  # jti -> expiry of a token that isn't revoked
+
+    def invalidate(self, message=""):
+        self.generation += 1
+        kind, _, key = message.partition(":")
+        if kind in ("", "roles"):
+            self.resource_roles = None
+        if kind == "user":
+            self.user_roles.pop(key, None)
+        elif kind == "revoked":
+            self.unrevoked.pop(key, None)
+        elif kind == "":
+            self.user_roles = {}
+            self.unrevoked = {}
+
+    def cacheable(self, generation):
+        return self.listening and generation == self.generation
+
+    async def roles_for(self, resource_name: str, resource_permission: str, walkoff_db: AsyncIOMotorDatabase):
+        resource_roles = self.resource_roles
+        if resource_roles is None:
+            generation = self.generation
+            resource_roles = {}
+            for role_json in await walkoff_db.roles.find().to_list(None):
+                role = RoleModel(**role_json)
+                for resource in role.resources:
+                    for permission in resource.permissions:
+                        resource_roles.setdefault(resource.name, {}).setdefault(permission, set()).add(role.id_)
+            if self.cacheable(generation):
+                self.resource_roles = resource_roles
+
+        return set(resource_roles.get(resource_name, {}).get(resource_permission, ()))
+
+    async def roles_of(self, user_id, walkoff_db: AsyncIOMotorDatabase):
+        roles = self.user_roles.get(str(user_id))
+        if roles is None:
+            generation = self.generation
+            roles = (await mongo_helpers.get_item(walkoff_db.users, UserModel, user_id)).roles
+            if self.cacheable(generation):
+                self.user_roles[str(user_id)] = roles
+        return roles
+
+    async def is_token_revoked(self, decoded_token: dict, walkoff_db: AsyncIOMotorDatabase):
+        jti = decoded_token['jti']
+        if jti in self.unrevoked:
+            return False
+
+        generation = self.generation
+        if await is_token_revoked(decoded_token=decoded_token, walkoff_db=walkoff_db):
+            return True
+        if self.cacheable(generation):
+            if len(self.unrevoked) >= self.MAX_UNREVOKED:
+                now = time.time()
+                self.unrevoked = {jti_: exp for jti_, exp in self.unrevoked.items() if exp > now}
+            if len(self.unrevoked) < self.MAX_UNREVOKED:
+                self.unrevoked[jti] = decoded_token['exp']
+        return False
 
-    return {role_obj.id_ for role_obj in accepted_roles}
+    async def listen(self):
+        """ Drops cached entries as changes are published, and caches nothing while it isn't subscribed """
+        while True:
+            try:
+                async with connect_to_aioredis_pool(config.REDIS_URI) as redis:
+                    channel, = await redis.subscribe(static.REDIS_AUTH_CHANNEL)
+                    self.invalidate()
+                    self.listening = True
+                    while await channel.wait_message():
+                        message = await channel.get(encoding="utf-8")
+                        logger.debug(f"Auth cache invalidated by {message}")
+                        self.invalidate(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Lost the auth cache subscription: {e!r}")
+            finally:
+                self.listening = False
+                self.invalidate()
+            await asyncio.sleep(1)
+
+
+auth_cache = AuthCache()
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from uuid import UUID
 
@@ -13,6 +14,39 @@ logger = logging.getLogger("API")
 sio = socketio.AsyncClient()
 
 
+class StatusEmitter:
+    """
+        Batches status events for API_SIO_EMIT_MS and emits each namespace's as one SIO_EVENT_LOGS event. Events are
+        keyed by what they describe, eg. a node of an execution, so a batch only holds the latest status of everything
+        that changed since the last one. Clients apply these diffs on top of the snapshot they get when they connect.
+    """
+
+    def __init__(self):
+        self.pending = {}  # namespace -> {key: event}
+        self.flush_task = None
+
+    def emit(self, namespace, key, event):
+        self.pending.setdefault(namespace, {})[key] = event
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(config.get_int("API_SIO_EMIT_MS", 100) / 1000)
+        self.flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Could not emit status events: {e!r}")
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+        for namespace, events in pending.items():
+            await sio.emit(static.SIO_EVENT_LOGS, list(events.values()), namespace=namespace)
+
+
+status_emitter = StatusEmitter()
+
+
 class SIOMessage(BaseModel):
     execution_id: UUID
     workflow_id: UUID
@@ -8,6 +8,6 @@ setup(name='walkoff_app_sdk',
       author_email='',
       license='',
       packages=find_packages(),
-      install_requires=["aiohttp", "pyyaml", "asteval", "cryptography", "six",
-                        "tenacity", "python-socketio", "requests", "websocket-client"]
+      install_requires=["aiohttp", "pyyaml", "asteval==0.9.31", "cryptography", "six",
+                        "tenacity", "python-socketio", "requests", "websocket-client", "minio==4.0.0"]
 )
@@ -2,6 +2,11 @@ import datetime
 import logging
 import asyncio
 import sys
+import functools
+import inspect
+import signal
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextvars import ContextVar, copy_context
 
 import aioredis
 import aiohttp
@@ -10,10 +15,28 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 from common.message_types import NodeStatusMessage, message_dumps
 from common.workflow_types import workflow_loads, Action, ParameterVariant
 from common.async_logger import AsyncLogger, AsyncHandler
-from common.helpers import UUID_GLOB, fernet_encrypt, fernet_decrypt
-from common.redis_helpers import connect_to_aioredis_pool, xlen, xdel, deref_stream_message
+from common.helpers import fernet_encrypt, fernet_decrypt
+from common.result_store import result_store
+from common.redis_helpers import (connect_to_aioredis_pool, xlen, xdel, get_active_streams, prune_streams,
+                                  split_action_stream)
 from common.socketio_helpers import connect_to_socketio
 from common.config import config, static
+from .pools import Pools
+
+# Set for the duration of each action so that concurrently executing actions don't mix up their log lines
+current_execution_id = ContextVar("current_execution_id", default=None)
+current_workflow_id = ContextVar("current_workflow_id", default=None)
+
+
+def blocking(func):
+    """
+        Marks a synchronous action as blocking, eg. one using a synchronous client library, so that it runs in the app's
+        thread pool instead of on the event loop.
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        return await self.run_in_thread(func, self, *args, **kwargs)
+    return wrapper
 
 
 class SIOStream:
@@ -21,8 +44,14 @@ class SIOStream:
     def __init__(self, sio=None):
         super().__init__()
         self.sio = sio
-        self.execution_id = None
-        self.workflow_id = None
+
+    @property
+    def execution_id(self):
+        return current_execution_id.get()
+
+    @property
+    def workflow_id(self):
+        return current_workflow_id.get()
 
     def flush(self):
         pass
@@ -61,59 +90,179 @@ class AppBase:
         # Creates redis keys of format "{AppName}:{Version}:{Priority}"
         self.redis: aioredis.Redis = redis
         self.logger = logger if logger is not None else logging.getLogger("AppBaseLogger")
-        self.current_execution_id = None
-        self.current_workflow_id = None
+        self.action_slots = asyncio.Semaphore(config.get_int("APP_MAX_CONCURRENT_ACTIONS", 1))
+        self.running_actions = set()
+        self.action_executions = {}  # running action task -> its execution id
+        self.last_action_at = None
+        self.thread_pool = ThreadPoolExecutor(max_workers=config.get_int("APP_THREAD_POOL_SIZE", 10),
+                                              thread_name_prefix="action")
+        self.process_pool = None
+        self.pools = Pools()
+
+    @property
+    def current_execution_id(self):
+        return current_execution_id.get()
+
+    @property
+    def current_workflow_id(self):
+        return current_workflow_id.get()
 
     async def get_actions(self):
         """ Continuously monitors the action queue and asynchronously executes actions """
         self.logger.debug("Waiting for actions...")
         app_group = f"{self.app_name}:{self.__version__}"
+        loop = asyncio.get_event_loop()
+        idle_timeout = config.get_float("APP_TIMEOUT", 30)
+        read_timeout = config.get_int("APP_READ_TIMEOUT", 1000)
+        pending_interval = config.get_float("APP_PENDING_INTERVAL", 30)
+        self.last_action_at = loop.time()
+        check_pending_at = self.last_action_at  # Pick up anything a previous incarnation of this container left unacked
 
         while True:
-            await asyncio.sleep(1)
+            await self.action_slots.acquire()
+            if not self.is_busy() and loop.time() - self.last_action_at > idle_timeout:
+                sys.exit(-1)  # Nothing has arrived in a while, let the umpire scale us back up when needed
 
-            streams = await self.redis.keys(f"{UUID_GLOB}:{app_group}", encoding='utf-8')
+            await self.pools.evict_idle()
+            streams = await get_active_streams(self.redis, app_group)
             aborted = await self.redis.smembers(static.REDIS_ABORTING_WORKFLOWS, encoding="utf-8")
-            streams = [s for s in streams if s.split(':')[0] not in aborted]
+            streams = [s for s in streams if split_action_stream(s)[0] not in aborted]
             num_streams = len(streams)
 
             if num_streams < 1:
-                sys.exit(-1)  # There's no scheduled work and no reason to live
+                self.action_slots.release()
+                await asyncio.sleep(read_timeout / 1000)  # There is nothing to block on until a stream is registered
+                continue
 
             try:
-                # See if we have any pending messages first
-                message = await self.redis.xread_group(app_group, static.CONTAINER_ID, streams=streams, count=1,
-                                                       latest_ids=list('0' * num_streams), timeout=None)
-
-                if len(message) < 1:  # We don't have any pending so lets get a new one
+                message = []
+                # Our in flight actions are pending too, so only look for abandoned ones when nothing is running
+                if not self.is_busy() and loop.time() >= check_pending_at:
                     message = await self.redis.xread_group(app_group, static.CONTAINER_ID, streams=streams, count=1,
-                                                           latest_ids=list('>' * num_streams), timeout=None)
-
-                if len(message) < 1:  # We didn't get any messages, start over with new streams
-                    continue
+                                                           latest_ids=['0'] * num_streams, timeout=None)
+                    if len(message) < 1:
+                        check_pending_at = loop.time() + pending_interval
+
+                if len(message) < 1:  # Block until a new action arrives on one of the streams
+                    with await self.redis as redis:
+                        message = await redis.xread_group(app_group, static.CONTAINER_ID, streams=streams, count=1,
+                                                          latest_ids=['>'] * num_streams, timeout=read_timeout)
+
+                if len(message) < 1:
+                    self.action_slots.release()
+                    continue  # We didn't get any messages, start over with new streams
             except aioredis.errors.ReplyError:
-                continue  # Just keep trying to read messages. This likely gets thrown if a stream doesn't exist
-
-            execution_id_action, stream, id_ = deref_stream_message(message)
-            execution_id, action = execution_id_action
-
-            # Actually execute the action
-            action = workflow_loads(action)
-            await self.execute_action(action)
+                # Just keep trying to read messages. This likely gets thrown if a stream doesn't exist
+                self.action_slots.release()
+                await prune_streams(self.redis, streams)
+                continue
+
+            # The read returns up to one action per stream, each of which needs its own slot
+            for i, (stream, id_, fields) in enumerate(message):
+                if i > 0:
+                    await self.action_slots.acquire()
+                execution_id, action = fields.popitem()
+
+                # Shared app streams hold actions from every execution, so skip those which have since been aborted
+                task = asyncio.ensure_future(self.run_action(action, stream, app_group, id_,
+                                                             skip=execution_id.decode() in aborted))
+                self.running_actions.add(task)
+                self.action_executions[task] = execution_id.decode()
+                task.add_done_callback(self.action_done)
+
+    def action_done(self, task):
+        self.running_actions.discard(task)
+        self.action_executions.pop(task, None)
+
+    async def abort_flagged(self):
+        """ Cancels only the running actions of executions that have been flagged for abort """
+        aborting = await self.redis.smembers(static.REDIS_ABORTING_WORKFLOWS, encoding="utf-8")
+        for task, execution_id in list(self.action_executions.items()):
+            if execution_id in aborting:
+                task.cancel()
+
+    async def run_in_thread(self, func, *args, **kwargs):
+        """ Runs a blocking function in the shared thread pool, keeping the current action's logging context """
+        context = copy_context()
+        return await asyncio.get_event_loop().run_in_executor(self.thread_pool,
+                                                              functools.partial(context.run, func, *args, **kwargs))
+
+    async def run_in_process(self, func, *args, **kwargs):
+        """ Runs a CPU bound function in the shared process pool. The function, arguments, and result must pickle. """
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(max_workers=config.get_int("APP_PROCESS_POOL_SIZE", 2))
+        return await asyncio.get_event_loop().run_in_executor(self.process_pool,
+                                                              functools.partial(func, *args, **kwargs))
+
+    async def for_each_host(self, hosts, func, *args, **kwargs):
+        """
+            Runs func(host, *args, **kwargs) for up to APP_HOST_CONCURRENCY hosts at once and returns {host: result}.
+            A synchronous func runs in the thread pool. A host which raises or takes longer than APP_HOST_TIMEOUT
+            seconds gets {"stdout": "", "stderr": error} as its result instead.
+        """
+        results = {host: result async for host, result in self.each_host(hosts, func, *args, **kwargs)}
+        return {host: results[host] for host in hosts}
+
+    async def each_host(self, hosts, func, *args, **kwargs):
+        """ Like for_each_host, but yields (host, result) as each host finishes, for actions that stream results """
+        limit = asyncio.Semaphore(config.get_int("APP_HOST_CONCURRENCY", 10))
+        timeout = config.get_float("APP_HOST_TIMEOUT", 300) or None
+
+        async def run_on_host(host):
+            async with limit:
+                try:
+                    if asyncio.iscoroutinefunction(func):
+                        coro = func(host, *args, **kwargs)
+                    else:
+                        coro = self.run_in_thread(func, host, *args, **kwargs)
+                    return host, await asyncio.wait_for(coro, timeout)
+                except asyncio.CancelledError:
+                    raise
+                except asyncio.TimeoutError:
+                    return host, {"stdout": "", "stderr": f"Timed out after {timeout} seconds"}
+                except Exception as e:
+                    return host, {"stdout": "", "stderr": f"{e}"}
+
+        tasks = [asyncio.ensure_future(run_on_host(host)) for host in hosts]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()  # The action stopped early, don't leave the rest running
+
+    def shutdown_pools(self):
+        self.thread_pool.shutdown(wait=False)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False)
+
+    def is_busy(self):
+        return len(self.running_actions) > 0
+
+    async def run_action(self, action, stream, app_group, id_, skip=False):
+        """ Executes an action read from stream, then acks and deletes it and frees its slot for another action """
+        try:
+            if not skip:
+                # Actually execute the action
+                action = workflow_loads(action)
+                current_execution_id.set(action.execution_id)
+                current_workflow_id.set(action.workflow_id)
+                await self.execute_action(action)
 
             # Clean up workflow-queue
             await self.redis.xack(stream=stream, group_name=app_group, id=id_)
             await xdel(self.redis, stream=stream, id_=id_)
+        except asyncio.CancelledError:
+            self.logger.info(f"Aborted action {id_} from {stream}")  # The umpire already removed it from the stream
+        except Exception:
+            self.logger.exception(f"Failed to process action {id_} from {stream}")
+        finally:
+            self.last_action_at = asyncio.get_event_loop().time()
+            self.action_slots.release()
 
     async def execute_action(self, action: Action):
         """ Execute an action, and push its result to Redis. """
-        # TODO: Is there a better way to do this?
-        self.logger.handlers[0].stream.execution_id = action.execution_id
-        self.logger.handlers[0].stream.workflow_id = action.workflow_id
-
         self.logger.debug(f"Attempting execution of: {action.label}-{action.execution_id}")
-        self.current_execution_id = action.execution_id
-        self.current_workflow_id = action.workflow_id
 
         results_stream = f"{action.execution_id}:results"
 
@@ -127,22 +276,29 @@ class AppBase:
             try:
                 func = getattr(self, action.name, None)
                 if callable(func):
-                    if len(action.parameters) < 1:
-                        result = await func()
+                    params = {}
+                    for p in action.parameters:
+                        if p.variant == ParameterVariant.GLOBAL:
+                            key = config.get_from_file(config.ENCRYPTION_KEY_PATH, mode='rb')
+                            params[p.name] = fernet_decrypt(key, p.value)
+                        elif p.variant == ParameterVariant.ACTION_RESULT:
+                            params[p.name] = await result_store.check_out(p.value)
+                        else:
+                            params[p.name] = p.value
+
+                    if inspect.isasyncgenfunction(func):
+                        partials = await self.stream_results(action, func(**params), results_stream)
+                        action_result = NodeStatusMessage.streamed_from_node(action, action.execution_id, partials,
+                                                                             started_at=action.started_at)
+                        self.logger.debug(f"Executed {action.label}-{action.execution_id} "
+                                          f"with {partials} partial results")
                     else:
-                        params = {}
-                        for p in action.parameters:
-                            if p.variant == ParameterVariant.GLOBAL:
-                                key = config.get_from_file(config.ENCRYPTION_KEY_PATH, mode='rb')
-                                params[p.name] = fernet_decrypt(key, p.value)
-                            else:
-                                params[p.name] = p.value
-                        result = await func(**params)
-
-                    action_result = NodeStatusMessage.success_from_node(action, action.execution_id, result=result,
-                                                                        started_at=action.started_at)
-                    self.logger.debug(f"Executed {action.label}-{action.execution_id} "
-                                      f"with result: {result}")
+                        result = await result_store.check_in(await func(**params), action.execution_id, action.id_)
+                        action_result = NodeStatusMessage.success_from_node(action, action.execution_id,
+                                                                            result=result,
+                                                                            started_at=action.started_at)
+                        self.logger.debug(f"Executed {action.label}-{action.execution_id} "
+                                          f"with result: {result}")
 
                 else:
                     self.logger.error(f"App {self.__class__.__name__}.{action.name} is not callable")
@@ -150,6 +306,8 @@ class AppBase:
                                                                         result="Action not callable",
                                                                         started_at=action.started_at)
 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 self.logger.exception(f"Failed to execute {action.label}-{action.execution_id}")
                 action_result = NodeStatusMessage.failure_from_node(action, action.execution_id, result=repr(e),
@@ -163,10 +321,25 @@ class AppBase:
 
         await self.redis.xadd(results_stream, {action.execution_id: message_dumps(action_result)})
 
+    async def stream_results(self, action: Action, chunks, results_stream):
+        """
+            Pushes each chunk an async generator action yields to Redis as a partial result as soon as it is yielded,
+            and returns how many were sent. The chunks aren't kept, the worker puts them together as the result.
+        """
+        index = 0
+        async for chunk in chunks:
+            partial = await result_store.check_in(chunk, action.execution_id, action.id_)
+            partial_msg = NodeStatusMessage.partial_from_node(action, action.execution_id, result=partial,
+                                                              index=index, started_at=action.started_at)
+            await self.redis.xadd(results_stream, {action.execution_id: message_dumps(partial_msg)})
+            index += 1
+        return index
+
     @classmethod
     async def run(cls):
         """ Connect to Redis and HTTP session, await actions """
-        async with connect_to_aioredis_pool(config.REDIS_URI) as redis:
+        max_actions = config.get_int("APP_MAX_CONCURRENT_ACTIONS", 1)
+        async with connect_to_aioredis_pool(config.REDIS_URI, maxsize=10 + max_actions) as redis:
             with connect_to_socketio(config.SOCKETIO_URI, ["/console"]) as sio:
                 # TODO: Migrate to the common log config
                 logging.basicConfig(format="{asctime} - {name} - {levelname}:{message}", style='{')
@@ -179,4 +352,12 @@ class AppBase:
 
                 app = cls(redis=redis, logger=logger)
 
-                await app.get_actions()
+                # SIGQUIT only tells us that something should be aborted, redis tells us which executions
+                asyncio.get_event_loop().add_signal_handler(signal.SIGQUIT,
+                                                            lambda: asyncio.ensure_future(app.abort_flagged()))
+
+                try:
+                    await app.get_actions()
+                finally:
+                    app.shutdown_pools()
+                    await app.pools.close()
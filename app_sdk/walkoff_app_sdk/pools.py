@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import aiohttp
+
+from common.config import config
+
+logger = logging.getLogger("AppBaseLogger")
+
+CONNECTION_ERRORS = (ConnectionError, aiohttp.ClientConnectionError)
+
+
+class ResourcePool:
+    """
+        Keeps resources such as sessions and connections open between actions, keyed by what they connect to.
+        Shared resources (eg. an aiohttp session) are handed to every caller at once, others are checked out by one
+        caller at a time. Resources which fail their health check or sit idle for longer than idle_timeout seconds are
+        closed, as are resources which are reused after sitting idle for longer than max_idle_age seconds. An exclusive
+        resource is also closed when its caller fails, as it may be left mid-conversation, but a shared resource is only
+        closed when the failure is one that broken says leaves the resource unusable for its other callers.
+    """
+    def __init__(self, create, close, healthy=None, broken=None, shared=False, max_idle=10, idle_timeout=300,
+                 max_idle_age=None):
+        self.create = create
+        self.close_resource = close
+        self.healthy = healthy
+        self.broken = broken if broken is not None else lambda e: isinstance(e, CONNECTION_ERRORS)
+        self.shared = shared
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.max_idle_age = max_idle_age
+        self.idle = defaultdict(list)  # key -> [(resource, last used)]
+        self.users = defaultdict(int)  # key -> callers currently using the shared resource
+        self.locks = defaultdict(asyncio.Lock)
+
+    @asynccontextmanager
+    async def acquire(self, key, *args, **kwargs):
+        resource = await self.get(key, *args, **kwargs)
+        self.users[key] += 1
+        succeeded = broken = False
+        try:
+            yield resource
+            succeeded = True
+        except Exception as e:
+            broken = self.broken(e)
+            raise
+        finally:  # Cancellation is a BaseException, so this is the only way to be sure the resource is returned
+            try:
+                if succeeded or (self.shared and not broken and self.is_healthy(resource)):
+                    await self.release(key, resource)
+                else:
+                    await self.discard(key, resource)
+            finally:
+                self.users[key] -= 1
+                if self.users[key] < 1:
+                    del self.users[key]
+
+    def is_healthy(self, resource, used=None):
+        if self.max_idle_age is not None and used is not None:
+            if asyncio.get_event_loop().time() - used > self.max_idle_age:
+                return False
+        return self.healthy is None or self.healthy(resource)
+
+    async def get(self, key, *args, **kwargs):
+        if not self.shared:
+            idle = self.idle[key]
+            while len(idle) > 0:
+                resource, used = idle.pop()
+                if self.is_healthy(resource, used):
+                    return resource
+                await self._close(resource)
+            return await self.create(*args, **kwargs)
+
+        # Only one caller creates a shared resource, the rest wait for it
+        async with self.locks[key]:
+            idle = self.idle[key]
+            if len(idle) > 0:
+                resource, used = idle[0]
+                if self.is_healthy(resource, used if key not in self.users else None):
+                    idle[0] = (resource, asyncio.get_event_loop().time())
+                    return resource
+                idle.clear()
+                await self._close(resource)
+
+            resource = await self.create(*args, **kwargs)
+            idle.append((resource, asyncio.get_event_loop().time()))
+            return resource
+
+    async def release(self, key, resource):
+        idle = self.idle[key]
+        if self.shared:
+            self.idle[key] = [(r, asyncio.get_event_loop().time() if r is resource else used) for r, used in idle]
+            return
+        if len(idle) < self.max_idle:
+            idle.append((resource, asyncio.get_event_loop().time()))
+        else:
+            await self._close(resource)
+
+    async def discard(self, key, resource):
+        self.idle[key] = [(r, used) for r, used in self.idle[key] if r is not resource]
+        await self._close(resource)
+
+    async def evict_idle(self):
+        cutoff = asyncio.get_event_loop().time() - self.idle_timeout
+        for key in list(self.idle):
+            if self.shared and key in self.users:
+                continue  # Still in use by a long running action
+            expired = [r for r, used in self.idle[key] if used < cutoff]
+            self.idle[key] = [(r, used) for r, used in self.idle[key] if used >= cutoff]
+            if len(self.idle[key]) < 1:
+                del self.idle[key]
+            for resource in expired:
+                await self._close(resource)
+
+    async def close(self):
+        for key in list(self.idle):
+            for resource, _ in self.idle.pop(key):
+                await self._close(resource)
+
+    async def _close(self, resource):
+        try:
+            result = self.close_resource(resource)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logger.debug(f"Failed to close pooled resource {resource!r}: {e!r}")
+
+
+class Pools:
+    """ The HTTP sessions, SSH connections, and WinRM connections an app's actions share for the life of the app """
+    def __init__(self):
+        max_idle = config.get_int("APP_POOL_MAX_IDLE", 10)
+        idle_timeout = config.get_float("APP_POOL_IDLE_TIMEOUT", 300)
+
+        self.http_sessions = ResourcePool(self.open_http, lambda session: session.close(),
+                                          healthy=lambda session: not session.closed, shared=True,
+                                          max_idle=max_idle, idle_timeout=idle_timeout)
+        self.ssh_connections = ResourcePool(self.open_ssh, self.close_ssh, healthy=self.ssh_healthy,
+                                            broken=self.ssh_broken, shared=True, max_idle=max_idle,
+                                            idle_timeout=idle_timeout)
+        # WSMan can't tell if its connection is still open, so don't reuse one the server has likely given up on
+        self.winrm_connections = ResourcePool(self.open_winrm, lambda wsman: wsman.close(), max_idle=max_idle,
+                                              idle_timeout=idle_timeout,
+                                              max_idle_age=config.get_float("APP_POOL_WINRM_IDLE_AGE", 60))
+        self.pools = (self.http_sessions, self.ssh_connections, self.winrm_connections)
+
+    def http(self, url):
+        """ An aiohttp session shared by every request to url's scheme, host, and port """
+        origin = urlparse(url)
+        return self.http_sessions.acquire(f"{origin.scheme}://{origin.netloc}")
+
+    def ssh(self, host, port=None, username=None, password=None, **kwargs):
+        """ An asyncssh connection to host, which runs each caller's commands on their own channel """
+        return self.ssh_connections.acquire((host, port, username, password), host=host, port=port,
+                                            username=username, password=password, known_hosts=None, **kwargs)
+
+    def winrm(self, host, username=None, password=None, **kwargs):
+        """ A pypsrp WSMan connection to host for the exclusive use of the caller until it is released """
+        key = (host, username, password, tuple(sorted(kwargs.items())))
+        return self.winrm_connections.acquire(key, host, username=username, password=password, **kwargs)
+
+    @staticmethod
+    async def open_http():
+        return aiohttp.ClientSession()
+
+    @staticmethod
+    async def open_ssh(**kwargs):
+        import asyncssh
+        return await asyncssh.connect(**kwargs)
+
+    @staticmethod
+    def ssh_healthy(conn):
+        # asyncssh drops its transport, and with it the socket, once the connection is lost or closed
+        return conn.get_extra_info("socket") is not None
+
+    @staticmethod
+    def ssh_broken(e):
+        import asyncssh
+        return isinstance(e, CONNECTION_ERRORS + (asyncssh.DisconnectError,))
+
+    @staticmethod
+    async def close_ssh(conn):
+        conn.close()
+        await conn.wait_closed()
+
+    @staticmethod
+    async def open_winrm(host, **kwargs):
+        from pypsrp.wsman import WSMan
+        return WSMan(host, **kwargs)
+
+    async def evict_idle(self):
+        for pool in self.pools:
+            await pool.evict_idle()
+
+    async def close(self):
+        for pool in self.pools:
+            await pool.close()
@@ -4,7 +4,6 @@ import logging
 import json
 
 from pypsrp.client import Process, SignalCode, WinRS, PowerShell as PS, RunspacePool
-from pypsrp.wsman import WSMan
 
 from walkoff_app_sdk.app_base import AppBase
 
@@ -34,7 +33,14 @@ class AdversaryHunting(AppBase):
         timestamp = '{:%Y-%m-%d_%H-%M-%S}'.format(datetime.datetime.now())
         return timestamp
 
-    async def run_script(self, wsman, script):
+    async def run_script(self, host, script, username, password, transport, server_cert_validation,
+                         message_encryption):
+        self.logger.info(f"Executing on {host}")
+        async with self.pools.winrm(host, username, password, ssl=server_cert_validation, auth=transport,
+                                    encryption=message_encryption) as wsman:
+            return await self.run_in_thread(self.invoke_script, wsman, script)
+
+    def invoke_script(self, wsman, script):
         with RunspacePool(wsman) as pool:
             with open(script, "r") as f:
                 script = f.read()
@@ -74,22 +80,8 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Get-DLLInfo.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, "scripts/Get-DLLInfo.ps1", username, password,
+                                        transport, server_cert_validation, message_encryption)
 
     async def get_installed_apps(self, hosts, username, password, transport, server_cert_validation,
                                  message_encryption):
@@ -106,22 +98,8 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Get-InstalledApps.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, "scripts/Get-InstalledApps.ps1", username, password,
+                                        transport, server_cert_validation, message_encryption)
 
     async def get_netstat(self, hosts, username, password, transport, server_cert_validation,
                           message_encryption):
@@ -138,22 +116,8 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Get-NetStat.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, "scripts/Get-NetStat.ps1", username, password,
+                                        transport, server_cert_validation, message_encryption)
 
     async def get_network_adapter(self, hosts, username, password, transport, server_cert_validation,
                                   message_encryption):
@@ -170,22 +134,8 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Get-NetworkAdapter.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, "scripts/Get-NetworkAdapter.ps1", username, password,
+                                        transport, server_cert_validation, message_encryption)
 
     async def get_processes(self, hosts, username, password, transport, server_cert_validation,
                             message_encryption):
@@ -202,22 +152,8 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Get-Processes.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, "scripts/Get-Processes.ps1", username, password,
+                                        transport, server_cert_validation, message_encryption)
 
     async def get_scheduled_task(self, hosts, username, password, transport, server_cert_validation,
                                  message_encryption):
@@ -234,22 +170,8 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Get-ScheduledTask.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, "scripts/Get-ScheduledTask.ps1", username, password,
+                                        transport, server_cert_validation, message_encryption)
 
     async def get_services(self, hosts, username, password, transport, server_cert_validation,
                            message_encryption):
@@ -266,22 +188,8 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Get-Services.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, "scripts/Get-Services.ps1", username, password,
+                                        transport, server_cert_validation, message_encryption)
 
     async def get_memory_kansa(self, hosts, username, password, transport, server_cert_validation,
                                message_encryption):
@@ -298,22 +206,9 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Kansa/Modules/Memory/Get-Memory.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script,
+                                        "scripts/Kansa/Modules/Memory/Get-Memory.ps1",
+                                        username, password, transport, server_cert_validation, message_encryption)
 
     async def get_dns_cache_kansa(self, hosts, username, password, transport, server_cert_validation,
                                   message_encryption):
@@ -330,22 +225,9 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Kansa/Modules/Net/Get-DNSCache.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script,
+                                        "scripts/Kansa/Modules/Net/Get-DNSCache.ps1",
+                                        username, password, transport, server_cert_validation, message_encryption)
 
     async def get_netstat_kansa(self, hosts, username, password, transport, server_cert_validation,
                                 message_encryption):
@@ -362,22 +244,9 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Kansa/Modules/Net/Get-Netstat.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script,
+                                        "scripts/Kansa/Modules/Net/Get-Netstat.ps1",
+                                        username, password, transport, server_cert_validation, message_encryption)
 
     async def get_arp_kansa(self, hosts, username, password, transport, server_cert_validation,
                             message_encryption):
@@ -394,22 +263,9 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Kansa/Modules/Net/Get-Arp.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script,
+                                        "scripts/Kansa/Modules/Net/Get-Arp.ps1",
+                                        username, password, transport, server_cert_validation, message_encryption)
 
     async def get_proc_dump_kansa(self, hosts, username, password, transport, server_cert_validation,
                                   message_encryption):
@@ -426,22 +282,9 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Kansa/Modules/Process/Get-ProcDump.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script,
+                                        "scripts/Kansa/Modules/Process/Get-ProcDump.ps1",
+                                        username, password, transport, server_cert_validation, message_encryption)
 
     async def get_procs_n_modules_kansa(self, hosts, username, password, transport, server_cert_validation,
                                         message_encryption):
@@ -456,24 +299,15 @@ class AdversaryHunting(AppBase):
         :param server_cert_validation: whether or not to verify certificates
         :param message_encryption: When you should encrypt messages
 
-        :return: dict of results with hosts as keys and list of outputs for each specified hosts
+        :return: dict of results with hosts as keys and list of outputs for each specified hosts, in the order the
+            hosts finished
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Kansa/Modules/Process/Get-ProcsNModules.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        # Each host's output is sent on as soon as it finishes rather than waiting on the slowest host
+        async for host, result in self.each_host(hosts, self.run_script,
+                                                 "scripts/Kansa/Modules/Process/Get-ProcsNModules.ps1",
+                                                 username, password, transport, server_cert_validation,
+                                                 message_encryption):
+            yield {host: result}
 
     async def get_procs_wmi_kansa(self, hosts, username, password, transport, server_cert_validation,
                                   message_encryption):
@@ -490,22 +324,9 @@ class AdversaryHunting(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                results[host] = await self.run_script(wsman, "scripts/Kansa/Modules/Process/Get-ProcsWMI.ps1")
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script,
+                                        "scripts/Kansa/Modules/Process/Get-ProcsWMI.ps1",
+                                        username, password, transport, server_cert_validation, message_encryption)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 import socket
 import asyncio
-import time
 import random
 import json
 
@@ -46,7 +45,7 @@ class Basics(AppBase):
         return number + 1
 
     async def pause(self, seconds):
-        time.sleep(seconds)
+        await asyncio.sleep(seconds)
         return seconds
 
     async def random_number(self):
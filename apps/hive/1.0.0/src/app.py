@@ -3,14 +3,21 @@ import asyncio
 import json
 import os
 import time
+from functools import lru_cache
 
 from thehive4py.api import TheHiveApi
 from thehive4py.models import CaseHelper, CaseTask, CaseObservable
-from walkoff_app_sdk.app_base import AppBase
+from walkoff_app_sdk.app_base import AppBase, blocking
 
 logger = logging.getLogger("apps")
 
 
+@lru_cache(maxsize=32)
+def hive_api(url, api_key):
+    """ Clients are kept between actions so that their HTTP connections are reused """
+    return TheHiveApi(url, api_key)
+
+
 class Hive(AppBase):
     __version__ = "1.0.0"
     app_name = "hive"
@@ -18,13 +25,14 @@ class Hive(AppBase):
     def __init__(self, redis, logger):
         super().__init__(redis, logger)
 
-    async def create_case(self, url, api_key, title, description="", tlp=2, severity=1, tags=None):
+    @blocking
+    def create_case(self, url, api_key, title, description="", tlp=2, severity=1, tags=None):
         tags = tags if tags else []
 
         if not url.startswith("http"):
             url = f"http://{url}"
 
-        api = TheHiveApi(url, api_key)
+        api = hive_api(url, api_key)
         self.logger.info('Creating a case in TheHive...')
         case_helper = CaseHelper(api)
         tags.append(f"walkoff_execution_id: {self.current_execution_id}")
@@ -37,15 +45,16 @@ class Hive(AppBase):
 
         return case_helper.create(title, description, **case_kwargs).id
 
-    async def update_case(self, case_id, url, api_key, title=None, description=None, tlp=None, severity=None,
-                          tags=None, tags_mode="append"):
+    @blocking
+    def update_case(self, case_id, url, api_key, title=None, description=None, tlp=None, severity=None,
+                    tags=None, tags_mode="append"):
 
         self.logger.info(f'Updating case {case_id} in TheHive...')
 
         if not url.startswith("http"):
             url = f"http://{url}"
 
-        api = TheHiveApi(url, api_key)
+        api = hive_api(url, api_key)
         case_helper = CaseHelper(api)
 
         case_kwargs = {}
@@ -64,14 +73,15 @@ class Hive(AppBase):
 
         return case_helper.update(case_id, **case_kwargs).id
 
-    async def close_case(self, case_id, url, api_key, resolution_status, impact_status, summary, tags=None,
-                         tags_mode="append"):
+    @blocking
+    def close_case(self, case_id, url, api_key, resolution_status, impact_status, summary, tags=None,
+                   tags_mode="append"):
         self.logger.info(f'Closing case {case_id} in TheHive...')
 
         if not url.startswith("http"):
             url = f"http://{url}"
 
-        api = TheHiveApi(url, api_key)
+        api = hive_api(url, api_key)
         case_helper = CaseHelper(api)
 
         case_kwargs = {"status": "Resolved",
@@ -86,14 +96,15 @@ class Hive(AppBase):
 
         return case_helper.update(case_id, **case_kwargs).id
 
-    async def create_case_task(self, case_id, url, api_key, data=None):
+    @blocking
+    def create_case_task(self, case_id, url, api_key, data=None):
 
         self.logger.info(f'Creating task for {case_id} in TheHive...')
 
         if not url.startswith("http"):
             url = f"http://{url}"
 
-        api = TheHiveApi(url, api_key)
+        api = hive_api(url, api_key)
 
         results = {}
         for item in data:
@@ -114,13 +125,14 @@ class Hive(AppBase):
 
         return results
 
-    async def update_case_task(self, url, api_key, task_id, title=None, description=None, status=None, flag=None):
+    @blocking
+    def update_case_task(self, url, api_key, task_id, title=None, description=None, status=None, flag=None):
         self.logger.info(f'Updating task {task_id} in TheHive...')
 
         if not url.startswith("http"):
             url = f"http://{url}"
 
-        api = TheHiveApi(url, api_key)
+        api = hive_api(url, api_key)
         task = CaseTask(**api.get_case_task(task_id).json())
         task.id = task_id
 
@@ -139,8 +151,9 @@ class Hive(AppBase):
         else:
             raise IOError(r.text)
 
-    async def create_case_observable(self, case_id, url, api_key, data_type, data, description=None, tlp=0,
-                                     is_ioc=False, is_sighted=False, tags=None):
+    @blocking
+    def create_case_observable(self, case_id, url, api_key, data_type, data, description=None, tlp=0,
+                               is_ioc=False, is_sighted=False, tags=None):
 
         tags = tags if tags is not None else []
 
@@ -149,7 +162,7 @@ class Hive(AppBase):
         if not url.startswith("http"):
             url = f"http://{url}"
 
-        api = TheHiveApi(url, api_key)
+        api = hive_api(url, api_key)
 
         obs = CaseObservable(dataType=data_type,
                              message=description,
@@ -166,14 +179,15 @@ class Hive(AppBase):
         else:
             raise IOError(r.text)
 
-    async def update_case_observable(self, url, api_key, case_id, obs_id, description=None, tlp=0,
-                                     is_ioc=False, is_sighted=False, tags=None, tags_mode=None):
+    @blocking
+    def update_case_observable(self, url, api_key, case_id, obs_id, description=None, tlp=0,
+                               is_ioc=False, is_sighted=False, tags=None, tags_mode=None):
         self.logger.info(f'Updating observable {obs_id} in case {case_id} in TheHive...')
 
         if not url.startswith("http"):
             url = f"http://{url}"
 
-        api = TheHiveApi(url, api_key)
+        api = hive_api(url, api_key)
         obs_list = api.get_case_observables(case_id).json()
         obs_json = [obs for obs in obs_list if obs["id"] == obs_id][0]
         obs = CaseObservable(**obs_json)
@@ -199,12 +213,13 @@ class Hive(AppBase):
         else:
             raise IOError(r.text)
 
-    async def lock_hive_user(self, url, api_key, users):
+    @blocking
+    def lock_hive_user(self, url, api_key, users):
 
         if not url.startswith("http"):
             url = f"http://{url}"
 
-        api = TheHiveApi(url, api_key)
+        api = hive_api(url, api_key)
         result = {}
 
         for user in users:
@@ -218,12 +233,13 @@ class Hive(AppBase):
 
         return result
 
-    async def unlock_hive_user(self, url, api_key, users):
+    @blocking
+    def unlock_hive_user(self, url, api_key, users):
 
         if not url.startswith("http"):
             url = f"http://{url}"
 
-        api = TheHiveApi(url, api_key)
+        api = hive_api(url, api_key)
         result = {}
 
         for user in users:
@@ -4,7 +4,6 @@ import logging
 import json
 
 from pypsrp.client import Process, SignalCode, WinRS, PowerShell as PS, RunspacePool
-from pypsrp.wsman import WSMan
 
 from walkoff_app_sdk.app_base import AppBase
 
@@ -34,6 +33,30 @@ class MitreAttack(AppBase):
         timestamp = '{:%Y-%m-%d_%H-%M-%S}'.format(datetime.datetime.now())
         return timestamp
 
+    async def run_script(self, host, script, username, password, transport, server_cert_validation,
+                         message_encryption):
+        self.logger.info(f"Executing on {host}")
+        async with self.pools.winrm(host, username, password, ssl=server_cert_validation, auth=transport,
+                                    encryption=message_encryption) as wsman:
+            return await self.run_in_thread(self.invoke_script, wsman, script)
+
+    def invoke_script(self, wsman, script):
+        with RunspacePool(wsman) as pool:
+            ps = PS(pool)
+            ps.add_script(script)
+            ps.invoke()
+            this_result = []
+            for line in ps.output:
+                this_result.append({
+                    "name": str(line),
+                    "adapted_properties": json.loads(json.dumps(line.adapted_properties, cls=ObjectEncoder)),
+                    "extended_properties": json.loads(json.dumps(line.extended_properties, cls=ObjectEncoder))
+                })
+            if ps.had_errors:
+                return {"stdout": "", "stderr": this_result}
+            else:
+                return {"stdout": this_result, "stderr": ""}
+
     async def account_manipulation(self, hosts, username, password, transport,
                                                server_cert_validation,
                                                message_encryption):
@@ -50,41 +73,13 @@ class MitreAttack(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
+        # This script returns events regarding account objects being changed
+        # as well as account names being changed
 
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
+        script = "Get-WinEvent -LogName security | Where-Object {$_.ID -eq 4738 -or $_.ID -eq 4781}"
 
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                with RunspacePool(wsman) as pool:
-                    # This script returns events regarding account objects being changed
-                    # as well as account names being changed
-
-                    script = "Get-WinEvent -LogName security | Where-Object {$_.ID -eq 4738 -or $_.ID -eq 4781}"
-
-                    ps = PS(pool)
-                    ps.add_script(script)
-                    ps.invoke()
-                    this_result = []
-                    for line in ps.output:
-                        this_result.append({
-                            "name": str(line),
-                            "adapted_properties": json.loads(json.dumps(line.adapted_properties, cls=ObjectEncoder)),
-                            "extended_properties": json.loads(json.dumps(line.extended_properties, cls=ObjectEncoder))
-                        })
-                    if ps.had_errors:
-                        results[host] = {"stdout": "", "stderr": this_result}
-                    else:
-                        results[host] = {"stdout": this_result, "stderr": ""}
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, script, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
     async def scheduled_tasks(self, hosts, username, password, transport, server_cert_validation,
                                                message_encryption):
@@ -99,44 +94,15 @@ class MitreAttack(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
+        script = """
+        wevtutil sl  Microsoft-Windows-TaskScheduler/Operational  /e:true
 
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
+        Get-WinEvent -LogName  'Microsoft-Windows-TaskScheduler/Operational' | Where-Object  $_.Id -eq 106 
+        -or ($_.Id -eq 140) -or $_.Id -eq 141  } | Format-Table TimeCreated,Id,LevelDisplayName,Message
+        """
 
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                with RunspacePool(wsman) as pool:
-
-                    script = """
-                    wevtutil sl  Microsoft-Windows-TaskScheduler/Operational  /e:true
-                    
-                    Get-WinEvent -LogName  'Microsoft-Windows-TaskScheduler/Operational' | Where-Object  $_.Id -eq 106 
-                    -or ($_.Id -eq 140) -or $_.Id -eq 141  } | Format-Table TimeCreated,Id,LevelDisplayName,Message
-                    """
-
-                    ps = PS(pool)
-                    ps.add_script(script)
-                    ps.invoke()
-                    this_result = []
-                    for line in ps.output:
-                        this_result.append({
-                            "name": str(line),
-                            "adapted_properties": json.loads(json.dumps(line.adapted_properties, cls=ObjectEncoder)),
-                            "extended_properties": json.loads(json.dumps(line.extended_properties, cls=ObjectEncoder))
-                        })
-                    if ps.had_errors:
-                        results[host] = {"stdout": "", "stderr": this_result}
-                    else:
-                        results[host] = {"stdout": this_result, "stderr": ""}
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, script, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
     async def pass_the_hash_one(self, hosts, username, password, transport, server_cert_validation,
                               message_encryption):
@@ -151,41 +117,13 @@ class MitreAttack(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
+        # This script searches event logs for successful logons,
+        # Logon attmepts, and failed logon attempts
 
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
+        script = "Get-WinEvent -LogName security | Where-Object {$_.ID -eq 4624 -or $_.ID -eq 4648 -or $_.ID -eq 4625} | Format-Table TimeCreated,Id,LevelDisplayName,Message"
 
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                with RunspacePool(wsman) as pool:
-                    # This script searches event logs for successful logons,
-                    # Logon attmepts, and failed logon attempts
-
-                    script = "Get-WinEvent -LogName security | Where-Object {$_.ID -eq 4624 -or $_.ID -eq 4648 -or $_.ID -eq 4625} | Format-Table TimeCreated,Id,LevelDisplayName,Message"
-
-                    ps = PS(pool)
-                    ps.add_script(script)
-                    ps.invoke()
-                    this_result = []
-                    for line in ps.output:
-                        this_result.append({
-                            "name": str(line),
-                            "adapted_properties": json.loads(json.dumps(line.adapted_properties, cls=ObjectEncoder)),
-                            "extended_properties": json.loads(json.dumps(line.extended_properties, cls=ObjectEncoder))
-                        })
-                    if ps.had_errors:
-                        results[host] = {"stdout": "", "stderr": this_result}
-                    else:
-                        results[host] = {"stdout": this_result, "stderr": ""}
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, script, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
     async def modify_existing_service(self, hosts, username, password, transport, server_cert_validation,
                               message_encryption):
@@ -200,41 +138,13 @@ class MitreAttack(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
+        # This script searches event logs for successful logons,
+        # Logon attmepts, and failed logon attempts
 
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
+        script = "Get-ChildItem ‘HKLM:\SYSTEM\CurrentControlSet\Services' -Recurse"
 
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                with RunspacePool(wsman) as pool:
-                    # This script searches event logs for successful logons,
-                    # Logon attmepts, and failed logon attempts
-
-                    script = "Get-ChildItem ‘HKLM:\SYSTEM\CurrentControlSet\Services' -Recurse"
-
-                    ps = PS(pool)
-                    ps.add_script(script)
-                    ps.invoke()
-                    this_result = []
-                    for line in ps.output:
-                        this_result.append({
-                            "name": str(line),
-                            "adapted_properties": json.loads(json.dumps(line.adapted_properties, cls=ObjectEncoder)),
-                            "extended_properties": json.loads(json.dumps(line.extended_properties, cls=ObjectEncoder))
-                        })
-                    if ps.had_errors:
-                        results[host] = {"stdout": "", "stderr": this_result}
-                    else:
-                        results[host] = {"stdout": this_result, "stderr": ""}
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, script, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
     async def accessibility_features(self, hosts, username, password, transport, server_cert_validation,
                               message_encryption):
@@ -249,40 +159,13 @@ class MitreAttack(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
+        # This script searches event logs for successful logons,
+        # Logon attmepts, and failed logon attempts
 
-        for host in hosts:
-            self.logger.info(f"Executing on {host}")
-            results[host] = ""
+        script =  "Get-ChildItem ‘HKLM:\SOFTWARE\Microsoft\Windows NT\CurrentVersion\Image File Execution Options' -Recurse"
 
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                with RunspacePool(wsman) as pool:
-                    # This script searches event logs for successful logons,
-                    # Logon attmepts, and failed logon attempts
-
-                    script =  "Get-ChildItem ‘HKLM:\SOFTWARE\Microsoft\Windows NT\CurrentVersion\Image File Execution Options' -Recurse"
-                    ps = PS(pool)
-                    ps.add_script(script)
-                    ps.invoke()
-                    this_result = []
-                    for line in ps.output:
-                        this_result.append({
-                            "name": str(line),
-                            "adapted_properties": json.loads(json.dumps(line.adapted_properties, cls=ObjectEncoder)),
-                            "extended_properties": json.loads(json.dumps(line.extended_properties, cls=ObjectEncoder))
-                        })
-                    if ps.had_errors:
-                        results[host] = {"stdout": "", "stderr": this_result}
-                    else:
-                        results[host] = {"stdout": this_result, "stderr": ""}
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+        return await self.for_each_host(hosts, self.run_script, script, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
 
 if __name__ == "__main__":
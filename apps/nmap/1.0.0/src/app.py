@@ -1,7 +1,6 @@
 from libnmap.process import NmapProcess
 from libnmap.parser import NmapParser
 import os
-import concurrent.futures
 
 import asyncio
 
@@ -18,20 +17,16 @@ class Nmap(AppBase):
         super().__init__(redis, logger)
 
     async def run_scan(self, targets, options):
-        results = []
+        # Each target's output is sent on as soon as its scan finishes
         for target in targets:
             nmap_proc = NmapProcess(target, options)
-
-            executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(executor, nmap_proc.run)
+            await self.run_in_thread(nmap_proc.run)
 
             try:
-                results.append(nmap_proc.stdout)
+                output = nmap_proc.stdout
             except Exception as e:
-                results.append(e)
-
-        return results
+                output = f"{e}"
+            yield output
 
 
     async def get_hosts_from_scan(self, targets, options):
@@ -39,10 +34,7 @@ class Nmap(AppBase):
 
         for target in targets:
             nmap_proc = NmapProcess(targets=target, options=options)
-            
-            executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(executor, nmap_proc.run)
+            await self.run_in_thread(nmap_proc.run)
 
             nmap_report_obj = NmapParser.parse(nmap_proc.stdout)
 
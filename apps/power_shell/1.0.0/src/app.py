@@ -5,7 +5,6 @@ import json
 import os
 
 from pypsrp.client import Client, Process, SignalCode, WinRS, PowerShell as PS, RunspacePool
-from pypsrp.wsman import WSMan
 
 from walkoff_app_sdk.app_base import AppBase
 
@@ -35,6 +34,12 @@ class PowerShell(AppBase):
         timestamp = '{:%Y-%m-%d_%H-%M-%S}'.format(datetime.datetime.now())
         return timestamp
 
+    async def with_winrm(self, host, func, username, password, transport, server_cert_validation, message_encryption):
+        """ Runs func(host, wsman) in the thread pool with a pooled WinRM connection to host """
+        async with self.pools.winrm(host, username, password, ssl=server_cert_validation, auth=transport,
+                                    encryption=message_encryption) as wsman:
+            return await self.run_in_thread(func, host, wsman)
+
 
     async def exec_command_prompt_from_file(self, hosts, local_file_name, username, password, transport,
                                             server_cert_validation,
@@ -52,27 +57,20 @@ class PowerShell(AppBase):
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
 
-        results = {}
-
-        for host in hosts:
-            results[host] = ""
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                with WinRS(wsman) as shell:
-                    with open(local_file_name, "r") as f:
-                        script = f.read()
-                    process = Process(shell, script)
-                    process.invoke()
-                    results[host] = {"stdout": process.stdout.decode(), "stderr": process.stderr.decode()}
-                    process.signal(SignalCode.CTRL_C)
+        def exec_on_host(host, wsman):
+            with WinRS(wsman) as shell:
+                with open(local_file_name, "r") as f:
+                    script = f.read()
+                process = Process(shell, script)
+                process.invoke()
+                result = {"stdout": process.stdout.decode(), "stderr": process.stderr.decode()}
+                process.signal(SignalCode.CTRL_C)
 
-                    self.logger.info(f"Done executing on {host}")
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
+                self.logger.info(f"Done executing on {host}")
+            return result
 
-        return results
+        return await self.for_each_host(hosts, self.with_winrm, exec_on_host, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
     async def exec_command_prompt(self, hosts, commands, username, password, transport, server_cert_validation,
                                   message_encryption):
@@ -89,25 +87,18 @@ class PowerShell(AppBase):
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
 
-        results = {}
-
-        for host in hosts:
-            results[host] = ""
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                with WinRS(wsman) as shell:
-                    for command in commands:
-                        process = Process(shell, command)
-                        process.invoke()
-                        results[host] = {"stdout": process.stdout.decode(), "stderr": process.stderr.decode()}
-                        process.signal(SignalCode.CTRL_C)
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
+        def exec_on_host(host, wsman):
+            result = ""
+            with WinRS(wsman) as shell:
+                for command in commands:
+                    process = Process(shell, command)
+                    process.invoke()
+                    result = {"stdout": process.stdout.decode(), "stderr": process.stderr.decode()}
+                    process.signal(SignalCode.CTRL_C)
+            return result
 
-        return results
+        return await self.for_each_host(hosts, self.with_winrm, exec_on_host, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
     async def exec_powershell_script_from_file(self, hosts, shell_type, local_file_name, username, password, transport,
                                                server_cert_validation,
@@ -125,41 +116,31 @@ class PowerShell(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
+        def exec_on_host(host, wsman):
             self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                with RunspacePool(wsman) as pool:
-                    with open(local_file_name, "r") as f:
-                        script = f.read()
-                    ps = PS(pool)
-                    ps.add_script(script)
-                    ps.invoke()
-                    this_result = []
-                    for line in ps.output:
-                        if type(line) is str:
-                            this_result.append(line)
-                        else:
-                            this_result.append({
-                                "types": line.types,
-                                "adapted_properties": json.loads(json.dumps(line.adapted_properties, cls=ObjectEncoder)),
-                                "extended_properties": json.loads(json.dumps(line.extended_properties, cls=ObjectEncoder))
-                            })
-                    if ps.had_errors:
-                        results[host] = {"stdout": "", "stderr": this_result}
+            with RunspacePool(wsman) as pool:
+                with open(local_file_name, "r") as f:
+                    script = f.read()
+                ps = PS(pool)
+                ps.add_script(script)
+                ps.invoke()
+                this_result = []
+                for line in ps.output:
+                    if type(line) is str:
+                        this_result.append(line)
                     else:
-                        results[host] = {"stdout": this_result, "stderr": ""}
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
-
-        return results
+                        this_result.append({
+                            "types": line.types,
+                            "adapted_properties": json.loads(json.dumps(line.adapted_properties, cls=ObjectEncoder)),
+                            "extended_properties": json.loads(json.dumps(line.extended_properties, cls=ObjectEncoder))
+                        })
+                if ps.had_errors:
+                    return {"stdout": "", "stderr": this_result}
+                else:
+                    return {"stdout": this_result, "stderr": ""}
+
+        return await self.for_each_host(hosts, self.with_winrm, exec_on_host, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
     async def exec_powershell_script(self, hosts, shell_type, arguments, username, password, transport,
                                      server_cert_validation,
@@ -177,29 +158,21 @@ class PowerShell(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
+        def exec_on_host(host, wsman):
             self.logger.info(f"Executing on {host}")
-            results[host] = ""
-
-            try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
-
-                with WinRS(wsman) as shell:
-                    for arg in arguments:
-                        process = Process(shell, shell_type, [arg])
-                        process.begin_invoke()  # start the invocation and return immediately
-                        process.poll_invoke()  # update the output stream
-                        process.end_invoke()  # finally wait until the process is finished
-                        results[host] = {"stdout": process.stdout.decode(), "stderr": process.stderr.decode()}
-                        process.signal(SignalCode.CTRL_C)
-
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
+            result = ""
+            with WinRS(wsman) as shell:
+                for arg in arguments:
+                    process = Process(shell, shell_type, [arg])
+                    process.begin_invoke()  # start the invocation and return immediately
+                    process.poll_invoke()  # update the output stream
+                    process.end_invoke()  # finally wait until the process is finished
+                    result = {"stdout": process.stdout.decode(), "stderr": process.stderr.decode()}
+                    process.signal(SignalCode.CTRL_C)
+            return result
 
-        return results
+        return await self.for_each_host(hosts, self.with_winrm, exec_on_host, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
     async def exec_powershell_script_dependencies(self, hosts, shell_type, arguments, dependency_folder, destination_folder, username, password, transport,
                                                      server_cert_validation,
@@ -219,17 +192,14 @@ class PowerShell(AppBase):
 
         :return: dict of results with hosts as keys and list of outputs for each specified hosts
         """
-        results = {}
-
-        for host in hosts:
+        def exec_on_host(host, wsman):
             self.logger.info(f"Connecting to {host}")
-            results[host] = []
+            result = []
 
             try:
-                wsman = WSMan(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
-                              username=username, password=password)
                 client = Client(host, ssl=server_cert_validation, auth=transport, encryption=message_encryption,
                               username=username, password=password)
+                client.wsman = wsman  # Use the pooled connection rather than opening a second one
 
                 self.logger.info(f"Copying to {host}")
                 for root, dirs, files in os.walk(dependency_folder):
@@ -242,7 +212,7 @@ class PowerShell(AppBase):
                             Write-Host "New folder created"
                         }''' % root_folder)
 
-                    results[host].append({"stdout": output, "had_errors": had_errors})
+                    result.append({"stdout": output, "had_errors": had_errors})
                     for file in files:
                         client.copy(os.path.join(root, file), root_folder + "\\" + file)
 
@@ -251,24 +221,27 @@ class PowerShell(AppBase):
                 # execute scripts
                 with WinRS(wsman) as shell:
                     #Changes directory to dependency root and appends folder removal to end
-                    arguments = f"cd {destination_folder};" + '; '.join(arguments) 
-                    self.logger.info(f"{arguments}")
-                    process = Process(shell, shell_type, [arguments])
+                    script = f"cd {destination_folder};" + '; '.join(arguments)
+                    self.logger.info(f"{script}")
+                    process = Process(shell, shell_type, [script])
                     process.invoke()
-                    results[host].append({"stdout": process.stdout.decode(), "stderr": process.stderr.decode()})
+                    result.append({"stdout": process.stdout.decode(), "stderr": process.stderr.decode()})
 
-                    arguments = f"Remove-Item -Recurse {destination_folder}"
+                    script = f"Remove-Item -Recurse {destination_folder}"
                     self.logger.info(f"Removing from {host}")
-                    process = Process(shell, shell_type, [arguments])
+                    process = Process(shell, shell_type, [script])
                     process.invoke()
                     process.signal(SignalCode.CTRL_C)
 
             except Exception as e:
                 import traceback
                 tb = traceback.format_exc()
-                results[host].append({"stdout": "", "stderr": f"{e}", "exception": f"{tb}" })
+                result.append({"stdout": "", "stderr": f"{e}", "exception": f"{tb}" })
+
+            return result
 
-        return results
+        return await self.for_each_host(hosts, self.with_winrm, exec_on_host, username, password, transport,
+                                        server_cert_validation, message_encryption)
 
 
 if __name__ == "__main__":
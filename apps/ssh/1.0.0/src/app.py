@@ -24,20 +24,16 @@ class SSH(AppBase):
         return {"stdout": str(stdout), "stderr": str(stderr)}
 
     async def exec_command(self, hosts, port=None, args=None, username=None, password=None):
-        results = {}
-
-        for host in hosts:
-            try:
-                async with asyncssh.connect(host=host, port=port, username=username, password=password,
-                                            known_hosts=None) as conn:
-                    for cmd in args:
-                        temp = await conn.run(cmd)
-                        output = temp.stdout
-                        results[host] = {"stdout": output, "stderr": ""}
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
+        async def exec_on_host(host):
+            result = {"stdout": "", "stderr": ""}
+            async with self.pools.ssh(host, port, username, password) as conn:
+                for cmd in args:
+                    temp = await conn.run(cmd)
+                    output = temp.stdout
+                    result = {"stdout": output, "stderr": ""}
+            return result
 
-        return results
+        return await self.for_each_host(hosts, exec_on_host)
 
     async def sftp_copy(self, src_path, dest_path, src_host, src_port, src_username, src_password, dest_host,
                              dest_port, dest_username, dest_password):
@@ -142,29 +138,23 @@ class SSH(AppBase):
         return "Successfully Copied File."
 
     async def run_shell_script_file(self, local_file_name, hosts, port, username, password):
-        results = {}
-
         curr_dir = os.getcwd()
         temp_dir = os.path.join(curr_dir, r'shared')
         os.chdir(temp_dir)
         curr_dir = os.getcwd()
         local_file_path = os.path.join(curr_dir, local_file_name)
 
-        for host in hosts:
-            try:
-                async with asyncssh.connect(host=host, port=port, username=username, password=password,
-                                            known_hosts=None) as conn:
-                    logger.info(f"Local file path -> {local_file_name}")
-                    with open(local_file_path, "r") as f:
-                        script = f.read()
-                    cmd = script
-                    temp = await conn.run(cmd)
-                    output = temp.stdout
-                    results[host] = {"stdout": output, "stderr": ""}
-            except Exception as e:
-                results[host] = {"stdout": "", "stderr": f"{e}"}
+        logger.info(f"Local file path -> {local_file_name}")
+        with open(local_file_path, "r") as f:
+            script = f.read()
+
+        async def run_on_host(host):
+            async with self.pools.ssh(host, port, username, password) as conn:
+                temp = await conn.run(script)
+                output = temp.stdout
+                return {"stdout": output, "stderr": ""}
 
-        return results
+        return await self.for_each_host(hosts, run_on_host)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 import socket
 import asyncio
-import aiohttp
 import time
 import logging
 import json
@@ -159,13 +158,8 @@ class Walkoff(AppBase):
             return response
 
     async def fetch_http(self, method, url, **kwargs):
-        session = aiohttp.ClientSession()
-        try:
-            async with session.get(url) as response:
-                resp = await session.request(method=method, url=url, **kwargs)
-                return resp
-        finally:
-            await session.close()
+        async with self.pools.http(url) as session:
+            return await session.request(method=method, url=url, **kwargs)
 
     async def _request(self, method, address, timeout=5, headers=None, data=None, **kwargs):
         address = '{0}{1}'.format(WALKOFF_ADDRESS_DEFAULT, address)
@@ -77,7 +77,8 @@ def compose_from_app(path: pathlib.Path, name):
     networks = {"networks": ["walkoff_network"]}
     deploy = {"deploy": {"mode": "replicated", "replicas": 0, "restart_policy": {"condition": "none"}}}
     config_mount = {"configs": ["common_env.yml"]}
-    secret_mount = {"secrets": ["walkoff_encryption_key", "walkoff_redis_key"]}
+    secret_mount = {"secrets": ["walkoff_encryption_key", "walkoff_redis_key", "walkoff_minio_access_key",
+                                "walkoff_minio_secret_key"]}
     shared_path = os.getcwd() + "/data/shared"
     final_mount = shared_path + ":/app/shared"
     volumes_mount = {"volumes": [final_mount]}
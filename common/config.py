@@ -83,6 +83,17 @@ class Static:
     REDIS_WORKFLOW_CONTROL = "workflow-control"
     REDIS_WORKFLOW_CONTROL_GROUP = "workflow-control-group"
     REDIS_RESULTS_QUEUE = "results-queue"
+    REDIS_RESULTS_GROUP = "results-group"
+    REDIS_RESULTS_CONSUMERS = "results-consumers"
+    REDIS_RESULTS_LAG = "results-lag"
+    REDIS_EXECUTION_PLANS = "execution-plans"
+    REDIS_GLOBALS_VERSION = "globals-version"
+    REDIS_AUTH_CHANNEL = "auth-changes"
+    REDIS_ACTIVE_STREAMS = "active-streams"
+    REDIS_ACTIVE_APP_GROUPS = "active-app-groups"
+
+    # Minio options
+    MINIO_RESULTS_BUCKET = "results-bucket"
 
     # File paths
     # API_PATH = Path("api") / "api"
@@ -96,6 +107,7 @@ class Static:
     SIO_NS_WORKFLOW = "/workflowStatus"
     SIO_NS_BUILD = "/buildStatus"
     SIO_EVENT_LOG = "log"
+    SIO_EVENT_LOGS = "logs"
 
     SWAGGER_URL = "/walkoff/api/docs"
 
@@ -117,6 +129,10 @@ class Config:
     REDIS_URI = os.getenv("REDIS_URI", f"redis://{Static.REDIS_SERVICE}:6379")
     MINIO = os.getenv("MINIO", f"{Static.MINIO_SERVICE}:9000")
     SOCKETIO_URI = os.getenv("SOCKETIO_URI", f"http://{Static.SOCKETIO_SERVICE}:3000")
+    # Results larger than this many bytes of JSON are kept in MinIO and passed around by reference, 0 disables
+    RESULT_STORE_THRESHOLD = os.getenv("RESULT_STORE_THRESHOLD", "1048576")
+    RESULT_SUMMARY_SIZE = os.getenv("RESULT_SUMMARY_SIZE", "1024")  # characters of a stored result kept inline
+    RESULTS_QUEUE_PARTITIONS = os.getenv("RESULTS_QUEUE_PARTITIONS", "16")  # streams status updates are spread over
 
     # Key locations
     ENCRYPTION_KEY_PATH = os.getenv("ENCRYPTION_KEY_PATH", Static.SECRET_BASE_PATH / Static.ENCRYPTION_KEY)
@@ -130,7 +146,15 @@ class Config:
     # Worker options
     MAX_WORKER_REPLICAS = os.getenv("MAX_WORKER_REPLICAS", "10")
     WORKER_TIMEOUT = os.getenv("WORKER_TIMEOUT", "30")
+    WORKER_MAX_CONCURRENT_WORKFLOWS = os.getenv("WORKER_MAX_CONCURRENT_WORKFLOWS", "10")
+    WORKER_RESULTS_BATCH_SIZE = os.getenv("WORKER_RESULTS_BATCH_SIZE", "100")
+    WORKER_RESULTS_TIMEOUT = os.getenv("WORKER_RESULTS_TIMEOUT", "1000")  # milliseconds to block on a results stream
+    WORKER_PARALLEL_SHARD_SIZE = os.getenv("WORKER_PARALLEL_SHARD_SIZE", "1")  # values per parallelized action
+    WORKER_MAX_PARALLEL_SHARDS = os.getenv("WORKER_MAX_PARALLEL_SHARDS", "100")  # shards in flight per action
+    WORKER_STATUS_FLUSH_MS = os.getenv("WORKER_STATUS_FLUSH_MS", "5")  # how long to buffer status updates for
     WALKOFF_USERNAME = os.getenv("WALKOFF_USERNAME", '')
+    WORKER_PLAN_CACHE_SIZE = os.getenv("WORKER_PLAN_CACHE_SIZE", "128")
+    WORKER_PLAN_CACHE_TTL = os.getenv("WORKER_PLAN_CACHE_TTL", "0")  # seconds to share plans in redis, 0 disables
 
     # Umpire options
     APPS_PATH = os.getenv("APPS_PATH", "./apps")
@@ -147,6 +171,9 @@ class Config:
     SERVER_DB_NAME = os.getenv("SERVER_DB", "walkoff")
     EXECUTION_DB_NAME = os.getenv("EXECUTION_DB", "execution")
     DB_USERNAME = os.getenv("DB_USERNAME", "walkoff")
+    API_RESULTS_BATCH_SIZE = os.getenv("API_RESULTS_BATCH_SIZE", "500")  # status updates written to mongo at once
+    API_RESULTS_LEASE = os.getenv("API_RESULTS_LEASE", "10")  # seconds a results queue partition is leased for
+    API_SIO_EMIT_MS = os.getenv("API_SIO_EMIT_MS", "100")  # how long to batch status events for before emitting
 
     # Bootloader options
     BASE_COMPOSE = os.getenv("BASE_COMPOSE", "./bootloader/base-compose.yml")
@@ -155,7 +182,19 @@ class Config:
 
     # App options
     MAX_APP_REPLICAS = os.getenv("MAX_APP_REPLICAS", "10")
-    APP_TIMEOUT = os.getenv("APP_TIMEOUT", "30")  # ??
+    # "execution" sends actions to a stream per execution and app, "app" to a single long-lived stream per app
+    APP_STREAM_MODE = os.getenv("APP_STREAM_MODE", "execution")
+    APP_TIMEOUT = os.getenv("APP_TIMEOUT", "30")  # seconds an app waits without work before exiting
+    APP_READ_TIMEOUT = os.getenv("APP_READ_TIMEOUT", "1000")  # milliseconds to block on action streams
+    APP_MAX_CONCURRENT_ACTIONS = os.getenv("APP_MAX_CONCURRENT_ACTIONS", "1")  # actions each app replica runs at once
+    APP_THREAD_POOL_SIZE = os.getenv("APP_THREAD_POOL_SIZE", "10")  # threads shared by an app's blocking actions
+    APP_PROCESS_POOL_SIZE = os.getenv("APP_PROCESS_POOL_SIZE", "2")  # processes shared by an app's CPU bound work
+    APP_HOST_CONCURRENCY = os.getenv("APP_HOST_CONCURRENCY", "10")  # hosts an action works on at once
+    APP_HOST_TIMEOUT = os.getenv("APP_HOST_TIMEOUT", "300")  # seconds an action may spend on each host, 0 disables
+    APP_POOL_MAX_IDLE = os.getenv("APP_POOL_MAX_IDLE", "10")  # idle connections an app keeps per endpoint
+    APP_POOL_IDLE_TIMEOUT = os.getenv("APP_POOL_IDLE_TIMEOUT", "300")  # seconds before an idle connection is closed
+    APP_POOL_WINRM_IDLE_AGE = os.getenv("APP_POOL_WINRM_IDLE_AGE", "60")  # seconds idle before WinRM reconnects
+    APP_PENDING_INTERVAL = os.getenv("APP_PENDING_INTERVAL", "30")  # seconds between checks for unacked actions
 
     # Overrides the environment variables for docker-compose and docker commands on the docker machine at 'DOCKER_HOST'
     # See: https://docs.docker.com/compose/reference/envvars/ for more information.
@@ -1,11 +1,14 @@
+import asyncio
 import logging
 import json
-from base64 import b64encode
+import time
+from base64 import b64encode, urlsafe_b64decode
 from uuid import UUID
 
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from common.config import config, static
+from common.redis_helpers import results_partition
 from common.message_types import (message_dumps, NodeStatusMessage, WorkflowStatusMessage,
                                   StatusEnum, JSONPatch, JSONPatchOps)
 
@@ -55,6 +58,75 @@ async def get_walkoff_auth_header(session, token=None, timeout=5 * 60):
     return {"Authorization": f"Bearer {access_token}"}, token
 
 
+def jwt_expiry(token):
+    """ Reads the expiry time out of a JWT's claims without verifying it. Returns None if it has none. """
+    try:
+        claims = token.split(".")[1]
+        return float(json.loads(urlsafe_b64decode(claims + "=" * (-len(claims) % 4)))["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class WalkoffAuth:
+    """
+        Holds the JWTs used by internal services to call the API. The access token is reused until shortly before
+        it expires and is then refreshed in the background. Concurrent callers needing a new token share one refresh.
+    """
+
+    def __init__(self, leeway=60):
+        self.leeway = leeway
+        self.refresh_token = None
+        self.headers = None
+        self.expires_at = None
+        self.refreshing = None
+        self.refresher = None
+
+    def stale(self):
+        return self.headers is None or self.expires_at is None or time.time() >= self.expires_at - self.leeway
+
+    async def get_header(self, session, timeout=5 * 60):
+        if self.stale():
+            await self.refresh(session, timeout)
+        return self.headers
+
+    async def refresh(self, session, timeout=5 * 60):
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.ensure_future(self._refresh(session, timeout))
+
+        # Shielded so one caller being cancelled doesn't cancel the refresh for everyone else
+        await asyncio.shield(self.refreshing)
+
+    async def _refresh(self, session, timeout):
+        try:
+            headers, self.refresh_token = await get_walkoff_auth_header(session, self.refresh_token, timeout)
+        except Exception:
+            self.refresh_token = None  # It may have expired or been revoked, so log in again next time
+            raise
+
+        self.headers = headers
+        self.expires_at = jwt_expiry(headers["Authorization"][len("Bearer "):])
+        if self.expires_at is not None and (self.refresher is None or self.refresher.done()):
+            self.refresher = asyncio.ensure_future(self.keep_fresh(session, timeout))
+
+    async def keep_fresh(self, session, timeout):
+        """ Refreshes the access token shortly before it expires, for as long as the session is open """
+        while not session.closed and self.expires_at is not None:
+            await asyncio.sleep(max(self.expires_at - self.leeway - time.time(), 1))
+            if session.closed:
+                return
+            try:
+                await self.refresh(session, timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Leave it to the next caller to refresh on demand
+                logger.error(f"Could not refresh WALKOFF JWT in the background: {e!r}")
+                return
+
+
+walkoff_auth = WalkoffAuth()
+
+
 def make_patch(message, root, op, value_only=False, white_list=None, black_list=None):
     if white_list is None and black_list is None:
         raise ValueError("Either white_list or black_list must be provided")
@@ -81,11 +153,26 @@ def get_patches(message):
     patches = []
     if isinstance(message, NodeStatusMessage):
         root = f"/node_statuses/{message.node_id}"
-        if message.status == StatusEnum.EXECUTING:
-            patches.append(make_patch(message, root, JSONPatchOps.ADD, black_list={"result", "completed_at"}))
+        if message.status == StatusEnum.EXECUTING and message.partial is not None:
+            # Partial results are appended to the node's result by index, so replaying one writes it to the same place
+            if message.partial == 0:
+                patches.append(JSONPatch(JSONPatchOps.ADD, path=f"{root}/result", value=[message.result]))
+            else:
+                patches.append(make_patch(message, f"{root}/result/{message.partial}", JSONPatchOps.ADD,
+                                          value_only=True, white_list={"result"}))
+
+        elif message.status == StatusEnum.EXECUTING:
+            patches.append(make_patch(message, root, JSONPatchOps.ADD, black_list={"result", "completed_at",
+                                                                                  "partial"}))
+
+        elif message.partial is not None:
+            # A streamed action's result is the partial results already sent, so leave them in place
+            for key in [key for key in message.__slots__ if key not in ("result", "partial")]:
+                patches.append(make_patch(message, f"{root}/{key}", JSONPatchOps.REPLACE, value_only=True,
+                                          white_list={key}))
 
         else:
-            patches.append(make_patch(message, root, JSONPatchOps.REPLACE, black_list={}))
+            patches.append(make_patch(message, root, JSONPatchOps.REPLACE, black_list={"partial"}))
 
     elif isinstance(message, WorkflowStatusMessage):
         if message.status == StatusEnum.EXECUTING:
@@ -102,26 +189,166 @@ def get_patches(message):
     return patches
 
 
-async def send_status_update(redis, execution_id, workflow_id, message):
-    """ Forms and sends a JSONPatch message to the api_gateway to update the status of an action or workflow """
+def mongo_path(patch_path):
+    """ Converts a JSON pointer such as /node_statuses/<id>/result to Mongo's dot notation """
+    return ".".join(part.replace("~1", "/").replace("~0", "~") for part in patch_path.lstrip("/").split("/"))
 
-    if message is None:
-        return None
-    patches = {
+
+def mongo_update_from_patches(patches, update=None):
+    """
+        Translates the JSON patches of a status update into a Mongo update of targeted $set and $unset operations, so
+        only the changed fields of a workflow status are written. Given the update built from earlier patches to the
+        same status, returns the two merged, or None if they can't be merged because they touch overlapping fields.
+    """
+    update = {"$set": {}, "$unset": {}} if update is None else {op: dict(fields) for op, fields in update.items()}
+    earlier = set(update["$set"]) | set(update["$unset"])
+
+    for patch in patches:
+        path = mongo_path(patch["path"])
+        if any(path.startswith(f"{other}.") or other.startswith(f"{path}.") for other in earlier):
+            return None
+
+        if patch["op"] in (JSONPatchOps.ADD, JSONPatchOps.REPLACE):
+            update["$unset"].pop(path, None)
+            update["$set"][path] = patch["value"]
+        elif patch["op"] == JSONPatchOps.REMOVE:
+            update["$set"].pop(path, None)
+            update["$unset"][path] = ""
+        else:
+            raise ValueError(f"Status updates can't {patch['op']} {patch['path']}")
+
+    return update
+
+
+def make_status_update(execution_id, workflow_id, message, patches=None):
+    """ Forms the JSONPatch message the api_gateway uses to update the status of an action or workflow """
+    update = {
         "execution_id": execution_id,
         "workflow_id": workflow_id,
-        "message": message_dumps(get_patches(message)),
+        "message": message_dumps(patches if patches is not None else get_patches(message)),
         "type": "workflow" if type(message) is WorkflowStatusMessage else "node"
     }
+    if type(message) is NodeStatusMessage:
+        update["node_id"] = message.node_id
+    return update
+
+
+async def send_status_update(redis, execution_id, workflow_id, message):
+    """ Forms and sends a JSONPatch message to the api_gateway to update the status of an action or workflow """
+
+    if message is None:
+        return None
+    patches = make_status_update(execution_id, workflow_id, message)
     # try:
-    logger.info(f"Sending result {patches}")
-    await redis.lpush(static.REDIS_RESULTS_QUEUE, json.dumps(patches))
+    logger.debug(f"Sending result {patches}")
+    await redis.xadd(results_partition(execution_id), {static.REDIS_RESULTS_QUEUE: json.dumps(patches)})
     # except ConnectionError as e:
     #     logger.error(f"Could not send event to {config.SOCKETIO_URI}: {e!r}")
     # except TimeoutError as e:
     #     logger.error(f"Timed out sending event to {config.SOCKETIO_URI}: {e!r}")
 
 
+class StatusPublisher:
+    """
+        Buffers status updates for a few milliseconds and sends them to the api_gateway in a single pipeline. An
+        execution_continued update replaces the one still buffered for the same execution, as it only overwrites the
+        same workflow fields. Completed and aborted workflows are flushed straight away. Updates that fail to send stay
+        buffered and are retried with a backoff.
+    """
+
+    def __init__(self, redis, delay=0.005, max_buffered=500, max_retry_delay=5):
+        self.redis = redis
+        self.delay = delay
+        self.max_retry_delay = max_retry_delay
+        self.max_buffered = max_buffered
+        self.buffer = []
+        self.continued = {}  # execution id -> index in buffer of its buffered execution_continued update
+        self.lock = asyncio.Lock()
+        self.flush_task = None
+        self.started = time.time()
+        self.messages_sent = 0
+        self.bytes_sent = 0
+
+    @staticmethod
+    def is_continued(message):
+        return (type(message) is WorkflowStatusMessage and message.status == StatusEnum.EXECUTING
+                and message.started_at is None)
+
+    async def publish(self, execution_id, workflow_id, message):
+        if message is None:
+            return None
+
+        message_patches = get_patches(message)
+        patches = json.dumps(make_status_update(execution_id, workflow_id, message, message_patches))
+        paths = {patch.path for patch in message_patches} if self.is_continued(message) else None
+
+        previous = self.continued.get(execution_id)
+        if paths is not None and previous is not None and paths >= self.buffer[previous][2]:
+            self.buffer[previous] = (execution_id, patches, paths)
+        else:
+            if paths is not None:
+                self.continued[execution_id] = len(self.buffer)
+            self.buffer.append((execution_id, patches, paths))
+
+        if (type(message) is WorkflowStatusMessage and message.status in (StatusEnum.COMPLETED, StatusEnum.ABORTED)
+                or len(self.buffer) >= self.max_buffered):
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Could not send status updates: {e!r}")
+                self.retry_later(self.delay)
+        elif self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.ensure_future(self.flush_later(self.delay))
+
+    def retry_later(self, delay):
+        """ Schedules another flush of the buffer, backing off from the delay of the last attempt """
+        if self.flush_task is None or self.flush_task.done() or self.flush_task is asyncio.current_task():
+            self.flush_task = asyncio.ensure_future(self.flush_later(min(max(2 * delay, 0.1), self.max_retry_delay)))
+
+    async def flush_later(self, delay):
+        await asyncio.sleep(delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Could not send status updates: {e!r}")
+            self.retry_later(delay)
+
+    async def flush(self):
+        """
+            Sends everything buffered so far. Batches are sent one at a time so they reach the queue in order. A batch
+            that fails to send goes back to the front of the buffer to be sent with the next one.
+        """
+        async with self.lock:
+            if len(self.buffer) < 1:
+                return
+            taken = self.buffer
+            batch = [(execution_id, patches) for execution_id, patches, _ in taken]
+            self.buffer = []
+            self.continued = {}
+
+            # Each execution's updates go to the same partition, so the api_gateway reads them back in order
+            pipe = self.redis.pipeline()
+            for execution_id, patches in batch:
+                pipe.xadd(results_partition(execution_id), {static.REDIS_RESULTS_QUEUE: patches})
+            try:
+                await pipe.execute()
+            except BaseException:
+                # Anything published while we were sending goes after the batch
+                self.buffer = taken + self.buffer
+                self.continued = {execution_id: i for i, (execution_id, _, paths) in enumerate(self.buffer)
+                                  if paths is not None}
+                raise
+            self.messages_sent += len(batch)
+            self.bytes_sent += sum(len(patches) for _, patches in batch)
+            logger.debug(f"Sent {len(batch)} results")
+
+    def stats(self):
+        """ Returns the number of messages and bytes sent so far, and the rates they've been sent at per second """
+        elapsed = max(time.time() - self.started, 1e-9)
+        return {"messages": self.messages_sent, "bytes": self.bytes_sent,
+                "messages_per_second": self.messages_sent / elapsed, "bytes_per_second": self.bytes_sent / elapsed}
+
+
 def fernet_encrypt(key: bytes, string: str):
     from cryptography.fernet import Fernet
 
@@ -49,7 +49,7 @@ class MessageJSONEncoder(json.JSONEncoder):
             r = {"name": o.name, "node_id": o.node_id, "label": o.label, "app_name": o.app_name,
                  "execution_id": o.execution_id, "result": o.result, "status": o.status,
                  "started_at": o.started_at, "completed_at": o.completed_at, "combined_id": o.combined_id,
-                 "parameters": o.parameters}
+                 "parameters": o.parameters, "partial": o.partial}
 
             try:
                 json.dumps(o.result)
@@ -170,10 +170,10 @@ class WorkflowStatusMessage(object):
 class NodeStatusMessage(object):
     """ Class that formats a NodeStatusMessage message. """
     __slots__ = ("name", "node_id", "label", "app_name", "execution_id", "parameters", "combined_id", "result",
-                 "status", "started_at", "completed_at")
+                 "status", "started_at", "completed_at", "partial")
 
     def __init__(self, name, node_id, label, app_name, execution_id, combined_id=None, parameters=None, result=None,
-                 status=None, started_at=None, completed_at=None):
+                 status=None, started_at=None, completed_at=None, partial=None):
         self.name = name
         self.node_id = node_id
         self.label = label
@@ -185,6 +185,7 @@ class NodeStatusMessage(object):
         self.status = status
         self.started_at = started_at
         self.completed_at = completed_at
+        self.partial = partial  # index of a partial result, or how many were sent before a streamed action's success
 
     @classmethod
     def from_node(cls, node, execution_id, result=None, status=None, started_at=None, completed_at=None, parameters=None):
@@ -201,6 +202,19 @@ class NodeStatusMessage(object):
         return cls(node.name, node.id_, node.label, node.app_name, execution_id, started_at=started_at,
                    status=StatusEnum.EXECUTING, parameters=parameters)
 
+    @classmethod
+    def partial_from_node(cls, node, execution_id, result, index, parameters=None, started_at=None):
+        """ The index-th chunk of the result of an action which is still executing """
+        return cls(node.name, node.id_, node.label, node.app_name, execution_id, result=result, started_at=started_at,
+                   status=StatusEnum.EXECUTING, parameters=parameters, partial=index)
+
+    @classmethod
+    def streamed_from_node(cls, node, execution_id, partials, parameters=None, started_at=None):
+        """ The success of an action whose result was sent as partials chunks, which make up its result """
+        completed_at = datetime.datetime.now()
+        return cls(node.name, node.id_, node.label, node.app_name, execution_id, started_at=started_at,
+                   completed_at=completed_at, status=StatusEnum.SUCCESS, parameters=parameters, partial=partials)
+
     @classmethod
     def success_from_node(cls, node, execution_id, result, parameters=None, started_at=None):
         completed_at = datetime.datetime.now()
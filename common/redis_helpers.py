@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import zlib
 from contextlib import asynccontextmanager
 from urllib.parse import urlparse
 
@@ -11,9 +13,10 @@ logger = logging.getLogger("WALKOFF")
 
 
 @asynccontextmanager
-async def connect_to_aioredis_pool(redis_uri) -> aioredis.Redis:
+async def connect_to_aioredis_pool(redis_uri, **kwargs) -> aioredis.Redis:
     # Redis client bound to pool of connections (auto-reconnecting).
-    redis_pool = await aioredis.create_redis_pool(redis_uri, password=config.get_from_file(config.REDIS_KEY_PATH))
+    redis_pool = await aioredis.create_redis_pool(redis_uri, password=config.get_from_file(config.REDIS_KEY_PATH),
+                                                  **kwargs)
     try:
         yield redis_pool
     finally:
@@ -46,6 +49,92 @@ def xlen(redis: aioredis.Redis, key):
     return redis.execute(b'XLEN', key)
 
 
-def xdel(redis: aioredis.Redis, stream, id_):
-    """ Deletes id_ from stream. Returns the number of items deleted. """
-    return redis.execute(b'XDEL', stream, id_)
+def xdel(redis: aioredis.Redis, stream, id_, *ids):
+    """ Deletes id_ (and any further ids) from stream. Returns the number of items deleted. """
+    return redis.execute(b'XDEL', stream, id_, *ids)
+
+
+async def xack_xdel(redis: aioredis.Redis, stream, group_name, ids):
+    """
+        Acknowledges and deletes a batch of ids from stream. Both commands are written to the same connection before
+        either reply is read, so the batch costs a single round trip.
+    """
+    if len(ids) < 1:
+        return 0, 0
+    with await redis as conn:
+        return await asyncio.gather(conn.xack(stream, group_name, *ids), xdel(conn, stream, *ids))
+
+
+def action_stream(execution_id, app_group):
+    """ The stream an execution's actions for app_group are sent to, which depends on APP_STREAM_MODE """
+    if config.APP_STREAM_MODE == "app":
+        return app_group
+    return f"{execution_id}:{app_group}"
+
+
+def results_partitions():
+    """ The streams the results queue is partitioned into """
+    partitions = max(config.get_int("RESULTS_QUEUE_PARTITIONS", 16), 1)
+    return [f"{static.REDIS_RESULTS_QUEUE}:{partition}" for partition in range(partitions)]
+
+
+def results_partition(execution_id):
+    """ The results queue partition an execution's status updates are sent to, which keeps them in order """
+    partitions = max(config.get_int("RESULTS_QUEUE_PARTITIONS", 16), 1)
+    return f"{static.REDIS_RESULTS_QUEUE}:{zlib.crc32(str(execution_id).encode()) % partitions}"
+
+
+def split_action_stream(stream):
+    """ Returns the execution id and app group of an action stream. The execution id of a shared app stream is None. """
+    parts = stream.split(":")
+    if len(parts) < 3:
+        return None, stream
+    return parts[0], ":".join(parts[1:])
+
+
+def active_streams_key(app_group):
+    """ The set of action streams which currently exist for an app group """
+    return f"{static.REDIS_ACTIVE_STREAMS}:{app_group}"
+
+
+async def register_stream(redis: aioredis.Redis, stream, app_group):
+    """ Records an action stream so it can be found without scanning the keyspace """
+    pipe = redis.pipeline()
+    pipe.sadd(static.REDIS_ACTIVE_APP_GROUPS, app_group)
+    pipe.sadd(active_streams_key(app_group), stream)
+    await pipe.execute()
+
+
+async def unregister_streams(redis: aioredis.Redis, streams):
+    """ Removes action streams from the registry """
+    if len(streams) < 1:
+        return
+    pipe = redis.pipeline()
+    for stream in streams:
+        _, app_group = split_action_stream(stream)
+        pipe.srem(active_streams_key(app_group), stream)
+    await pipe.execute()
+
+
+async def get_active_streams(redis: aioredis.Redis, app_group=None, execution_id=None):
+    """ Returns the registered action streams, optionally only those of an app group or an execution """
+    if app_group is not None:
+        streams = await redis.smembers(active_streams_key(app_group), encoding="utf-8")
+    else:
+        app_groups = await redis.smembers(static.REDIS_ACTIVE_APP_GROUPS, encoding="utf-8")
+        keys = [active_streams_key(group) for group in app_groups]
+        streams = [stream.decode() for stream in await redis.sunion(*keys)] if keys else []
+
+    if execution_id is not None:
+        streams = [stream for stream in streams if stream.startswith(f"{execution_id}:")]
+    return list(streams)
+
+
+async def prune_streams(redis: aioredis.Redis, streams):
+    """ Removes streams which no longer exist from the registry, eg. if a worker died. Returns those left. """
+    pipe = redis.pipeline()
+    exists = [pipe.exists(stream) for stream in streams]
+    await pipe.execute()
+    missing = [stream for stream, exist in zip(streams, exists) if not exist.result()]
+    await unregister_streams(redis, missing)
+    return [stream for stream in streams if stream not in missing]
@@ -0,0 +1,121 @@
+import asyncio
+import io
+import json
+import logging
+import re
+import uuid
+
+from common.config import config, static
+
+logger = logging.getLogger("WALKOFF")
+
+
+class ResultStore:
+    """
+        A claim check for large action results. A result whose JSON is over RESULT_STORE_THRESHOLD bytes is written
+        once to MinIO and replaced by a small reference, holding the object's name, its size, and the start of its JSON,
+        which is all that travels through Redis, the worker, Mongo, and Socket.IO. The result itself is only read back
+        when something needs its contents, eg. an ACTION_RESULT parameter, a condition, or a transform.
+    """
+    REF_TYPE = "result_ref"
+    REF_FIELDS = {"walkoff_type_", "bucket", "key", "size", "summary"}
+    KEY_PATTERN = re.compile(r"[^/]+/[^/]+/[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[0-9a-f]{4}-[0-9a-f]{12}\.json")
+
+    def __init__(self):
+        self.client = None
+        self.bucket_ready = False
+
+    @classmethod
+    def is_ref(cls, result):
+        """ A reference is tagged with its walkoff_type_ and must also match the shape check_in gives it """
+        return (isinstance(result, dict) and result.get("walkoff_type_") == cls.REF_TYPE
+                and result.keys() == cls.REF_FIELDS and result["bucket"] == static.MINIO_RESULTS_BUCKET
+                and isinstance(result["key"], str) and cls.KEY_PATTERN.fullmatch(result["key"]) is not None)
+
+    async def check_in(self, result, execution_id, node_id):
+        """ Returns a reference to result if it is too large to pass around, or else result itself """
+        threshold = config.get_int("RESULT_STORE_THRESHOLD", 1048576)
+        if threshold < 1 or result is None or self.is_ref(result):
+            return result
+
+        try:
+            data = json.dumps(result).encode()
+        except (TypeError, ValueError):
+            return result  # The message encoder reports results that can't be serialized
+        if len(data) <= threshold:
+            return result
+
+        name = f"{execution_id}/{node_id}/{uuid.uuid4()}.json"
+        await asyncio.get_event_loop().run_in_executor(None, self.put, name, data)
+        logger.debug(f"Stored {len(data)} byte result of {node_id}-{execution_id} as {name}")
+
+        summary = data[:config.get_int("RESULT_SUMMARY_SIZE", 1024)].decode(errors="ignore")
+        return {"walkoff_type_": self.REF_TYPE, "bucket": static.MINIO_RESULTS_BUCKET, "key": name,
+                "size": len(data), "summary": summary}
+
+    async def check_out(self, result):
+        """ Returns the contents of result if it is a reference, or else result itself """
+        if not self.is_ref(result):
+            return result
+
+        data = await asyncio.get_event_loop().run_in_executor(None, self.get, result["key"])
+        return json.loads(data)
+
+    async def delete_execution(self, execution_id):
+        """ Removes every result stored for execution_id, as nothing can refer to them once it is finished or cleared """
+        if config.get_int("RESULT_STORE_THRESHOLD", 1048576) < 1:
+            return
+
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self.remove, f"{execution_id}/")
+        except Exception as e:
+            logger.error(f"Could not remove stored results of {execution_id}: {e!r}")
+
+    def connect(self):
+        if self.client is None:
+            from minio import Minio
+            self.client = Minio(config.MINIO, access_key=config.get_from_file(config.MINIO_ACCESS_KEY_PATH),
+                                secret_key=config.get_from_file(config.MINIO_SECRET_KEY_PATH), secure=False)
+        return self.client
+
+    def make_bucket(self, client):
+        from minio.error import BucketAlreadyOwnedByYou, BucketAlreadyExists
+
+        try:
+            if not client.bucket_exists(static.MINIO_RESULTS_BUCKET):
+                client.make_bucket(static.MINIO_RESULTS_BUCKET)
+        except (BucketAlreadyOwnedByYou, BucketAlreadyExists):
+            pass  # Another container made it first
+        self.bucket_ready = True
+
+    def put(self, name, data):
+        client = self.connect()
+        if not self.bucket_ready:
+            self.make_bucket(client)
+
+        client.put_object(static.MINIO_RESULTS_BUCKET, name, io.BytesIO(data), len(data),
+                          content_type="application/json")
+
+    def get(self, name):
+        response = self.connect().get_object(static.MINIO_RESULTS_BUCKET, name)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def remove(self, prefix):
+        client = self.connect()
+        if not self.bucket_ready and not client.bucket_exists(static.MINIO_RESULTS_BUCKET):
+            return
+
+        names = [obj.object_name for obj in client.list_objects(static.MINIO_RESULTS_BUCKET, prefix=prefix,
+                                                                 recursive=True)]
+        if not names:
+            return
+
+        for error in client.remove_objects(static.MINIO_RESULTS_BUCKET, names):  # Removal is lazy until iterated
+            logger.error(f"Could not remove stored result {error.object_name}: {error.error_message}")
+
+
+result_store = ResultStore()
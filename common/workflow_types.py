@@ -2,9 +2,11 @@ import uuid
 import json
 import enum
 import logging
+import time
+from functools import lru_cache
 from operator import attrgetter, itemgetter
 from collections import namedtuple, deque
-from asteval import Interpreter, make_symbol_table
+from asteval import Interpreter
 
 logger = logging.getLogger("WALKOFF")
 
@@ -191,6 +193,70 @@ Branch = namedtuple("Branch", ("source_id", "destination_id", "id_"))
 ParentSymbol = namedtuple("ParentSymbol", "result")  # used inside conditions to further mask the parent node attrs
 ChildSymbol = namedtuple("ChildSymbol", "id_")  # used inside conditions to further mask the child node attrs
 
+CONDITION_OPTIONS = dict(no_for=True, no_while=True, no_try=True, no_functiondef=True, no_ifexp=True,
+                         no_listcomp=True, no_augassign=True, no_assert=True, no_delete=True, no_raise=True,
+                         no_print=True)
+TRANSFORM_OPTIONS = dict(no_while=True, no_try=True, no_functiondef=True, no_ifexp=False, no_augassign=True,
+                         no_assert=True, no_delete=True, no_raise=True, no_print=True)
+
+
+class Program:
+    """
+        A condition or transform script which is parsed once and then run against new symbols on each call. The
+        interpreter is kept between runs, with its symbol table reset to the builtins before each one.
+    """
+    __slots__ = ("source", "tree", "interpreter", "builtins", "builtins_readonly", "parse_error")
+
+    def __init__(self, source, **options):
+        self.source = source
+        self.interpreter = Interpreter(use_numpy=False, builtins_readonly=True, **options)
+        self.builtins = dict(self.interpreter.symtable)
+        self.builtins_readonly = set(self.interpreter.readonly_symbols)
+        self.tree = None
+        self.parse_error = []
+        try:
+            self.tree = self.interpreter.parse(source)
+        except Exception:
+            self.parse_error = self.interpreter.error
+
+    def __call__(self, symbols, readonly_symbols=()):
+        """ Runs the script and returns the resulting symbol table, which is only valid until the next run """
+        aeval = self.interpreter
+        aeval.symtable.clear()
+        aeval.symtable.update(self.builtins)
+        aeval.symtable.update(symbols)
+        aeval.readonly_symbols = self.builtins_readonly | set(readonly_symbols)
+        aeval.error = list(self.parse_error)
+        aeval.error_msg = None
+        aeval._interrupt = None
+        aeval.start_time = time.time()
+
+        if self.tree is not None:
+            try:
+                aeval.run(self.tree, expr=self.source)
+            except Exception:
+                pass  # The details are kept in aeval.error
+
+        return aeval.symtable
+
+    @property
+    def error(self):
+        """ The first error from the last run formatted as 'ErrorType(): message', or None if it succeeded """
+        if len(self.interpreter.error) < 1:
+            return None
+        error_tuple = self.interpreter.error[0].get_error()
+        return error_tuple[0] + "(): " + error_tuple[1]
+
+
+@lru_cache(maxsize=256)
+def compile_condition(conditional):
+    return Program(conditional, **CONDITION_OPTIONS)
+
+
+@lru_cache(maxsize=256)
+def compile_transform(transform):
+    return Program(transform, **TRANSFORM_OPTIONS)
+
 
 class ParameterVariant(str, enum.Enum):
     STATIC_VALUE = "STATIC_VALUE"
@@ -351,17 +417,13 @@ class Condition(Node):
     def __call__(self, parents, children, accumulator) -> str:
         parent_symbols = {k: ParentSymbol(accumulator[v.id_]) for k, v in self.format_node_names(parents).items()}
         children_symbols = {k: ChildSymbol(v.id_) for k, v in self.format_node_names(children).items()}
-        syms = make_symbol_table(use_numpy=False, **parent_symbols, **children_symbols)
-        aeval = Interpreter(usersyms=syms, no_for=True, no_while=True, no_try=True, no_functiondef=True, no_ifexp=True,
-                            no_listcomp=True, no_augassign=True, no_assert=True, no_delete=True, no_raise=True,
-                            no_print=True, use_numpy=False, builtins_readonly=True,
-                            readonly_symbols=children_symbols.keys())
+        program = compile_condition(self.conditional)
 
-        aeval(self.conditional)
-        child_id = getattr(aeval.symtable.get("selected_node", None), "id_", None)
+        symtable = program({**parent_symbols, **children_symbols}, readonly_symbols=children_symbols.keys())
+        child_id = getattr(symtable.get("selected_node", None), "id_", None)
 
-        if len(aeval.error) > 0:
-            raise ConditionException
+        if program.error is not None:
+            raise ConditionException(program.error)
 
         return child_id
 
@@ -437,17 +499,12 @@ class Transform(Node):
     def __call__(self, parents, accumulator) -> str:
         """ Execute an action and ship its result """
         parent_symbols = {k: ParentSymbol(accumulator[v.id_]) for k, v in self.format_node_names(parents).items()}
-        # children_symbols = {k: ChildSymbol(v.id_) for k, v in self.format_node_names(children).items()}
-        syms = make_symbol_table(use_numpy=False, **parent_symbols)
-        aeval = Interpreter(usersyms=syms, no_while=True, no_try=True, no_functiondef=True, no_ifexp=False,
-                            no_augassign=True, no_assert=True, no_delete=True, no_raise=True,
-                            no_print=True, use_numpy=False, builtins_readonly=True)
+        program = compile_transform(self.transform)
 
-        aeval(self.transform)
-        output = aeval.symtable.get("result", None)
+        output = program(parent_symbols).get("result", None)
 
-        if len(aeval.error) > 0:
-            raise TransformException
+        if program.error is not None:
+            raise TransformException(program.error)
 
         return output
 
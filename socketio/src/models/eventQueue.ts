@@ -6,6 +6,8 @@ export class EventQueue {
     constructor(private maxSize = 500) {}
 
     add(item: WalkoffEvent) {
+        if (item.key !== undefined)
+            this.items = this.items.filter(existing => existing.key !== item.key);
         this.items.push(item);
         if (this.items.length > this.maxSize)
             this.items = this.items.slice(this.maxSize * -1)
@@ -26,6 +26,10 @@ export class NodeStatusEvent implements WalkoffEvent {
 	get channels() : string[] {
 		return ['all', this.execution_id, this.node_id];
 	}
+
+	get key() : string {
+		return `${this.execution_id}:${this.node_id}`;
+	}
 }
 
 export enum NodeStatuses {
@@ -1,4 +1,6 @@
 export interface WalkoffEvent {
     //matches: (id: string) => boolean;
     channels: string[];
+    // Events with the same key describe the same thing, so only the latest is kept for new clients
+    key?: string;
 }
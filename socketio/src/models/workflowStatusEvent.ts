@@ -29,6 +29,10 @@ export class WorkflowStatusEvent implements WalkoffEvent {
 	get channels() : string[] {
 		return ['all', this.execution_id, this.workflow_id];
 	}
+
+	get key() : string {
+		return this.execution_id;
+	}
 }
 
 export enum WorkflowStatuses {
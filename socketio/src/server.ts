@@ -44,5 +44,16 @@ function createSpace(url: string, getEventClass: () => WalkoffEvent) {
             queue.add(item);
             console.log(item)
         });
+
+        // A batch of the latest events since the last one, relayed as one message per channel
+        client.on('logs', (data: any[]) => {
+            const byChannel: { [channel: string]: WalkoffEvent[] } = {};
+            data.forEach(d => {
+                const item = plainToClassFromExist(getEventClass(), d);
+                item.channels.forEach((c: string) => (byChannel[c] = byChannel[c] || []).push(item));
+                queue.add(item);
+            });
+            Object.keys(byChannel).forEach(c => client.broadcast.to(c).emit('logs', byChannel[c]));
+        });
     })
 }
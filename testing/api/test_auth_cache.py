@@ -0,0 +1,148 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from api.server.db.permissions import AuthContext, PermissionsModel, RolePermissions, get_auth_context
+from api.server.security import AuthCache
+
+
+class Cursor:
+    def __init__(self, collection, docs):
+        self.collection = collection
+        self.docs = docs
+
+    async def to_list(self, length):
+        await self.collection.read()
+        return list(self.docs)
+
+
+class Collection:
+    """ Just enough of a motor collection to count reads and run something in the middle of one """
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.reads = 0
+        self.during_read = None
+
+    async def read(self):
+        self.reads += 1
+        if self.during_read is not None:
+            self.during_read()
+
+    def find(self, query=None, projection=None):
+        return Cursor(self, self.docs)
+
+    async def find_one(self, query, projection=None):
+        await self.read()
+        return next((doc for doc in self.docs if all(doc.get(k) == v for k, v in query.items())), None)
+
+
+admin_role = uuid.uuid4()
+user_id = uuid.uuid4()
+
+
+@pytest.fixture
+def walkoff_db():
+    roles = [{"id_": admin_role, "name": "admin", "resources": [{"name": "workflows", "permissions": ["read"]}]}]
+    users = [{"id_": user_id, "username": "admin", "roles": [admin_role]}]
+    yield SimpleNamespace(roles=Collection(roles), users=Collection(users), tokens=Collection())
+
+
+@pytest.fixture
+def cache():
+    cache = AuthCache()
+    cache.listening = True
+    yield cache
+
+
+def workflow_with(creator=None, role_permissions=()):
+    return SimpleNamespace(permissions=PermissionsModel(creator=creator, access_level=2,
+                                                        role_permissions=list(role_permissions)))
+
+
+def test_auth_context_checks_creator_and_roles():
+    auth = AuthContext(user_id, [admin_role])
+    assert auth.check(workflow_with(creator=user_id), "delete")
+    assert auth.check(workflow_with(role_permissions=[RolePermissions(role=admin_role, permissions=["read"])]), "read")
+    assert not auth.check(workflow_with(role_permissions=[RolePermissions(role=admin_role, permissions=["read"])]),
+                          "update")
+    assert not auth.check(workflow_with(role_permissions=[RolePermissions(role=uuid.uuid4(), permissions=["read"])]),
+                          "read")
+    assert not auth.check(None, "read")
+
+
+@pytest.mark.asyncio
+async def test_auth_context_is_looked_up_once_per_request(walkoff_db, monkeypatch):
+    monkeypatch.setattr("api.server.db.permissions.auth_cache", AuthCache())
+    request = SimpleNamespace(state=SimpleNamespace(raw_jwt={"identity": str(user_id)}), headers={})
+
+    auth = await get_auth_context(request, walkoff_db)
+    assert auth.user_id == user_id and auth.roles == {admin_role}
+    assert await get_auth_context(request, walkoff_db) is auth
+    assert walkoff_db.users.reads == 1
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_cached_unless_listening(walkoff_db):
+    cache = AuthCache()
+    for _ in range(2):
+        assert await cache.roles_of(user_id, walkoff_db) == [admin_role]
+        assert await cache.roles_for("workflows", "read", walkoff_db) == {admin_role}
+    assert walkoff_db.users.reads == 2 and walkoff_db.roles.reads == 2
+
+    cache.listening = True
+    for _ in range(2):
+        await cache.roles_of(user_id, walkoff_db)
+        await cache.roles_for("workflows", "read", walkoff_db)
+    assert walkoff_db.users.reads == 3 and walkoff_db.roles.reads == 3
+
+
+@pytest.mark.asyncio
+async def test_lookups_that_race_an_invalidation_are_not_cached(cache, walkoff_db):
+    walkoff_db.roles.during_read = lambda: cache.invalidate("roles")
+    walkoff_db.users.during_read = lambda: cache.invalidate(f"user:{user_id}")
+
+    assert await cache.roles_for("workflows", "read", walkoff_db) == {admin_role}
+    assert await cache.roles_of(user_id, walkoff_db) == [admin_role]
+    assert cache.resource_roles is None
+    assert cache.user_roles == {}
+
+    walkoff_db.roles.during_read = walkoff_db.users.during_read = None
+    await cache.roles_for("workflows", "read", walkoff_db)
+    await cache.roles_of(user_id, walkoff_db)
+    assert cache.resource_roles is not None
+    assert cache.user_roles == {str(user_id): [admin_role]}
+
+
+@pytest.mark.asyncio
+async def test_invalidations_only_drop_what_changed(cache, walkoff_db):
+    other_user = str(uuid.uuid4())
+    await cache.roles_for("workflows", "read", walkoff_db)
+    cache.user_roles = {str(user_id): [admin_role], other_user: []}
+    cache.unrevoked = {"jti": 1, "other-jti": 1}
+
+    cache.invalidate(f"user:{user_id}")
+    assert list(cache.user_roles) == [other_user]
+    assert cache.resource_roles is not None
+
+    cache.invalidate("revoked:jti")
+    assert list(cache.unrevoked) == ["other-jti"]
+
+    cache.invalidate("roles")
+    assert cache.resource_roles is None
+    assert list(cache.user_roles) == [other_user] and list(cache.unrevoked) == ["other-jti"]
+
+    cache.invalidate()
+    assert cache.user_roles == {} and cache.unrevoked == {}
+
+
+@pytest.mark.asyncio
+async def test_unrevoked_tokens_are_cached(cache, walkoff_db):
+    token = {"jti": "jti", "exp": 2 ** 40}
+    assert not await cache.is_token_revoked(token, walkoff_db)
+    assert not await cache.is_token_revoked(token, walkoff_db)
+    assert walkoff_db.tokens.reads == 1
+
+    cache.invalidate("revoked:jti")
+    walkoff_db.tokens.docs.append({"jti": "jti"})
+    assert await cache.is_token_revoked(token, walkoff_db)
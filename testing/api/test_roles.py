@@ -5,6 +5,9 @@ from http import HTTPStatus
 import yaml
 from starlette.testclient import TestClient
 
+import api.server.app as app
+from api.server.db.user_init import default_roles
+
 
 logger = logging.getLogger(__name__)
 
@@ -108,4 +111,16 @@ def test_unauth_cred_role_dne(api: TestClient, unauthorized_header: dict):
     assert p.status_code == 403
 
     p = api.delete(base_roles_url + "404", headers=unauthorized_header)
-    assert p.status_code == 403
\ No newline at end of file
+    assert p.status_code == 403
+
+def test_existing_default_roles_gain_new_resources(api: TestClient, auth_header: dict):
+    """ Assert that restarting over an older database adds newer default resources to the default roles """
+    roles_col = app.mongo.reg_client.walkoff_db.roles
+    admin_id = default_roles["admin"]["id_"]
+    roles_col.update_one({"id_": admin_id}, {"$pull": {"resources": {"name": "results"}}})
+
+    app.mongo.init_db()
+
+    resources = roles_col.find_one({"id_": admin_id})["resources"]
+    assert [r["permissions"] for r in resources if r["name"] == "results"] == [["read"]]
+    assert len(resources) == len(default_roles["admin"]["resources"])
@@ -0,0 +1,40 @@
+import datetime
+import uuid
+
+from starlette.testclient import TestClient
+
+import api.server.app as app
+from api.server.endpoints import workflowqueue
+from common.message_types import StatusEnum
+
+base_workflowqueue_url = "/walkoff/api/workflowqueue/"
+
+
+def seed_status(status, completed_at):
+    execution_id = str(uuid.uuid4())
+    app.mongo.reg_client.walkoff_db.workflowqueue.insert_one({
+        "execution_id": execution_id, "workflow_id": str(uuid.uuid4()), "name": "workflow", "status": status,
+        "started_at": str(completed_at), "completed_at": str(completed_at), "node_statuses": {}
+    })
+    return execution_id
+
+
+def test_clear_db_removes_old_finished_statuses(api: TestClient, auth_header: dict, monkeypatch):
+    deleted = []
+
+    async def delete_execution(execution_id):
+        deleted.append(execution_id)
+
+    monkeypatch.setattr(workflowqueue.result_store, "delete_execution", delete_execution)
+
+    now = datetime.datetime.now()
+    old = seed_status(StatusEnum.COMPLETED, now - datetime.timedelta(days=31))
+    recent = seed_status(StatusEnum.COMPLETED, now)
+    running = seed_status(StatusEnum.EXECUTING, now - datetime.timedelta(days=31))
+
+    p = api.delete(base_workflowqueue_url + "cleardb", headers=auth_header, params={"days": 30})
+    assert p.status_code == 200
+
+    remaining = {status["execution_id"] for status in app.mongo.reg_client.walkoff_db.workflowqueue.find()}
+    assert remaining == {recent, running}
+    assert deleted == [old]
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from app_sdk.walkoff_app_sdk.pools import ResourcePool
+
+
+class Resource:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+async def create():
+    return Resource()
+
+
+def make_pool(**kwargs):
+    return ResourcePool(create, Resource.close, healthy=lambda r: not r.closed, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_exclusive_resources_are_reused():
+    pool = make_pool(max_idle=1)
+    async with pool.acquire("host") as first:
+        async with pool.acquire("host") as second:
+            assert first is not second
+
+    assert first.closed  # only one idle resource is kept per key
+    async with pool.acquire("host") as third:
+        assert third is second
+
+    with pytest.raises(IOError):
+        async with pool.acquire("host") as broken:
+            raise IOError
+    assert broken.closed
+
+    async with pool.acquire("host") as fourth:
+        assert fourth is not broken
+
+
+@pytest.mark.asyncio
+async def test_shared_resources_are_evicted_once_idle():
+    pool = make_pool(shared=True, idle_timeout=0.01)
+
+    async def use():
+        async with pool.acquire("host") as resource:
+            await asyncio.sleep(0.05)
+            await pool.evict_idle()
+            assert not resource.closed
+            return resource
+
+    first, second = await asyncio.gather(use(), use())
+    assert first is second
+
+    await asyncio.sleep(0.05)
+    await pool.evict_idle()
+    assert first.closed
+
+
+@pytest.mark.asyncio
+async def test_shared_resources_are_only_closed_when_broken():
+    pool = make_pool(shared=True)
+    with pytest.raises(ValueError):
+        async with pool.acquire("host") as resource:
+            raise ValueError  # An action's own error says nothing about the connection
+    assert not resource.closed
+
+    with pytest.raises(ConnectionResetError):
+        async with pool.acquire("host") as same:
+            raise ConnectionResetError
+    assert same is resource and resource.closed
+
+    async with pool.acquire("host") as replacement:
+        assert replacement is not resource
+
+
+@pytest.mark.asyncio
+async def test_cancelled_callers_return_their_resources():
+    pool = make_pool()
+    acquired = asyncio.Event()
+
+    async def use():
+        async with pool.acquire("host") as resource:
+            acquired.set()
+            await asyncio.sleep(10)
+
+    task = asyncio.create_task(use())
+    await acquired.wait()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert pool.users == {}
+    assert pool.idle["host"] == []
+
+
+@pytest.mark.asyncio
+async def test_resources_idle_too_long_are_not_reused():
+    pool = make_pool(max_idle_age=0.01)
+    async with pool.acquire("host") as first:
+        pass
+
+    await asyncio.sleep(0.05)
+    async with pool.acquire("host") as second:
+        assert second is not first
+    assert first.closed
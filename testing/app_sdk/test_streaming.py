@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app_sdk.walkoff_app_sdk.app_base import AppBase
+from common.message_types import message_loads, StatusEnum
+from common.workflow_types import Action, Point
+
+
+class ResultsStream:
+    def __init__(self):
+        self.messages = []
+
+    async def xadd(self, stream, fields):
+        (message,) = fields.values()
+        self.messages.append(message_loads(message))
+
+
+class Scanner(AppBase):
+    __version__ = "1.0.0"
+    app_name = "scanner"
+
+    async def scan(self, hosts):
+        async for host, result in self.each_host(hosts, self.scan_host):
+            yield {host: result}
+
+    async def scan_host(self, host):
+        if host == "bad":
+            raise ValueError("unreachable")
+        await asyncio.sleep(0.01 * len(host))
+        return host.upper()
+
+
+def scan_action():
+    return Action("scan", Point(0, 0), "scanner", "1.0.0", "scan", 1, execution_id="execution")
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_sent_as_they_are_yielded():
+    redis = ResultsStream()
+    app = Scanner(redis=redis)
+    action = scan_action()
+
+    sent = await app.stream_results(action, app.scan(["bbb", "a", "bad"]), "execution:results")
+
+    # Hosts arrive in the order they finish, not the order they were given in
+    assert sent == 3
+    assert [m.status for m in redis.messages] == [StatusEnum.EXECUTING] * 3
+    assert [m.partial for m in redis.messages] == [0, 1, 2]
+    assert [m.result for m in redis.messages] == [{"bad": {"stdout": "", "stderr": "unreachable"}}, {"a": "A"},
+                                                  {"bbb": "BBB"}]
+
+
+@pytest.mark.asyncio
+async def test_for_each_host_keeps_host_order():
+    app = Scanner(redis=ResultsStream())
+    assert list(await app.for_each_host(["bbb", "a"], app.scan_host)) == ["bbb", "a"]
+
+
+@pytest.mark.asyncio
+async def test_only_flagged_executions_are_cancelled():
+    class AbortingRedis(ResultsStream):
+        async def smembers(self, key, encoding=None):
+            return {"aborted"}
+
+    app = Scanner(redis=AbortingRedis())
+    running = {execution_id: asyncio.ensure_future(asyncio.sleep(10)) for execution_id in ("aborted", "other")}
+    for execution_id, task in running.items():
+        app.running_actions.add(task)
+        app.action_executions[task] = execution_id
+        task.add_done_callback(app.action_done)
+
+    await app.abort_flagged()
+    await asyncio.gather(running["aborted"], return_exceptions=True)
+    assert running["aborted"].cancelled()
+    assert app.action_executions == {running["other"]: "other"}
+    running["other"].cancel()
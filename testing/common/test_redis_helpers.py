@@ -0,0 +1,12 @@
+from common.config import config
+from common.redis_helpers import action_stream, split_action_stream
+
+
+def test_action_stream_modes(monkeypatch):
+    monkeypatch.setattr(config, "APP_STREAM_MODE", "execution")
+    assert action_stream("1234", "Basics:1.0.0") == "1234:Basics:1.0.0"
+    assert split_action_stream("1234:Basics:1.0.0") == ("1234", "Basics:1.0.0")
+
+    monkeypatch.setattr(config, "APP_STREAM_MODE", "app")
+    assert action_stream("1234", "Basics:1.0.0") == "Basics:1.0.0"
+    assert split_action_stream("Basics:1.0.0") == (None, "Basics:1.0.0")
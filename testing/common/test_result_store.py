@@ -0,0 +1,87 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from common.config import config, static
+from common.result_store import ResultStore
+
+
+class Response(io.BytesIO):
+    def release_conn(self):
+        pass
+
+
+class Bucket:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, bucket, name, data, length, content_type=None):
+        assert bucket == static.MINIO_RESULTS_BUCKET
+        self.objects[name] = data.read(length)
+
+    def get_object(self, bucket, name):
+        return Response(self.objects[name])
+
+    def list_objects(self, bucket, prefix=None, recursive=False):
+        return [SimpleNamespace(object_name=name) for name in self.objects if name.startswith(prefix)]
+
+    def remove_objects(self, bucket, names):
+        for name in names:
+            del self.objects[name]
+        return iter(())
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(config, "RESULT_STORE_THRESHOLD", "100")
+    monkeypatch.setattr(config, "RESULT_SUMMARY_SIZE", "10")
+    store = ResultStore()
+    store.client = Bucket()
+    store.bucket_ready = True
+    yield store
+
+
+@pytest.mark.asyncio
+async def test_small_results_pass_through(store):
+    result = {"host": "up"}
+    assert await store.check_in(result, "execution", "node") is result
+    assert await store.check_out(result) is result
+    assert store.client.objects == {}
+
+
+@pytest.mark.asyncio
+async def test_large_results_are_passed_by_reference(store):
+    result = ["x" * 50, "y" * 50]
+    ref = await store.check_in(result, "execution", "node")
+
+    assert store.is_ref(ref)
+    assert ref["size"] > 100
+    assert ref["summary"] == '["xxxxxxxx'
+    assert ref["key"].startswith("execution/node/")
+    assert await store.check_in(ref, "execution", "node") is ref
+    assert await store.check_out(ref) == result
+
+
+@pytest.mark.asyncio
+async def test_finished_executions_are_removed(store):
+    await store.check_in(["x" * 100], "execution", "node")
+    await store.check_in(["x" * 100], "execution", "other")
+    kept = await store.check_in(["x" * 100], "execution-2", "node")
+
+    await store.delete_execution("execution")
+    assert await store.check_out(kept) == ["x" * 100]
+    assert len(store.client.objects) == 1
+
+
+@pytest.mark.asyncio
+async def test_user_data_is_never_mistaken_for_a_reference(store):
+    result = {"result_ref": "execution/node/report.json", "size": 10, "summary": "report"}
+    assert not store.is_ref(result)
+    assert await store.check_in(result, "execution", "node") is result
+    assert await store.check_out(result) is result
+
+    ref = await store.check_in(["x" * 100], "execution", "node")
+    assert not store.is_ref({**ref, "key": "other-execution/../secrets.json"})
+    assert not store.is_ref({**ref, "bucket": "apps-bucket"})
+    assert not store.is_ref({**ref, "extra": True})
@@ -0,0 +1,189 @@
+import asyncio
+import json
+
+import pytest
+
+from common.config import static
+from common.helpers import StatusPublisher, get_patches, make_status_update, mongo_update_from_patches
+from common.message_types import NodeStatusMessage, StatusEnum, WorkflowStatusMessage, message_dumps
+from common.redis_helpers import results_partition
+from common.workflow_types import Action, Point
+
+
+class ResultsQueue:
+    def __init__(self):
+        self.pushes = []
+        self.streams = {}
+
+    def pipeline(self):
+        return Pipeline(self)
+
+
+class Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.batch = []
+
+    def xadd(self, stream, fields):
+        self.batch.append((stream, fields))
+
+    async def execute(self):
+        updates = []
+        for stream, fields in self.batch:
+            update = json.loads(fields[static.REDIS_RESULTS_QUEUE])
+            assert stream == results_partition(update["execution_id"])
+            self.redis.streams.setdefault(stream, []).append(update)
+            updates.append(update)
+        self.redis.pushes.append(updates)
+
+
+class FlakyQueue(ResultsQueue):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def pipeline(self):
+        pipe = Pipeline(self)
+        if self.failures > 0:
+            self.failures -= 1
+
+            async def execute():
+                raise ConnectionError("redis went away")
+            pipe.execute = execute
+        return pipe
+
+
+def continued(label):
+    return WorkflowStatusMessage.execution_continued("execution", "workflow", "name", app_name="Basics",
+                                                     action_name="echo", label=label)
+
+
+@pytest.mark.asyncio
+async def test_updates_are_coalesced_into_one_push():
+    redis = ResultsQueue()
+    publisher = StatusPublisher(redis, delay=0.01)
+
+    await publisher.publish("execution", "workflow", WorkflowStatusMessage.execution_started("execution", "workflow",
+                                                                                             "name"))
+    for label in ("first", "second", "third"):
+        await publisher.publish("execution", "workflow", continued(label))
+    assert redis.pushes == []
+
+    await asyncio.sleep(0.05)
+    (batch,) = redis.pushes
+    assert len(batch) == 2
+    assert "third" in batch[1]["message"]
+    assert publisher.stats()["messages"] == 2
+
+
+@pytest.mark.asyncio
+async def test_completion_is_flushed_immediately():
+    redis = ResultsQueue()
+    publisher = StatusPublisher(redis, delay=10)
+
+    await publisher.publish("execution", "workflow", continued("first"))
+    await publisher.publish("execution", "workflow", WorkflowStatusMessage.execution_completed("execution",
+                                                                                               "workflow", "name"))
+    (batch,) = redis.pushes
+    assert [update["type"] for update in batch] == ["workflow", "workflow"]
+    assert "COMPLETED" in batch[1]["message"]
+    publisher.flush_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_each_execution_keeps_to_one_partition():
+    redis = ResultsQueue()
+    publisher = StatusPublisher(redis, delay=10)
+
+    executions = [f"execution-{i}" for i in range(20)]
+    for execution_id in executions:
+        await publisher.publish(execution_id, "workflow", WorkflowStatusMessage.execution_started(
+            execution_id, "workflow", "name"))
+    for execution_id in executions:
+        await publisher.publish(execution_id, "workflow", continued("second"))
+    await publisher.flush()
+
+    assert len(redis.streams) > 1
+    for updates in redis.streams.values():
+        for execution_id in {update["execution_id"] for update in updates}:
+            labels = [update["message"] for update in updates if update["execution_id"] == execution_id]
+            assert "EXECUTING" in labels[0] and "second" in labels[1]
+    publisher.flush_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_sent_with_the_next_one():
+    redis = FlakyQueue(failures=1)
+    publisher = StatusPublisher(redis, delay=10)
+    await publisher.publish("execution", "workflow", WorkflowStatusMessage.execution_started("execution", "workflow",
+                                                                                             "name"))
+    await publisher.publish("execution", "workflow", continued("first"))
+    with pytest.raises(ConnectionError):
+        await publisher.flush()
+
+    # The continued update is still the one a later continued update replaces
+    await publisher.publish("execution", "workflow", continued("second"))
+    await publisher.flush()
+    (batch,) = redis.pushes
+    assert len(batch) == 2
+    assert "EXECUTING" in batch[0]["message"] and "second" in batch[1]["message"]
+    assert publisher.stats()["messages"] == 2
+    publisher.flush_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_failed_completions_are_retried():
+    redis = FlakyQueue(failures=2)
+    publisher = StatusPublisher(redis, delay=0.01, max_retry_delay=0.05)
+    await publisher.publish("execution", "workflow", WorkflowStatusMessage.execution_completed("execution",
+                                                                                               "workflow", "name"))
+    assert redis.pushes == []
+
+    await asyncio.sleep(0.3)
+    (batch,) = redis.pushes
+    assert "COMPLETED" in batch[0]["message"]
+    assert publisher.buffer == []
+
+
+def test_node_updates_carry_their_node_id():
+    node_id = "5cce9465-c0ce-483d-b9bc-7d0bc8c690ce"
+    message = NodeStatusMessage("echo", node_id, "label", "Basics", "execution", status=StatusEnum.SUCCESS,
+                                result="done")
+    assert make_status_update("execution", "workflow", message)["node_id"] == node_id
+    assert "node_id" not in make_status_update("execution", "workflow", continued("label"))
+
+
+def test_patches_become_targeted_mongo_updates():
+    node_id = "5cce9465-c0ce-483d-b9bc-7d0bc8c690ce"
+    executing = [{"op": "add", "path": f"/node_statuses/{node_id}", "value": {"status": "EXECUTING"}}]
+    partial = [{"op": "add", "path": f"/node_statuses/{node_id}/result", "value": "chunk"}]
+    workflow = [{"op": "replace", "path": "/status", "value": "COMPLETED"},
+                {"op": "replace", "path": "/completed_at", "value": "now"}]
+
+    update = mongo_update_from_patches(executing)
+    assert update == {"$set": {f"node_statuses.{node_id}": {"status": "EXECUTING"}}, "$unset": {}}
+
+    # Setting part of a node status that is already being set as a whole has to be a separate update
+    assert mongo_update_from_patches(partial, update) is None
+
+    merged = mongo_update_from_patches(workflow, update)
+    assert merged["$set"] == {f"node_statuses.{node_id}": {"status": "EXECUTING"}, "status": "COMPLETED",
+                              "completed_at": "now"}
+    assert update["$set"] == {f"node_statuses.{node_id}": {"status": "EXECUTING"}}
+
+
+def test_partial_results_are_appended():
+    node = Action("scan", Point(0, 0), "nmap", "1.0.0", "scan", 1, id_="node")
+    patches = [json.loads(message_dumps(get_patches(NodeStatusMessage.partial_from_node(node, "execution", chunk, i))))
+               for i, chunk in enumerate(["first", "second", "third"])]
+
+    update = mongo_update_from_patches(patches[0][0:1])
+    assert update["$set"] == {"node_statuses.node.result": ["first"]}
+    update = mongo_update_from_patches(patches[2], mongo_update_from_patches(patches[1]))
+    assert update["$set"] == {"node_statuses.node.result.1": "second", "node_statuses.node.result.2": "third"}
+
+    # A streamed action's success leaves the partial results it sent in place
+    streamed = get_patches(NodeStatusMessage.streamed_from_node(node, "execution", 3))
+    assert {patch.path for patch in streamed} >= {"/node_statuses/node/status", "/node_statuses/node/completed_at"}
+    assert not any(patch.path.endswith(("/result", "/partial")) for patch in streamed)
+
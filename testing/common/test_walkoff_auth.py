@@ -0,0 +1,74 @@
+import asyncio
+import base64
+import json
+import time
+
+import pytest
+
+from common.helpers import WalkoffAuth, jwt_expiry
+
+
+def make_jwt(exp):
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{claims}.signature"
+
+
+class Response:
+    def __init__(self, body):
+        self.body = body
+
+    async def __aenter__(self):
+        await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def json(self):
+        return self.body
+
+
+class Session:
+    closed = False
+
+    def __init__(self, lifetime=15 * 60):
+        self.lifetime = lifetime
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        self.posts.append(url.rsplit("/", 1)[-1])
+        return Response({"access_token": make_jwt(time.time() + self.lifetime)})
+
+
+def test_jwt_expiry():
+    assert jwt_expiry(make_jwt(1234)) == 1234
+    assert jwt_expiry("not a jwt") is None
+
+
+@pytest.mark.asyncio
+async def test_token_is_reused_until_it_is_stale():
+    session = Session()
+    auth = WalkoffAuth()
+    auth.refresh_token = "refresh"
+
+    headers = await asyncio.gather(*(auth.get_header(session) for _ in range(10)))
+    assert session.posts == ["refresh"]
+    assert all(header == headers[0] for header in headers)
+
+    auth.expires_at = time.time()
+    await auth.get_header(session)
+    assert session.posts == ["refresh", "refresh"]
+    auth.refresher.cancel()
+
+
+@pytest.mark.asyncio
+async def test_token_is_refreshed_in_the_background():
+    session = Session(lifetime=1.5)
+    auth = WalkoffAuth(leeway=1)
+    auth.refresh_token = "refresh"
+
+    await auth.get_header(session)
+    await asyncio.sleep(1.2)
+    assert session.posts == ["refresh", "refresh"]
+    assert not auth.stale()
+    auth.refresher.cancel()
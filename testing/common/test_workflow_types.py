@@ -0,0 +1,55 @@
+import pytest
+
+from common.workflow_types import (Action, Condition, Transform, Point, ConditionException, TransformException,
+                                   compile_condition, compile_transform)
+
+
+def make_action(label):
+    return Action("echo", Point(0, 0), "Basics", "1.0.0", label, 1)
+
+
+@pytest.fixture
+def nodes():
+    parent, yes, no = (make_action(label) for label in ("parent action", "yes", "no"))
+    yield {parent.id_: parent}, {yes.id_: yes, no.id_: no}, {parent.id_: 5}
+
+
+def test_condition_program_is_reused(nodes):
+    parents, children, accumulator = nodes
+    source = "if parent_action.result > 3:\n    selected_node = yes\nelse:\n    selected_node = no"
+    condition = Condition("condition", Point(0, 0), "Builtin", "1.0.0", "condition", source)
+    (yes, no) = children
+
+    assert condition(parents, children, accumulator) == yes
+    accumulator[next(iter(parents))] = 1
+    assert condition(parents, children, accumulator) == no
+    assert compile_condition(source) is compile_condition(source)
+
+
+def test_condition_error_is_kept_from_first_run(nodes):
+    parents, children, accumulator = nodes
+    condition = Condition("condition", Point(0, 0), "Builtin", "1.0.0", "condition", "selected_node = missing")
+
+    with pytest.raises(ConditionException, match="NameError"):
+        condition(parents, children, accumulator)
+
+    # Children can't be reassigned
+    condition.conditional = "yes = 1"
+    with pytest.raises(ConditionException):
+        condition(parents, children, accumulator)
+
+
+def test_transform_symbols_do_not_leak_between_runs(nodes):
+    parents, _, accumulator = nodes
+    transform = Transform("transform", Point(0, 0), "Builtin", "1.0.0", "transform",
+                          "leftover = parent_action.result\nresult = leftover * 2")
+    assert transform(parents, accumulator) == 10
+
+    transform.transform = "result = leftover"
+    with pytest.raises(TransformException, match="NameError"):
+        transform(parents, accumulator)
+
+    transform.transform = "result = ("
+    with pytest.raises(TransformException, match="SyntaxError"):
+        transform(parents, accumulator)
+    assert compile_transform("result = (").tree is None
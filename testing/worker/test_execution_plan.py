@@ -0,0 +1,96 @@
+import uuid
+
+import pytest
+
+from worker.execution_plan import ExecutionPlan, PlanCache
+from common.workflow_types import Action, Branch, Parameter, ParameterVariant, Point, Workflow
+
+
+def make_action(label, priority=1):
+    return Action("echo", Point(0, 0), "Basics", "1.0.0", label, priority)
+
+
+@pytest.fixture
+def workflow():
+    """ orphan -> b, a -> (b, c) -> d """
+    orphan, a, b, c, d = (make_action(label) for label in ("orphan", "a", "b", "c", "d"))
+    branches = [Branch(orphan, b, str(uuid.uuid4())), Branch(a, b, str(uuid.uuid4())),
+                Branch(a, c, str(uuid.uuid4())), Branch(b, d, str(uuid.uuid4())), Branch(c, d, str(uuid.uuid4()))]
+    yield Workflow("plan", a, [orphan, a, b, c, d], [], [], [], branches, {}, execution_id=str(uuid.uuid4()))
+
+
+def labels(workflow, plan, indices):
+    return [workflow.nodes[plan.node_ids[i]].label for i in indices]
+
+
+def test_compile(workflow):
+    plan = ExecutionPlan.compile(workflow, workflow.start)
+    index = {workflow.nodes[node_id].label: i for i, node_id in enumerate(plan.node_ids)}
+
+    order = labels(workflow, plan, plan.order)
+    assert order[0] == "a" and order[-1] == "d"
+    assert sorted(order) == ["a", "b", "c", "d"]
+
+    assert not plan.reachable[index["orphan"]]
+    assert plan.parent_counts[index["a"]] == 0
+    assert plan.parent_counts[index["b"]] == 1  # the orphan will never run so it is not waited on
+    assert plan.parent_counts[index["d"]] == 2
+    assert sorted(labels(workflow, plan, plan.parents[index["b"]])) == ["a", "orphan"]
+    assert sorted(labels(workflow, plan, plan.children[index["a"]])) == ["b", "c"]
+
+
+def test_serialization(workflow):
+    plan = ExecutionPlan.compile(workflow, workflow.start)
+    loaded = ExecutionPlan.loads(plan.dumps())
+    assert all(getattr(plan, attr) == getattr(loaded, attr) for attr in ExecutionPlan.fields)
+
+
+def test_cache_key_ignores_execution(workflow):
+    key = ExecutionPlan.cache_key(workflow, workflow.start)
+    workflow.execution_id = str(uuid.uuid4())
+    assert ExecutionPlan.cache_key(workflow, workflow.start) == key
+
+    (b,) = [node for node in workflow.nodes.values() if node.label == "b"]
+    assert ExecutionPlan.cache_key(workflow, b) != key
+
+
+@pytest.mark.asyncio
+async def test_plan_cache_is_bounded(workflow):
+    cache = PlanCache(maxsize=1)
+    plan = await cache.get_or_compile(workflow, workflow.start)
+    assert await cache.get_or_compile(workflow, workflow.start) is plan
+
+    (c,) = [node for node in workflow.nodes.values() if node.label == "c"]
+    await cache.get_or_compile(workflow, c)
+    assert len(cache.plans) == 1
+    assert cache.get(ExecutionPlan.cache_key(workflow, workflow.start)) is None
+
+
+def test_prune_set(workflow):
+    plan = ExecutionPlan.compile(workflow, workflow.start)
+    ids = {node.label: node.id_ for node in workflow.nodes.values()}
+
+    # d has two parents so it decides for itself whether to run once both have finished
+    assert plan.prune_set(ids["c"]) == {ids["c"]}
+    assert plan.prune_set(ids["a"]) == {ids["a"], ids["c"]}
+    assert plan.prune_set(ids["a"]) is plan.prune_set(ids["a"])
+
+
+def test_consumers(workflow):
+    nodes = {node.label: node for node in workflow.nodes.values()}
+    nodes["d"].parameters = [Parameter("hosts", value=nodes["a"].id_, variant=ParameterVariant.ACTION_RESULT),
+                             Parameter("port", value=nodes["b"].id_, variant=ParameterVariant.STATIC_VALUE)]
+    nodes["c"].parameters = [Parameter("hosts", value=nodes["orphan"].id_, variant=ParameterVariant.ACTION_RESULT)]
+
+    plan = ExecutionPlan.compile(workflow, workflow.start)
+    index = {label: plan.index[node.id_] for label, node in nodes.items()}
+
+    assert labels(workflow, plan, plan.inputs[index["d"]]) == ["a"]
+    assert plan.consumer_counts[index["a"]] == 1
+    assert plan.consumer_counts[index["b"]] == 0  # a static value that happens to look like an id isn't a result
+    assert plan.consumer_counts[index["orphan"]] == 1
+
+    # Which results a node reads is part of the plan, so it must be part of the key
+    key = ExecutionPlan.cache_key(workflow, workflow.start)
+    nodes["d"].parameters[0].value = nodes["c"].id_
+    assert ExecutionPlan.cache_key(workflow, workflow.start) != key
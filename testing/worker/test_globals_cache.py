@@ -0,0 +1,37 @@
+import uuid
+
+import pytest
+
+from worker.globals_cache import GlobalsCache
+
+
+class VersionStore:
+    def __init__(self):
+        self.version = None
+
+    async def get(self, key):
+        return self.version
+
+
+@pytest.mark.asyncio
+async def test_globals_cache_fetches_only_missing_ids():
+    redis = VersionStore()
+    cache = GlobalsCache()
+    a, b = str(uuid.uuid4()), str(uuid.uuid4())
+    fetches = []
+
+    async def fetch(ids):
+        fetches.append(sorted(ids))
+        return {id_: f"value of {id_}" for id_ in ids}
+
+    assert await cache.get(redis, [a], fetch) == {a: f"value of {a}"}
+    assert await cache.get(redis, [a, b], fetch) == {a: f"value of {a}", b: f"value of {b}"}
+    assert fetches == [[a], [b]]
+
+    # Values that have already been dereferenced are not ids and shouldn't be requested
+    await cache.get(redis, [a, "some value", ["a", "list"]], fetch)
+    assert len(fetches) == 2
+
+    redis.version = b"1"
+    await cache.get(redis, [a, b], fetch)
+    assert fetches[-1] == sorted([a, b])
@@ -0,0 +1,165 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from worker.worker import Worker
+from worker.execution_plan import ExecutionPlan
+from common.message_types import NodeStatusMessage, StatusEnum, message_loads
+from common.workflow_types import Action, Branch, Parameter, ParameterVariant, Point, Workflow
+
+
+def make_action(label):
+    return Action("echo", Point(0, 0), "Basics", "1.0.0", label, 1)
+
+
+@pytest.fixture
+def diamond():
+    """ a -> (b, c) -> d """
+    a, b, c, d = (make_action(label) for label in "abcd")
+    branches = [Branch(a, b, str(uuid.uuid4())), Branch(a, c, str(uuid.uuid4())),
+                Branch(b, d, str(uuid.uuid4())), Branch(c, d, str(uuid.uuid4()))]
+    yield Workflow("diamond", a, [a, b, c, d], [], [], [], branches, {}, execution_id=str(uuid.uuid4()))
+
+
+@pytest.mark.asyncio
+async def test_wait_for_parents_wakes_on_last_parent(diamond):
+    worker = Worker(diamond)
+    a = diamond.start
+    b, c = sorted(diamond.successors(a), key=lambda n: n.label)
+    (d,) = diamond.successors(b)
+    parents = {n.id_: n for n in diamond.predecessors(d)}
+
+    waiter = asyncio.create_task(worker.wait_for_parents(d, parents))
+    await asyncio.sleep(0)
+    assert worker.unfinished_parents[d.id_] == 2
+
+    worker.accumulate(b.id_, "b")
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    # Storing a second result for the same parent must not count twice
+    worker.accumulate(b.id_, "b again")
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    worker.accumulate(c.id_, "c")
+    await asyncio.wait_for(waiter, 1)
+    assert worker.unfinished_parents[d.id_] == 0
+
+
+@pytest.mark.asyncio
+async def test_wait_for_parents_returns_when_already_finished(diamond):
+    worker = Worker(diamond)
+    a = diamond.start
+    (b, c) = diamond.successors(a)
+    worker.accumulate(a.id_, "a")
+
+    await asyncio.wait_for(worker.wait_for_parents(b, {a.id_: a}), 1)
+
+
+@pytest.mark.asyncio
+async def test_cancel_subgraph_benchmark():
+    """ Prunes one half of a 1,000 node binary tree, which used to mean scanning the locals of every task """
+    nodes = [make_action(f"n{i}") for i in range(1000)]
+    branches = [Branch(nodes[(i - 1) // 2], nodes[i], str(uuid.uuid4())) for i in range(1, len(nodes))]
+    workflow = Workflow("tree", nodes[0], nodes, [], [], [], branches, {}, execution_id=str(uuid.uuid4()))
+    worker = Worker(workflow)
+    worker.plan = ExecutionPlan.compile(workflow, workflow.start)
+
+    never = asyncio.Event()
+    for node in nodes:
+        worker.in_process[node.id_] = node
+        worker.node_tasks[node.id_] = asyncio.create_task(never.wait())
+
+    start = time.perf_counter()
+    await worker.cancel_subgraph(nodes[1])
+    elapsed = time.perf_counter() - start
+    print(f"Cancelled {len(worker.cancelled)} of {len(nodes)} nodes in {elapsed * 1000:.2f}ms")
+
+    pruned = worker.plan.prune_set(nodes[1].id_)
+    assert len(pruned) == 511  # the left subtree holds the whole partial bottom level
+    assert all(worker.node_tasks[node_id].cancelled() for node_id in pruned)
+    assert len(worker.in_process) == 489
+    assert worker.cancelled == pruned
+    assert elapsed < 1
+
+    for task in worker.node_tasks.values():
+        task.cancel()
+
+
+def test_results_are_dropped_after_their_last_reader(diamond):
+    a = diamond.start
+    b, c = sorted(diamond.successors(a), key=lambda n: n.label)
+    (d,) = diamond.successors(b)
+    c.parameters = [Parameter("data", value=a.id_, variant=ParameterVariant.ACTION_RESULT)]
+    d.parameters = [Parameter("data", value=a.id_, variant=ParameterVariant.ACTION_RESULT)]
+
+    worker = Worker(diamond)
+    worker.plan = plan = ExecutionPlan.compile(diamond, a)
+    worker.unconsumed = {node_id: plan.consumer_counts[i] for i, node_id in enumerate(plan.node_ids)}
+
+    worker.accumulate(a.id_, "a" * 1000)
+    worker.accumulate(b.id_, "b")
+    assert worker.accumulator[b.id_] is None  # nothing reads b's result
+
+    worker.release_inputs(c.id_)
+    assert worker.accumulator[a.id_] == "a" * 1000
+    worker.release_inputs(d.id_)
+    assert a.id_ in worker.accumulator and worker.accumulator[a.id_] is None
+
+
+@pytest.mark.asyncio
+async def test_partial_results_are_joined_into_the_result(diamond):
+    class Publisher:
+        def __init__(self):
+            self.messages = []
+
+        async def publish(self, execution_id, workflow_id, message):
+            self.messages.append(message)
+
+    a = diamond.start
+    worker = Worker(diamond, publisher=Publisher())
+    worker.in_process[a.id_] = a
+
+    for index, chunk in ((1, {"b": 2}), (0, {"a": 1})):
+        await worker.handle_action_result(NodeStatusMessage.partial_from_node(a, diamond.execution_id, chunk, index))
+    await worker.handle_action_result(NodeStatusMessage.streamed_from_node(a, diamond.execution_id, 2))
+
+    assert list(worker.accumulator[a.id_].items()) == [("a", 1), ("b", 2)]
+    assert worker.partials == {} and a.id_ not in worker.in_process
+    assert [m.partial for m in worker.publisher.messages] == [1, 0, 2]
+
+
+@pytest.mark.asyncio
+async def test_a_failed_shard_fails_the_parallel_action(diamond):
+    class ResultsStream:
+        def __init__(self):
+            self.messages = []
+
+        async def xadd(self, stream, fields):
+            (message,) = fields.values()
+            self.messages.append(message_loads(message))
+
+    a = diamond.start
+    worker = Worker(diamond, redis=ResultsStream())
+
+    async def run_shard(shard, parents, children):
+        await worker.wait_for_parents(shard, parents)
+        (value,) = shard.parameters[0].value
+        if value == "bad":
+            asyncio.get_running_loop().call_soon(worker.finish_shard, shard.id_, "unreachable", False)
+        else:
+            asyncio.get_running_loop().call_soon(worker.finish_shard, shard.id_, value.upper())
+    worker.schedule_node = run_shard
+
+    params = [Parameter("hosts", parallelized=True, value=["a", "bad", "c"], variant=ParameterVariant.STATIC_VALUE)]
+    await worker.execute_parallel_action(a, params, {})
+
+    (status,) = worker.redis.messages
+    assert status.status == StatusEnum.FAILURE
+    assert status.result == {"echo:shard_bad": "unreachable"}
+    assert a.id_ not in worker.accumulator
+    assert worker.parallel_in_process == {} and worker.parallel_accumulator == {}
+    assert worker.unfinished_parents == {} and worker.ready_events == {}
@@ -12,7 +12,7 @@ from compose.cli.command import get_project
 
 from common.config import config
 from common.docker_helpers import get_project
-from common.helpers import get_walkoff_auth_header
+from common.helpers import walkoff_auth
 
 logging.basicConfig(level=logging.INFO, format="{asctime} - {name} - {levelname}:{message}", style='{')
 logger = logging.getLogger("AppRepo")
@@ -38,7 +38,6 @@ class AppRepo:
     def __init__(self, path, session):
         self.path = Path(path)
         self.session = session
-        self.token = None
         self.apps = {}
         self.loaded_apis = {}
 
@@ -56,7 +55,7 @@ class AppRepo:
         while True:
             try:
                 # Do an explicit check to see if we have previously stored the api and update it if so.
-                headers, self.token = await get_walkoff_auth_header(self.session, self.token)
+                headers = await walkoff_auth.get_header(self.session)
                 async with self.session.get(url, headers=headers) as resp:
                     if resp.status == 200:
                         results = await resp.json()
@@ -71,7 +70,7 @@ class AppRepo:
     async def store_api(self, api):
         url = f"{config.API_URI}/walkoff/api/apps/apis/"
         try:
-            headers, self.token = await get_walkoff_auth_header(self.session, self.token)
+            headers = await walkoff_auth.get_header(self.session)
             if api.get("name") in self.loaded_apis:
                 async with self.session.put(url + f"{api['name']}", json=api, headers=headers) as resp:
                     if resp.status == 200:
@@ -111,7 +110,7 @@ class AppRepo:
             return
 
         try:
-            headers, self.token = await get_walkoff_auth_header(self.session, self.token)
+            headers = await walkoff_auth.get_header(self.session)
             [await self.session.delete(f"{url}{api}", headers=headers) for api in unused_apis]
 
         except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
@@ -12,8 +12,9 @@ import aioredis
 from aiodocker.exceptions import DockerError
 
 from common.config import config, static
-from common.helpers import send_status_update, UUID_GLOB
-from common.redis_helpers import connect_to_aioredis_pool, xlen, xdel
+from common.helpers import send_status_update
+from common.redis_helpers import (connect_to_aioredis_pool, xlen, xdel, get_active_streams, unregister_streams,
+                                  prune_streams, split_action_stream)
 from common.message_types import WorkflowStatusMessage
 from common.workflow_types import workflow_loads
 from common.docker_helpers import (ServiceKwargs, DockerBuildError, docker_context, stream_docker_log, get_containers,
@@ -92,7 +93,11 @@ class Umpire:
         logger.info("Shutting down Umpire...")
 
         # Clean up redis streams
-        action_queues = set(await self.redis.keys(pattern="*:*", encoding="utf-8")).union({static.REDIS_WORKFLOW_QUEUE})
+        action_streams = await get_active_streams(self.redis)
+        execution_ids = {split_action_stream(stream)[0] for stream in action_streams} - {None}
+        results_streams = {f"{execution_id}:results" for execution_id in execution_ids}
+        action_queues = set(action_streams).union(results_streams, {static.REDIS_WORKFLOW_QUEUE})
+        await unregister_streams(self.redis, action_streams)
         await self.redis.xgroup_destroy(static.REDIS_WORKFLOW_QUEUE, static.REDIS_WORKFLOW_GROUP)
         [await self.redis.xgroup_destroy(q, static.REDIS_ACTION_RESULTS_GROUP) for q in action_queues]
         mask = [await self.redis.delete(q) for q in action_queues]
@@ -117,7 +122,18 @@ class Umpire:
     async def get_running_apps(self):
         func = lambda s: s['Spec']['Name'].count(static.APP_PREFIX) > 0
         services = filter(func, (await self.docker_client.services.list()))
-        return {s['Spec']['Name']: {'id': s["ID"], 'version': s['Version']['Index']} for s in services}
+        return {s['Spec']['Name']: {'id': s["ID"], 'version': s['Version']['Index'],
+                                    'max_actions': self.max_concurrent_actions(s)} for s in services}
+
+    @staticmethod
+    def max_concurrent_actions(service):
+        """ The actions each replica of an app service runs at once, as set in its app's env.txt """
+        env = service['Spec']['TaskTemplate'].get('ContainerSpec', {}).get('Env') or []
+        env = dict(var.split('=', 1) for var in env if '=' in var)
+        try:
+            return max(int(env.get("APP_MAX_CONCURRENT_ACTIONS", config.APP_MAX_CONCURRENT_ACTIONS)), 1)
+        except ValueError:
+            return 1
 
     async def launch_workers(self, replicas=1):
         try:
@@ -153,7 +169,8 @@ class Umpire:
         logger.debug(f"Executing Workflows: {executing_workflows}")
 
         current_workers = self.service_replicas.get(static.WORKER_SERVICE, {"running": 0, "desired": 0})["desired"]
-        workers_needed = min(total_workflows, self.max_workers)
+        workflows_per_worker = max(config.get_int("WORKER_MAX_CONCURRENT_WORKFLOWS", 10), 1)
+        workers_needed = min(-(-total_workflows // workflows_per_worker), self.max_workers)
         logger.debug(f"Running Workers: {current_workers}")
         logger.debug(f"Needed Workers: {workers_needed}")
 
@@ -168,59 +185,55 @@ class Umpire:
         logger.debug(
             f"Running apps: {[{s: self.service_replicas.get(s)['running']} for s in self.running_apps.keys()]}")
 
-        streams = [key.split(':') for key in await self.redis.keys(pattern=UUID_GLOB + ":*:*", encoding="utf-8")]
-
-        workloads = {f"{app_name}:{version}": {"total": 0, "queued": 0, "executing": 0}
-                     for _, app_name, version in streams}
-
-        if len(streams) > 0:
-            for execution_id, app_name, version in streams:
-                stream = f"{execution_id}:{app_name}:{version}"
-                group = f"{app_name}:{version}"
-                try:
-                    executing_work = (await self.redis.xpending(stream=stream, group_name=group))[0]
-                    total_work = await xlen(self.redis, stream)
-                except aioredis.ReplyError:
-                    continue  # the group or stream got closed while we were checking other streams
-
-                queued_work = total_work - executing_work
-
-                workloads[group]["executing"] += executing_work
-                workloads[group]["queued"] += queued_work
-                workloads[group]["total"] += total_work
-
-                service_name = f"{static.APP_PREFIX}_{app_name}"
-                curr_replicas = self.service_replicas.get(service_name, {"running": 0, "desired": 0})["desired"]
-                max_replicas = config.get_int("MAX_APP_REPLICAS", 10)
-                replicas_needed = min(total_work, max_replicas)
-
-                logger.debug(f"Total work: {total_work}")
-                logger.debug(f"queued: {total_work}")
-
-                logger.debug(f"Needed replicas: {replicas_needed}")
-                logger.debug(f"Current replicas: {curr_replicas}")
-
-                if replicas_needed > curr_replicas:
-                    logger.info(f"Launching app {':'.join([service_name, version])}")
+        streams = await get_active_streams(self.redis)
 
-                if replicas_needed > curr_replicas > 0:
-                    await self.launch_app(service_name, version, replicas_needed)
-                elif replicas_needed > curr_replicas == 0:  # scale to 0 and restart
-                    await self.launch_app(service_name, version, 0)
-                    await self.launch_app(service_name, version, replicas_needed)
+        # An app group's work may be spread over many streams, so add it all up before deciding how many replicas
+        workloads = {}
+        for stream in streams:
+            _, group = split_action_stream(stream)
+            try:
+                executing_work = (await self.redis.xpending(stream=stream, group_name=group))[0]
+                total_work = await xlen(self.redis, stream)
+            except aioredis.ReplyError:
+                # the group or stream got closed while we were checking other streams
+                await unregister_streams(self.redis, [stream])
+                continue
 
-            for service_name, workload in workloads.items():
-                logger.debug(f"Queued actions for {service_name}: {workload['queued']}")
-                logger.debug(f"Executing actions for {service_name}: {workload['executing']}")
+            workload = workloads.setdefault(group, {"total": 0, "queued": 0, "executing": 0})
+            workload["executing"] += executing_work
+            workload["queued"] += total_work - executing_work
+            workload["total"] += total_work
+
+        max_replicas = config.get_int("MAX_APP_REPLICAS", 10)
+        for group, workload in workloads.items():
+            app_name, version = group.split(':')
+            service_name = f"{static.APP_PREFIX}_{app_name}"
+            curr_replicas = self.service_replicas.get(service_name, {"running": 0, "desired": 0})["desired"]
+            actions_per_replica = self.running_apps.get(service_name, {}).get("max_actions", 1)
+            replicas_needed = min(-(-workload["total"] // actions_per_replica), max_replicas)
+
+            logger.debug(f"Queued actions for {group}: {workload['queued']}")
+            logger.debug(f"Executing actions for {group}: {workload['executing']}")
+            logger.debug(f"Needed replicas: {replicas_needed}")
+            logger.debug(f"Current replicas: {curr_replicas}")
+
+            if replicas_needed > curr_replicas:
+                logger.info(f"Launching app {':'.join([service_name, version])}")
+
+            if replicas_needed > curr_replicas > 0:
+                await self.launch_app(service_name, version, replicas_needed)
+            elif replicas_needed > curr_replicas == 0:  # scale to 0 and restart
+                await self.launch_app(service_name, version, 0)
+                await self.launch_app(service_name, version, replicas_needed)
 
     async def check_pending_actions(self):
         self.running_apps = await self.get_running_apps()
-        action_queues = set(await self.redis.keys(pattern=UUID_GLOB + ":*:*", encoding="utf-8"))
+        action_queues = set(await prune_streams(self.redis, await get_active_streams(self.redis)))
         if len(action_queues) > 0:
             for key in action_queues:
-                execution_id, app_name, version = key.split(':')
+                _, app_group = split_action_stream(key)
+                app_name, version = app_group.split(':')
                 service_name = f"{static.APP_PREFIX}_{app_name}"
-                app_group = f"{app_name}:{version}"
                 pending = (await self.redis.xpending(key, app_group))
                 if pending[0] > 0:
                     containers = await get_containers(self.docker_client, service_name, short_ids=True)
@@ -249,6 +262,51 @@ class Umpire:
                             await self.redis.xack(stream=key, group_name=app_group, id=id_)
                             await xdel(self.redis, stream=key, id_=id_)
 
+    async def drop_shared_stream_actions(self, execution_id):
+        """
+            Removes the actions of execution_id that apps are executing from shared app streams, and returns the apps
+            executing them. Its queued actions are left for the apps to skip, since the execution is flagged as aborting.
+        """
+        consumers = set()
+        shared_streams = [s for s in await get_active_streams(self.redis) if split_action_stream(s)[0] is None]
+        for stream in shared_streams:
+            num_pending = (await self.redis.xpending(stream, stream))[0]
+            if num_pending < 1:
+                continue
+
+            for id_, consumer, _, _ in await self.redis.xpending(stream, stream, "-", "+", num_pending):
+                entry = await self.redis.xrange(stream, id_, id_)
+                if len(entry) < 1 or execution_id.encode() not in entry[0][1]:
+                    continue
+
+                consumers.add(consumer.decode())
+                await self.redis.xack(stream=stream, group_name=stream, id=id_)
+                await xdel(self.redis, stream=stream, id_=id_)
+        return consumers
+
+    async def abort_app_actions(self, apps, execution_id):
+        """
+            Signals apps to cancel their actions for execution_id. Apps run actions from many executions at once, so
+            they only cancel those of executions flagged for abort.
+        """
+        for app in apps:
+            try:
+                container = await self.docker_client.containers.get(app)
+                await container.kill(signal="SIGQUIT")
+            except DockerError:
+                logger.exception(f"Failed to signal app {app} while aborting {execution_id}.")
+
+    async def get_executing_worker(self, execution_id, num_executing):
+        """ Finds the worker consuming the workflow-queue entry for execution_id """
+        pending = await self.redis.xpending(static.REDIS_WORKFLOW_QUEUE, static.REDIS_WORKFLOW_GROUP, "-", "+",
+                                            num_executing)
+        for id_, consumer, _, _ in pending:
+            entry = await self.redis.xrange(static.REDIS_WORKFLOW_QUEUE, id_, id_)
+            if len(entry) > 0 and execution_id.encode() in entry[0][1]:
+                return consumer.decode()
+
+        raise DockerError(404, {"message": f"No worker is executing {execution_id}"})
+
     async def monitor_queues(self):
         # count = 0
         while True:
@@ -304,9 +362,9 @@ class Umpire:
                 status = WorkflowStatusMessage.execution_aborted(execution_id, workflow.id_, workflow.name)
                 await send_status_update(self.session, execution_id, workflow.id_, status)
             else:
-                # Kill worker
+                # Signal the worker executing this workflow. It will only abort the executions flagged for abort.
                 try:
-                    worker_to_abort = executing_workflows[3][0][0].decode()
+                    worker_to_abort = await self.get_executing_worker(execution_id, executing_workflows[0])
                     container = await self.docker_client.containers.get(worker_to_abort)
                     await container.kill(signal="SIGQUIT")
                 except DockerError as e:
@@ -315,24 +373,23 @@ class Umpire:
                     else:
                         logger.exception("Failed to kill worker after workflow abort. Unexpected behavior may result.")
 
-                # Kill apps
-                action_streams = await self.redis.keys(f"{execution_id}:*:*", encoding="utf-8")
+                # Drop the execution's actions and have the apps cancel any they are running
+                action_streams = await get_active_streams(self.redis, execution_id=execution_id)
+                await unregister_streams(self.redis, action_streams)
 
-                for stream in action_streams:
-                    _, app_name, version = stream.split(':')
-                    app_group = f"{app_name}:{version}"
-                    executing_apps = (await self.redis.xpending(stream, app_group))[3]
-                    await self.redis.delete(stream)
+                executing_apps = set()
+                for action_stream in action_streams:  # Don't shadow the control stream we ack below
+                    _, app_group = split_action_stream(action_stream)
+                    consumers = (await self.redis.xpending(action_stream, app_group))[3]
+                    executing_apps.update(app.decode() for app, _ in consumers or [])
+                    await self.redis.delete(action_stream)
 
+                if len(action_streams) > 0:
                     status = WorkflowStatusMessage.execution_aborted(execution_id, workflow.id_, workflow.name)
                     await send_status_update(self.session, execution_id, workflow.id_, status)
 
-                    if executing_apps is None:
-                        break
-
-                    for app, _ in executing_apps:
-                        container = await self.docker_client.containers.get(app.decode())
-                        await container.kill(signal="SIGKILL")
+                executing_apps |= await self.drop_shared_stream_actions(execution_id)
+                await self.abort_app_actions(executing_apps, execution_id)
                 await self.redis.delete(f"{execution_id}:results")
             await self.redis.xack(stream=stream, group_name=static.REDIS_WORKFLOW_CONTROL_GROUP, id=id_)
             await xdel(self.redis, stream=stream, id_=id_)
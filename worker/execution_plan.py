@@ -0,0 +1,201 @@
+import hashlib
+import heapq
+import json
+import logging
+from collections import OrderedDict, deque
+
+import aioredis
+
+from common.config import config, static
+from common.workflow_types import Workflow, Node, Action, Condition, Transform, ParameterVariant
+
+logger = logging.getLogger("WORKER")
+
+
+class ExecutionPlan:
+    """
+        The precomputed topology of a workflow for a given start node. Nodes are referred to by their index in node_ids
+        so a plan can be shared between executions of the same workflow, which each hold their own Node objects.
+    """
+    fields = ("node_ids", "order", "reachable", "parent_counts", "parents", "children", "inputs", "consumer_counts")
+    __slots__ = fields + ("index", "prune_sets")
+
+    def __init__(self, node_ids, order, reachable, parent_counts, parents, children, inputs, consumer_counts):
+        self.node_ids = node_ids  # index -> node id
+        self.order = order  # indices of the reachable nodes in topological order
+        self.reachable = reachable  # index -> whether the node can run from the start node
+        self.parent_counts = parent_counts  # index -> number of reachable parents the node must wait on
+        self.parents = parents  # index -> tuple of parent indices
+        self.children = children  # index -> tuple of child indices
+        self.inputs = inputs  # index -> tuple of indices of the nodes whose results the node reads
+        self.consumer_counts = consumer_counts  # index -> number of reachable nodes which read the node's result
+        self.index = {node_id: i for i, node_id in enumerate(node_ids)}
+        self.prune_sets = {}  # node id -> frozenset of node ids, filled in as branches are pruned
+
+    @staticmethod
+    def cache_key(workflow: Workflow, start: Node):
+        """ Identifies a plan by workflow id, a hash of the workflow's topology, and the start node """
+        digest = hashlib.sha1()
+        for node_id, node in sorted(workflow.nodes.items()):
+            digest.update(f"{node_id}:{node.priority};".encode())
+        for src, dst in sorted((src.id_, dst.id_) for src, dsts in workflow.edges.items() for dst in dsts):
+            digest.update(f"{src}>{dst};".encode())
+        for node_id, node in sorted(workflow.nodes.items()):
+            for param in getattr(node, "parameters", ()):
+                if param.variant == ParameterVariant.ACTION_RESULT:
+                    digest.update(f"{param.value}<{node_id};".encode())
+        return f"{workflow.id_}:{digest.hexdigest()}:{start.id_}"
+
+    @classmethod
+    def compile(cls, workflow: Workflow, start: Node):
+        node_ids = [node.id_ for node in workflow.nodes.values()]
+        index = {node_id: i for i, node_id in enumerate(node_ids)}
+        children = [tuple(index[child.id_] for child in sorted(workflow.successors(workflow.nodes[node_id]),
+                                                                 reverse=True))
+                    for node_id in node_ids]
+        parents = [tuple(index[parent.id_] for parent in workflow.rev_adjacency.get(workflow.nodes[node_id], ()))
+                   for node_id in node_ids]
+
+        # BFS from the start node in the same priority order the worker has always used to visit nodes
+        start = index[start.id_]
+        parents[start] = ()
+        reachable = [False] * len(node_ids)
+        reachable[start] = True
+        visit_order = []
+        queue = deque([start])
+        while queue:
+            i = queue.pop()
+            visit_order.append(i)
+            for child in children[i]:
+                if not reachable[child]:
+                    reachable[child] = True
+                    queue.appendleft(child)
+
+        parent_counts = [sum(1 for parent in parents[i] if reachable[parent]) for i in range(len(node_ids))]
+
+        # Kahn's algorithm over the reachable subgraph, breaking ties by BFS visit order
+        position = {i: pos for pos, i in enumerate(visit_order)}
+        remaining = list(parent_counts)
+        heap = [(position[start], start)]
+        order = []
+        while heap:
+            _, i = heapq.heappop(heap)
+            order.append(i)
+            for child in children[i]:
+                if reachable[child] and child != start:
+                    remaining[child] -= 1
+                    if remaining[child] == 0:
+                        heapq.heappush(heap, (position[child], child))
+
+        # Nodes caught in a cycle never reach zero remaining parents, so just keep their BFS order
+        if len(order) < len(visit_order):
+            ordered = set(order)
+            order.extend(i for i in visit_order if i not in ordered)
+
+        # Conditions and transforms read their parents' results, actions the results named by their parameters
+        inputs = []
+        for i, node_id in enumerate(node_ids):
+            node = workflow.nodes[node_id]
+            if isinstance(node, (Condition, Transform)):
+                inputs.append(tuple(parents[i]))
+            elif isinstance(node, Action):
+                inputs.append(tuple(sorted({index[p.value] for p in node.parameters
+                                            if p.variant == ParameterVariant.ACTION_RESULT and p.value in index})))
+            else:
+                inputs.append(())
+
+        consumer_counts = [0] * len(node_ids)
+        for i in order:
+            for producer in inputs[i]:
+                consumer_counts[producer] += 1
+
+        return cls(node_ids, order, reachable, parent_counts, parents, children, inputs, consumer_counts)
+
+    def prune_set(self, node_id):
+        """
+            Returns the ids of the node and every descendant that can only be reached through it, which is everything
+            that must be cancelled when the node won't run. Children with other parents are left to decide for
+            themselves once all their parents have finished.
+        """
+        prune_set = self.prune_sets.get(node_id)
+        if prune_set is not None:
+            return prune_set
+
+        if node_id not in self.index:
+            return frozenset((node_id,))
+
+        start = self.index[node_id]
+        seen = {start}
+        stack = [start]
+        while stack:
+            i = stack.pop()
+            for child in self.children[i]:
+                if child not in seen and len(self.parents[child]) == 1:
+                    seen.add(child)
+                    stack.append(child)
+
+        prune_set = self.prune_sets[node_id] = frozenset(self.node_ids[i] for i in seen)
+        return prune_set
+
+    def dumps(self):
+        return json.dumps({attr: getattr(self, attr) for attr in self.fields})
+
+    @classmethod
+    def loads(cls, s):
+        plan = json.loads(s)
+        plan["parents"] = [tuple(p) for p in plan["parents"]]
+        plan["children"] = [tuple(c) for c in plan["children"]]
+        plan["inputs"] = [tuple(i) for i in plan["inputs"]]
+        return cls(**plan)
+
+
+class PlanCache:
+    """ A bounded LRU of compiled ExecutionPlans, optionally shared between workers through redis """
+
+    def __init__(self, maxsize=128, ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.plans = OrderedDict()
+
+    def get(self, key):
+        plan = self.plans.get(key)
+        if plan is not None:
+            self.plans.move_to_end(key)
+        return plan
+
+    def put(self, key, plan):
+        self.plans[key] = plan
+        self.plans.move_to_end(key)
+        while len(self.plans) > self.maxsize:
+            self.plans.popitem(last=False)
+
+    async def get_or_compile(self, workflow: Workflow, start: Node, redis: aioredis.Redis = None):
+        key = ExecutionPlan.cache_key(workflow, start)
+        plan = self.get(key)
+        if plan is not None:
+            return plan
+
+        redis_key = f"{static.REDIS_EXECUTION_PLANS}:{key}"
+        if redis is not None and self.ttl > 0:
+            try:
+                cached = await redis.get(redis_key)
+                if cached is not None:
+                    plan = ExecutionPlan.loads(cached)
+            except (aioredis.RedisError, ValueError, TypeError, KeyError):
+                logger.exception(f"Could not load execution plan {key} from redis.")
+
+        if plan is None:
+            plan = ExecutionPlan.compile(workflow, start)
+            logger.debug(f"Compiled execution plan {key}")
+            if redis is not None and self.ttl > 0:
+                try:
+                    await redis.set(redis_key, plan.dumps(), expire=self.ttl)
+                except aioredis.RedisError:
+                    logger.exception(f"Could not store execution plan {key} in redis.")
+
+        self.put(key, plan)
+        return plan
+
+
+plan_cache = PlanCache(maxsize=config.get_int("WORKER_PLAN_CACHE_SIZE", 128),
+                       ttl=config.get_int("WORKER_PLAN_CACHE_TTL", 0))
@@ -0,0 +1,41 @@
+import logging
+
+import aioredis
+
+from common.config import static
+from common.helpers import validate_uuid
+
+logger = logging.getLogger("WORKER")
+
+
+class GlobalsCache:
+    """
+        Caches global variables fetched from the API. The API bumps a version key in redis whenever a global is
+        created, updated or deleted, so the cache only needs one redis GET to know whether it is still valid.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.globals = {}
+
+    async def get(self, redis: aioredis.Redis, ids, fetch):
+        """
+            Returns a dict of the requested global ids to globals. Ids which aren't cached are requested from fetch,
+            which takes a list of ids and returns a dict of those globals, in a single batch.
+        """
+        version = await redis.get(static.REDIS_GLOBALS_VERSION)
+        if version != self.version:
+            logger.debug(f"Globals changed from version {self.version} to {version}, clearing cache.")
+            self.globals = {}
+            self.version = version
+
+        # Parameters that have already been dereferenced hold the global's value rather than its id
+        ids = {id_ for id_ in ids if validate_uuid(id_) is not None}
+        missing = [id_ for id_ in ids if id_ not in self.globals]
+        if missing:
+            self.globals.update(await fetch(missing))
+
+        return {id_: self.globals[id_] for id_ in ids if id_ in self.globals}
+
+
+globals_cache = GlobalsCache()
@@ -1,11 +1,9 @@
 import asyncio
+import copy
 import datetime
 import logging
 import sys
 import signal
-from collections import deque
-from inspect import getcoroutinelocals
-from asteval import Interpreter
 
 import aiohttp
 import aioredis
@@ -13,125 +11,182 @@ import socketio
 
 from common.message_types import message_dumps, message_loads, NodeStatusMessage, WorkflowStatusMessage, StatusEnum
 from common.config import config, static
-from common.helpers import get_walkoff_auth_header, send_status_update
+from common.helpers import walkoff_auth, StatusPublisher
+from common.result_store import result_store
 from common.socketio_helpers import connect_to_socketio
-from common.redis_helpers import connect_to_aioredis_pool, xdel, deref_stream_message
-from common.workflow_types import (Node, Action, Condition, Transform, Parameter, Trigger,
+from common.redis_helpers import (connect_to_aioredis_pool, xdel, xack_xdel, deref_stream_message, register_stream,
+                                  unregister_streams, action_stream, split_action_stream)
+from common.workflow_types import (Action, Condition, Transform, Parameter, Trigger,
                                    ParameterVariant, Workflow, workflow_dumps, workflow_loads, ConditionException,
                                    TransformException)
+from worker.execution_plan import plan_cache
+from worker.globals_cache import globals_cache
 
 logging.basicConfig(level=logging.INFO, format="{asctime} - {name} - {levelname}:{message}", style='{')
 logger = logging.getLogger("WORKER")
 static.set_local_hostname("local_worker")
 
+shared_streams = set()  # Shared app streams this process has already created and registered
+
 
 class Worker:
     def __init__(self, workflow: Workflow = None, start_action: str = None, redis: aioredis.Redis = None,
-                 session: aiohttp.ClientSession = None):
+                 session: aiohttp.ClientSession = None, publisher: StatusPublisher = None):
         self.workflow = workflow
         self.start_action = start_action if start_action is not None else self.workflow.start
         self.results_stream = f"{workflow.execution_id}:results"
-        self.parallel_accumulator = {}
+        self.parallel_accumulator = {}  # shard id -> future for the shard's result
         self.accumulator = {}
+        self.unconsumed = {}  # node id -> number of nodes yet to read its result
         self.parallel_in_process = {}
         self.in_process = {}
+        self.partials = {}  # node id -> {index: partial result} of streamed actions still executing
         self.redis = redis
         self.streams = set()
         self.scheduling_tasks = set()
+        self.node_tasks = {}
+        self.plan = None
         self.results_getter_task = None
         self.parallel_tasks = set()
         self.workflow_tasks = set()
         self.execution_task = None
         self.session = session
-        self.token = None
+        self.publisher = publisher if publisher is not None else StatusPublisher(redis)
         self.parent_map = {}
-        self.cancelled = []
+        self.unfinished_parents = {}
+        self.ready_events = {}
+        self.cancelled = set()
 
     @staticmethod
-    async def get_workflow(redis: aioredis.Redis):
+    async def get_workflow(redis: aioredis.Redis, slots: asyncio.Semaphore = None, executing: dict = None):
         """
-            Continuously monitors the workflow queue for new work
+            Continuously monitors the workflow queue for new work. The queue is only read while one of the slots is
+            free; the caller releases the slot once the yielded workflow has finished executing.
         """
+        slots = slots if slots is not None else asyncio.Semaphore(1)
+        executing = executing if executing is not None else {}
         while True:
+            await slots.acquire()
             logger.info("Waiting for workflows...")
             # if static.CONTAINER_ID is None:
             #     logger.exception("Environment variable 'HOSTNAME' does not exist in worker container.")
             #     sys.exit(-1)
 
             try:
-                message = await redis.xread_group(static.REDIS_WORKFLOW_GROUP, static.CONTAINER_ID,
-                                                  streams=[static.REDIS_WORKFLOW_QUEUE], latest_ids=['>'],
-                                                  timeout=config.get_int("WORKER_TIMEOUT", 30) * 1000, count=1)
+                # Blocking reads need their own connection so they don't stall executions sharing the pool
+                with await redis as conn:
+                    message = await conn.xread_group(static.REDIS_WORKFLOW_GROUP, static.CONTAINER_ID,
+                                                     streams=[static.REDIS_WORKFLOW_QUEUE], latest_ids=['>'],
+                                                     timeout=config.get_int("WORKER_TIMEOUT", 30) * 1000, count=1)
             except aioredis.ReplyError as e:
                 logger.error(f"Error reading from workflow queue: {e}.")
                 sys.exit(-1)
 
-            if len(message) < 1:  # We've timed out with no work. Guess we'll die now...
-                sys.exit(1)
+            if len(message) < 1:
+                slots.release()
+                if len(executing) < 1:  # We've timed out with no work. Guess we'll die now...
+                    sys.exit(1)
+                continue
 
             execution_id_workflow, stream, id_ = deref_stream_message(message)
             execution_id, workflow = execution_id_workflow
             try:
                 if not (await redis.sismember(static.REDIS_ABORTING_WORKFLOWS, execution_id)):
                     await redis.sadd(static.REDIS_EXECUTING_WORKFLOWS, execution_id)
-                    yield workflow_loads(workflow)
+                    yield workflow_loads(workflow), stream, id_
+                    continue
 
             except Exception as e:
                 logger.exception(e)
-            finally:  # Clean up workflow-queue
-                await redis.xack(stream=stream, group_name=static.REDIS_WORKFLOW_GROUP, id=id_)
-                await xdel(redis, stream=stream, id_=id_)
+
+            # The workflow was aborted before it started or couldn't be loaded so clean up workflow-queue now
+            slots.release()
+            await redis.xack(stream=stream, group_name=static.REDIS_WORKFLOW_GROUP, id=id_)
+            await xdel(redis, stream=stream, id_=id_)
 
     @staticmethod
     async def run():
-        async with connect_to_aioredis_pool(config.REDIS_URI) as redis, \
+        max_workflows = config.get_int("WORKER_MAX_CONCURRENT_WORKFLOWS", 10)
+
+        # Each execution holds a connection for blocking reads on its results stream, so size the pool to match
+        async with connect_to_aioredis_pool(config.REDIS_URI, maxsize=10 + 2 * max_workflows) as redis, \
                 aiohttp.ClientSession(json_serialize=message_dumps) as session:
 
+            slots = asyncio.Semaphore(max_workflows)
+            executing = {}
+            running = set()  # The event loop only keeps weak references to tasks
+            publisher = StatusPublisher(redis, delay=config.get_int("WORKER_STATUS_FLUSH_MS", 5) / 1000)
+
             # Attach our signal handlers to cleanly close services we've created
             loop = asyncio.get_running_loop()
             loop.add_signal_handler(signal.SIGINT, lambda: asyncio.ensure_future(Worker.shutdown()))
             loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(Worker.shutdown()))
 
-            async for workflow in Worker.get_workflow(redis):
+            # SIGQUIT only tells us that something should be aborted, redis tells us which executions
+            loop.add_signal_handler(signal.SIGQUIT, lambda: asyncio.ensure_future(Worker.abort_flagged(redis,
+                                                                                                       executing)))
+
+            async for workflow, stream, id_ in Worker.get_workflow(redis, slots, executing):
 
                 # Setup worker and results stream
-                worker = Worker(workflow, redis=redis, session=session)
+                worker = Worker(workflow, redis=redis, session=session, publisher=publisher)
+                executing[workflow.execution_id] = worker
 
-                # Attach our abort signal handler to a specific instance of the worker
-                loop.add_signal_handler(signal.SIGQUIT, lambda: asyncio.ensure_future(worker.abort()))
+                def finished(task, execution_id=workflow.execution_id):
+                    running.discard(task)
+                    executing.pop(execution_id, None)
+                    slots.release()
 
-                log_msg = f"workflow: {workflow.name} ({workflow.id_}) as {workflow.execution_id}"
+                task = asyncio.create_task(worker.run_workflow(stream, id_))
+                running.add(task)
+                task.add_done_callback(finished)
 
-                await redis.xgroup_create(worker.results_stream, static.REDIS_ACTION_RESULTS_GROUP, mkstream=True)
-                logger.info(f"Starting {log_msg}")
-                status = WorkflowStatusMessage.execution_started(worker.workflow.execution_id, worker.workflow.id_,
-                                                                 worker.workflow.name)
+            await Worker.shutdown()
 
-                await send_status_update(redis, workflow.execution_id, workflow.id_, status)
+    async def run_workflow(self, stream, id_):
+        """ Executes the workflow and reports its final status, then removes it from the workflow queue """
+        workflow = self.workflow
+        log_msg = f"workflow: {workflow.name} ({workflow.id_}) as {workflow.execution_id}"
 
-                try:
-                    worker.execution_task = asyncio.create_task(worker.execute_workflow())
-                    await asyncio.gather(worker.execution_task)
-
-                except asyncio.CancelledError:
-                    logger.info(f"Aborting {log_msg}")
-                    status = WorkflowStatusMessage.execution_aborted(worker.workflow.execution_id,
-                                                                     worker.workflow.id_,
-                                                                     worker.workflow.name)
-                except Exception:
-                    logger.info(f"Failed {log_msg}")
-                    status = WorkflowStatusMessage.execution_completed(worker.workflow.execution_id,
-                                                                       worker.workflow.id_,
-                                                                       worker.workflow.name)
-                else:
-                    logger.info(f"Completed {log_msg}")
-                    status = WorkflowStatusMessage.execution_completed(worker.workflow.execution_id,
-                                                                       worker.workflow.id_,
-                                                                       worker.workflow.name)
-                finally:
-                    await send_status_update(redis, workflow.execution_id, workflow.id_, status)
+        try:
+            await self.redis.xgroup_create(self.results_stream, static.REDIS_ACTION_RESULTS_GROUP, mkstream=True)
+            logger.info(f"Starting {log_msg}")
+            status = WorkflowStatusMessage.execution_started(workflow.execution_id, workflow.id_, workflow.name)
 
-            await Worker.shutdown()
+            await self.publisher.publish(workflow.execution_id, workflow.id_, status)
+
+            try:
+                self.execution_task = asyncio.create_task(self.execute_workflow())
+                await self.execution_task
+
+            except asyncio.CancelledError:
+                logger.info(f"Aborting {log_msg}")
+                status = WorkflowStatusMessage.execution_aborted(workflow.execution_id, workflow.id_, workflow.name)
+            except Exception:
+                logger.exception(f"Failed {log_msg}")
+                status = WorkflowStatusMessage.execution_completed(workflow.execution_id, workflow.id_,
+                                                                   workflow.name)
+            else:
+                logger.info(f"Completed {log_msg}")
+                status = WorkflowStatusMessage.execution_completed(workflow.execution_id, workflow.id_,
+                                                                   workflow.name)
+            finally:
+                await self.publisher.publish(workflow.execution_id, workflow.id_, status)
+                stats = self.publisher.stats()
+                logger.info(f"Status updates sent by this worker so far: {stats['messages']} messages, "
+                            f"{stats['messages_per_second']:.1f} msg/s, {stats['bytes_per_second']:.1f} bytes/s")
+
+        finally:  # Clean up workflow-queue and any results that were too large to pass around
+            await self.redis.xack(stream=stream, group_name=static.REDIS_WORKFLOW_GROUP, id=id_)
+            await xdel(self.redis, stream=stream, id_=id_)
+            await result_store.delete_execution(workflow.execution_id)
+
+    @staticmethod
+    async def abort_flagged(redis: aioredis.Redis, executing: dict):
+        """ Aborts only the executions in this process that have been flagged for abort """
+        aborting = await redis.smembers(static.REDIS_ABORTING_WORKFLOWS, encoding="utf-8")
+        workers = [worker for execution_id, worker in list(executing.items()) if execution_id in aborting]
+        await asyncio.gather(*(worker.abort() for worker in workers), return_exceptions=True)
 
     @staticmethod
     async def shutdown():
@@ -147,95 +202,85 @@ class Worker:
     async def abort(self):
         logger.info(f"Aborting workflow: {self.workflow.name} ({self.workflow.id_}) as {self.workflow.execution_id}")
 
-        [task.cancel() for task in self.scheduling_tasks]
-        self.results_getter_task.cancel()
-        self.execution_task.cancel()
+        [task.cancel() for task in self.scheduling_tasks | self.parallel_tasks]
+        if self.results_getter_task is not None:
+            self.results_getter_task.cancel()
+        if self.execution_task is not None:
+            self.execution_task.cancel()
 
         # Try to cancel any outstanding actions
         msgs = [NodeStatusMessage.aborted_from_node(action, action.execution_id, started_at=action.started_at,
-                                                    parameters=(await self.dereference_params(action)))
+                                                    parameters=self.reported_params(action))
                 for action in self.in_process.values()]
-        message_tasks = [send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_, msg) for msg in
+        message_tasks = [self.publisher.publish(self.workflow.execution_id, self.workflow.id_, msg) for msg in
                          msgs]
         await asyncio.gather(*message_tasks, return_exceptions=True)
 
         logger.info("Canceling outstanding tasks...")
-        await asyncio.gather(*self.scheduling_tasks, *message_tasks, self.results_getter_task, self.execution_task,
+        await asyncio.gather(*self.scheduling_tasks, *self.parallel_tasks, *message_tasks,
+                             *(task for task in (self.results_getter_task, self.execution_task) if task is not None),
                              return_exceptions=True)
         logger.info(
             f"Successfully aborted workflow: {self.workflow.name} ({self.workflow.id_}) as {self.workflow.execution_id}")
 
-    async def cancel_helper(self, node, to_cancel):
-        children = set(self.workflow.successors(node))
-
-        for child in children:
-            if self.parent_map[child.id_] == 1:
-                to_cancel.append(child.id_)
-                self.cancelled.append(node.id_)
-                await self.cancel_helper(child, to_cancel)
-
-        return to_cancel
-
     async def cancel_subgraph(self, node):
         """
             Cancels the task related to the current node as well as the tasks related to every child of that node.
             Also removes them from the worker's internal in_process queue.
         """
-        # dependents = self.workflow.get_dependents(node)
         cancelled_tasks = set()
 
-        self.cancelled.append(node.id_)
-        to_cancel = await self.cancel_helper(node, [node.id_])
+        to_cancel = self.plan.prune_set(node.id_) if self.plan is not None else frozenset((node.id_,))
+        self.cancelled.update(to_cancel)
 
-        for task in self.scheduling_tasks:
-            for _, arg in getcoroutinelocals(task._coro).items():
-                if isinstance(arg, Node):
-                    if arg.id_ in to_cancel:
-                        self.in_process.pop(arg.id_)
-                        self.accumulator[arg.id_] = None
-                        self.cancelled.append(arg.id_)
-                        task.cancel()
-                        cancelled_tasks.add(task)
+        for node_id in to_cancel:
+            task = self.node_tasks.get(node_id)
+            if task is not None and not task.done():
+                self.in_process.pop(node_id, None)
+                self.accumulate(node_id, None)
+                task.cancel()
+                cancelled_tasks.add(task)
 
         await asyncio.gather(*cancelled_tasks, return_exceptions=True)
 
     async def execute_workflow(self):
         """
-            Do a simple BFS to visit and schedule each node in the workflow. We assume every node will run and thus
-            preemptively schedule them all. We will clean up any nodes that will not run due to conditions or triggers
+            Visit and schedule each node reachable from the start action in topological order. We assume every node
+            will run and thus preemptively schedule them all. We will clean up any nodes that will not run due to
+            conditions or triggers. The topology itself comes from a cached ExecutionPlan.
         """
-        visited = {self.start_action}
-        queue = deque([self.start_action])
+        self.plan = plan = await plan_cache.get_or_compile(self.workflow, self.start_action, self.redis)
+        nodes = [self.workflow.nodes[node_id] for node_id in plan.node_ids]
+        self.unconsumed = {node_id: plan.consumer_counts[i] for i, node_id in enumerate(plan.node_ids)}
         self.scheduling_tasks = set()
-        while queue:
-            node = queue.pop()
-            parents = {n.id_: n for n in self.workflow.predecessors(node)} if node is not self.start_action else {}
-            children = {n.id_: n for n in self.workflow.successors(node)}
-
-            for parent_id in parents:
-                # check if parent not a child of start action. If not, set accumulator value of invalid parent to None
-                if parents[parent_id] not in self.workflow.get_dependents(self.start_action):
-                    logger.info(
-                        f" WARNING! Node {parents[parent_id]} is not a child of the start action {self.start_action}. This node will not run.")
-                    self.accumulator[parent_id] = None
-
-                if node.id_ not in self.parent_map.keys():
-                    self.parent_map[node.id_] = 1
-                else:
-                    self.parent_map[node.id_] = self.parent_map[node.id_] + 1
-
+        self.node_tasks = {}
+
+        for i in plan.order:
+            for parent in plan.parents[i]:
+                # Parents that are not children of the start action will never run, so they are finished already
+                if not plan.reachable[parent] and nodes[parent].id_ not in self.accumulator:
+                    logger.info(f" WARNING! Node {nodes[parent]} is not a child of the start action "
+                                f"{self.start_action}. This node will not run.")
+                    self.accumulator[nodes[parent].id_] = None
+
+        for i in plan.order:
+            node = nodes[i]
+            parents = {nodes[parent].id_: nodes[parent] for parent in plan.parents[i]}
+            children = {nodes[child].id_: nodes[child] for child in plan.children[i]}
+
+            if parents:
+                self.parent_map[node.id_] = len(parents)
             self.in_process[node.id_] = node
+            self.unfinished_parents[node.id_] = plan.parent_counts[i]
 
             if isinstance(node, Action):
                 node.execution_id = self.workflow.execution_id  # the app needs this as a key for the redis queue
                 node.workflow_id = self.workflow.id_
 
-            self.scheduling_tasks.add(asyncio.create_task(self.schedule_node(node, parents, children)))
-
-            for child in sorted(children.values(), reverse=True):
-                if child not in visited:
-                    queue.appendleft(child)
-                    visited.add(child)
+            task = asyncio.create_task(self.schedule_node(node, parents, children))
+            task.add_done_callback(lambda _, node_id=node.id_: self.release_inputs(node_id))
+            self.scheduling_tasks.add(task)
+            self.node_tasks[node.id_] = task
 
         # Launch the results accumulation task and wait for all the results to come in
         self.results_getter_task = asyncio.create_task(self.get_action_results())
@@ -251,7 +296,7 @@ class Worker:
         """
         logger.debug(f"Attempting evaluation of: {condition.label}-{self.workflow.execution_id}")
         try:
-            child_id = condition(parents, children, self.accumulator)
+            child_id = condition(parents, children, await self.parent_results(parents))
             selected_node = children.pop(child_id)
             status = NodeStatusMessage.success_from_node(condition, self.workflow.execution_id, selected_node.name,
                                                          parameters={}, started_at=condition.started_at)
@@ -264,14 +309,7 @@ class Worker:
 
         except ConditionException as e:
             logger.exception(f"Worker received error for {condition.name}-{self.workflow.execution_id}")
-
-            aeval = Interpreter()
-            aeval(condition.conditional)
-            if len(aeval.error) > 0:
-                error_tuple = (aeval.error[0]).get_error()
-                ret = error_tuple[0] + "(): " + error_tuple[1]
-
-            status = NodeStatusMessage.failure_from_node(condition, self.workflow.execution_id, result=ret,
+            status = NodeStatusMessage.failure_from_node(condition, self.workflow.execution_id, result=str(e),
                                                          parameters={}, started_at=condition.started_at)
         except KeyError as e:
             logger.exception(f"Worker received error for {condition.name}-{self.workflow.execution_id}")
@@ -286,68 +324,100 @@ class Worker:
         # Send the status message through redis to ensure get_action_results completes it correctly
         await self.redis.xadd(self.results_stream, {status.execution_id: message_dumps(status)})
 
-    async def execute_parallel_action(self, node: Action, parameters):
-        schedule_tasks = []
-        actions = set()
-        action_to_parallel_map = {}
-        results = []
-        parallel_parameter = [p for p in node.parameters if p.parallelized]
-        unparallelized = list(set(node.parameters) - set(parallel_parameter))
-
-        for i, value in enumerate(parallel_parameter[0].value):
-            new_value = [value]
-            # params = node.append(array[i])
+    async def execute_parallel_action(self, node: Action, params, parameters):
+        """
+            Splits the parallelized parameter of the dereferenced params into shards of WORKER_PARALLEL_SHARD_SIZE
+            values and runs each shard as its own action, with at most WORKER_MAX_PARALLEL_SHARDS of them in flight at
+            once. The node fails with each failed shard's error if any shard fails. The node's status reports parameters.
+        """
+        shard_size = max(config.get_int("WORKER_PARALLEL_SHARD_SIZE", 1), 1)
+        in_flight = asyncio.Semaphore(max(config.get_int("WORKER_MAX_PARALLEL_SHARDS", 100), 1))
+        shards = []
+        parallel_parameter = [p for p in params if p.parallelized]
+        unparallelized = list(set(params) - set(parallel_parameter))
+        values = list(await result_store.check_out(parallel_parameter[0].value))
+
+        for i in range(0, len(values), shard_size):
+            new_value = values[i:i + shard_size]
+            shard_label = new_value[0] if len(new_value) == 1 else f"{i}-{i + len(new_value) - 1}"
             params = []
             params.extend(unparallelized)
             params.append(Parameter(parallel_parameter[0].name, value=new_value,
                                     variant=ParameterVariant.STATIC_VALUE))
-            # params.append([parameter])
             act = Action(node.name, node.position, node.
-                         app_name, node.app_version, f"{node.name}:shard_{value}",
+                         app_name, node.app_version, f"{node.name}:shard_{shard_label}",
                          node.priority, parameters=params, execution_id=node.execution_id)
-            actions.add(act.id_)
-            schedule_tasks.append(asyncio.create_task(self.schedule_node(act, {}, {})))
-            action_to_parallel_map[act.id_] = new_value
+
+            # Wait for a free slot before sending the next shard so we don't flood the app's stream
+            await in_flight.acquire()
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(lambda _: in_flight.release())
+            self.parallel_accumulator[act.id_] = future
             self.parallel_in_process[act.id_] = act
+            shards.append((act, future))
+            try:
+                await self.schedule_node(act, {}, {})
+            finally:
+                # Shards have no parents or children, so there is nothing left to track for them once scheduled
+                self.unfinished_parents.pop(act.id_, None)
+                self.ready_events.pop(act.id_, None)
 
-        # self.in_process.pop(node.id_)
-        exceptions = await asyncio.gather(*schedule_tasks, return_exceptions=True)
+        try:
+            outcomes = await asyncio.gather(*(future for _, future in shards))
+        finally:
+            for act, _ in shards:  # An aborted execution leaves shards behind
+                self.parallel_accumulator.pop(act.id_, None)
+                self.parallel_in_process.pop(act.id_, None)
 
-        while not actions.intersection(set(self.parallel_accumulator.keys())) == actions:
-            await asyncio.sleep(0)
+        results = []
+        errors = {}
+        for (act, _), (succeeded, contents) in zip(shards, outcomes):
+            if not succeeded:
+                errors[act.label] = contents
+                continue
 
-        for a in actions:
-            contents = self.parallel_accumulator[a]
-            for individual in contents:
-                results.append(individual)
+            contents = await result_store.check_out(contents)
+            if isinstance(contents, list):
+                results.extend(contents)
+            elif contents is not None:
+                results.append(contents)
+
+        if len(errors) > 0:
+            # Reported like any other failed action, so the worker records it and cancels the node's children
+            status = NodeStatusMessage.failure_from_node(node, self.workflow.execution_id, errors,
+                                                         parameters=parameters, started_at=node.started_at)
+        else:
+            results = await result_store.check_in(results, self.workflow.execution_id, node.id_)
+            self.accumulate(node.id_, results)
+            status = NodeStatusMessage.success_from_node(node, self.workflow.execution_id, results,
+                                                         parameters=parameters, started_at=node.started_at)
 
-        self.accumulator[node.id_] = results
+        await self.redis.xadd(self.results_stream, {status.execution_id: message_dumps(status)})
 
-        # self.accumulator[node.id_] = [self.parallel_accumulator[a] for a in actions]
-        status = NodeStatusMessage.success_from_node(node, self.workflow.execution_id, self.accumulator[node.id_],
-                                                     parameters=parameters, started_at=node.started_at)
+    async def parent_results(self, parents):
+        """ The results of the given parents, with any that were too large to pass around fetched from the store """
+        return {node.id_: await result_store.check_out(self.accumulator[node.id_]) for node in parents.values()
+                if node.id_ in self.accumulator}
 
-        await self.redis.xadd(self.results_stream, {status.execution_id: message_dumps(status)})
+    def finish_shard(self, shard_id, result, succeeded=True):
+        """ Hands the result, or error, of a shard back to the execute_parallel_action waiting on it """
+        future = self.parallel_accumulator.pop(shard_id, None)
+        if future is not None and not future.done():
+            future.set_result((succeeded, result))
 
     async def execute_transform(self, transform, parents):
         """ Execute an transform and ship its result """
         logger.debug(f"Attempting evaluation of: {transform.label}-{self.workflow.execution_id}")
         try:
-            result = transform(parents, self.accumulator)  # run transform on parent's result
+            result = transform(parents, await self.parent_results(parents))  # run transform on parent's result
+            result = await result_store.check_in(result, self.workflow.execution_id, transform.id_)
             status = NodeStatusMessage.success_from_node(transform, self.workflow.execution_id, result, parameters={},
                                                          started_at=transform.started_at)
             logger.info(f"Transform {transform.label}-succeeded with result: {result}")
 
         except TransformException as e:
             logger.exception(f"Worker received error for {transform.name}-{self.workflow.execution_id}")
-
-            aeval = Interpreter()
-            aeval(transform.transform)
-            if len(aeval.error) > 0:
-                error_tuple = (aeval.error[0]).get_error()
-                ret = error_tuple[0] + "(): " + error_tuple[1]
-
-            status = NodeStatusMessage.failure_from_node(transform, self.workflow.execution_id, result=ret,
+            status = NodeStatusMessage.failure_from_node(transform, self.workflow.execution_id, result=str(e),
                                                          started_at=transform.started_at,
                                                          parameters={})
 
@@ -365,51 +435,59 @@ class Worker:
             result = trigger(trigger_data)
             tmsg = NodeStatusMessage.success_from_node(trigger, self.workflow.execution_id, result, parameters={},
                                                        started_at=trigger.started_at)
-            await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                     tmsg)
-            await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                     WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
-                                                                               self.workflow.id_,
-                                                                               self.workflow.name,
-                                                                               action_name=trigger.name,
-                                                                               app_name=trigger.app_name,
-                                                                               label=trigger.label))
-            self.accumulator[trigger.id_] = result
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                         tmsg)
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                         WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
+                                                                                   self.workflow.id_,
+                                                                                   self.workflow.name,
+                                                                                   action_name=trigger.name,
+                                                                                   app_name=trigger.app_name,
+                                                                                   label=trigger.label))
+            self.accumulate(trigger.id_, result)
             self.in_process.pop(trigger.id_)
 
         # TODO: can/should a trigger actually raise any exceptions?
         except Exception as e:
             logger.exception(f"Worker received error for {trigger.name}-{self.workflow.execution_id}")
-            await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                     NodeStatusMessage.failure_from_node(trigger, self.workflow.execution_id,
-                                                                         started_at=trigger.started_at,
-                                                                         result=repr(e), parameters={}))
-            await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                     WorkflowStatusMessage.execution_completed(self.workflow.execution_id,
-                                                                               self.workflow.id_,
-                                                                               self.workflow.name,
-                                                                               action_name=trigger.name,
-                                                                               app_name=trigger.app_name,
-                                                                               label=trigger.label))
-
-    async def get_globals(self):
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                         NodeStatusMessage.failure_from_node(trigger, self.workflow.execution_id,
+                                                                             started_at=trigger.started_at,
+                                                                             result=repr(e), parameters={}))
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                         WorkflowStatusMessage.execution_completed(self.workflow.execution_id,
+                                                                                   self.workflow.id_,
+                                                                                   self.workflow.name,
+                                                                                   action_name=trigger.name,
+                                                                                   app_name=trigger.app_name,
+                                                                                   label=trigger.label))
+
+    async def get_globals(self, ids):
         url = config.API_URI.rstrip('/') + '/walkoff/api'
-        headers, self.token = await get_walkoff_auth_header(self.session, self.token)
+        headers = await walkoff_auth.get_header(self.session)
         # saving decryption for app-level
-        payload = {'to_decrypt': 'false'}
+        payload = [('to_decrypt', 'false')] + [('ids', id_) for id_ in ids]
         async with self.session.get(url + "/globals", headers=headers, params=payload) as resp:
             globals_ = await resp.json(loads=workflow_loads)
             logger.debug(f"Got globals: {globals_}")
             return {g.id_: g for g in globals_}
 
+    @staticmethod
+    def reported_params(node):
+        """ The parameters to report in a node's status, as they are set in the workflow rather than dereferenced """
+        return {param.name: param.value for param in getattr(node, "parameters", [])}
+
     async def dereference_params(self, action: Action):
-        param_ret = {}
+        """
+            Returns copies of the action's parameters with the values of action results, workflow variables, and
+            globals in place of their ids. The action keeps the ids, so it doesn't hold on to the results it was sent.
+        """
+        params = [copy.copy(param) for param in action.parameters]
 
-        globals_needed = any(param.variant == ParameterVariant.GLOBAL for param in action.parameters)
-        global_vars = await self.get_globals() if globals_needed else []
+        global_ids = [param.value for param in params if param.variant == ParameterVariant.GLOBAL]
+        global_vars = await globals_cache.get(self.redis, global_ids, self.get_globals) if global_ids else {}
 
-        for param in action.parameters:
-            param_ret[param.name] = param.value
+        for param in params:
             if param.variant == ParameterVariant.STATIC_VALUE:
                 continue
 
@@ -429,16 +507,57 @@ class Worker:
                 logger.error(f"Unable to dereference parameter:{param} for action:{action}")
                 break
 
-        return param_ret
+        return params
+
+    def accumulate(self, node_id, result):
+        """
+            Stores the result of a node and wakes any children whose parents have now all finished. Only the first
+            result stored for a node counts towards its children's readiness.
+        """
+        already_finished = node_id in self.accumulator
+        # A result nothing is left to read is only needed for its status, which has its own copy
+        self.accumulator[node_id] = result if self.unconsumed.get(node_id, 1) > 0 else None
+
+        if already_finished or node_id not in self.workflow.nodes:
+            return
+
+        for child in self.workflow.successors(self.workflow.nodes[node_id]):
+            remaining = self.unfinished_parents.get(child.id_, 0)
+            if remaining > 0:
+                self.unfinished_parents[child.id_] = remaining - 1
+                if remaining == 1:
+                    self.ready_events.setdefault(child.id_, asyncio.Event()).set()
+
+    def release_inputs(self, node_id):
+        """
+            Called once a node has been sent off, evaluated, or cancelled, and so has no more use for the results it
+            reads. Each result it was the last reader of is dropped from the accumulator, keeping its entry so that
+            children still see its node as finished.
+        """
+        i = self.plan.index.get(node_id) if self.plan is not None else None
+        if i is None:
+            return
+
+        for producer in self.plan.inputs[i]:
+            producer_id = self.plan.node_ids[producer]
+            self.unconsumed[producer_id] -= 1
+            if self.unconsumed[producer_id] < 1 and producer_id in self.accumulator:
+                self.accumulator[producer_id] = None
+
+    async def wait_for_parents(self, node, parents):
+        """ Suspends until every parent of the node has stored a result in the accumulator """
+        if node.id_ not in self.unfinished_parents:
+            self.unfinished_parents[node.id_] = sum(1 for parent_id in parents if parent_id not in self.accumulator)
+
+        if self.unfinished_parents[node.id_] > 0:
+            logger.debug(f"Node {node.label}-{self.workflow.execution_id} waiting for parents: {parents.values()}.")
+            await self.ready_events.setdefault(node.id_, asyncio.Event()).wait()
 
     async def schedule_node(self, node, parents, children):
         """ Waits until all dependencies of an action are met and then schedules the action """
         logger.info(f"Scheduling {node.label}-{self.workflow.execution_id}...")
 
-        while not all(parent.id_ in self.accumulator for parent in parents.values()):
-            logger.debug(f"Node {node.label}-{self.workflow.execution_id} waiting for parents: {parents.values()}. "
-                         f"Accumulator: {self.accumulator}")
-            await asyncio.sleep(1)
+        await self.wait_for_parents(node, parents)
 
         logger.info(f"{node.label}-{self.workflow.execution_id} ready to execute.")
 
@@ -455,48 +574,68 @@ class Worker:
         if isinstance(node, Action):
             if node.parallelized:
                 node.started_at = datetime.datetime.now()
-                params = await self.dereference_params(node)
-                await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                         NodeStatusMessage.executing_from_node(node, self.workflow.execution_id,
-                                                                               started_at=node.started_at,
-                                                                               parameters=params))
+                params = self.reported_params(node)
+                await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                             NodeStatusMessage.executing_from_node(node, self.workflow.execution_id,
+                                                                                   started_at=node.started_at,
+                                                                                   parameters=params))
 
-                await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                         WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
-                                                                                   self.workflow.id_,
-                                                                                   self.workflow.name,
-                                                                                   action_name=node.name,
-                                                                                   app_name=node.app_name,
-                                                                                   label=node.label))
-                asyncio.create_task(self.execute_parallel_action(node, params))
+                await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                             WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
+                                                                                       self.workflow.id_,
+                                                                                       self.workflow.name,
+                                                                                       action_name=node.name,
+                                                                                       app_name=node.app_name,
+                                                                                       label=node.label))
+                self.parallel_tasks.add(asyncio.create_task(self.execute_parallel_action(
+                    node, await self.dereference_params(node), params)))
 
             else:
                 group = f"{node.app_name}:{node.app_version}"
-                stream = f"{node.execution_id}:{group}"
-                try:
-                    # The stream doesn't exist so lets create that and the app group
-                    if len(await self.redis.keys(stream)) < 1:
+                stream = action_stream(node.execution_id, group)
+                if stream not in self.streams and stream not in shared_streams:
+                    try:
+                        # Creates the stream if needed, this fails harmlessly if the app group already exists
                         await self.redis.xgroup_create(stream, group, mkstream=True)
+                    except aioredis.ReplyError as e:
+                        logger.debug(f"Issue creating redis stream {e!r}")
 
-                    # The stream exists but the group does not so lets just make the app group
-                    if len(await self.redis.xinfo_groups(stream)) < 1:
-                        await self.redis.xgroup_create(stream, group)
+                    # Keep track of these for clean up later, and so the apps and umpire can find them
+                    await register_stream(self.redis, stream, group)
+                    if split_action_stream(stream)[0] is None:
+                        shared_streams.add(stream)  # Shared app streams outlive the execution
+                    else:
+                        self.streams.add(stream)
 
-                    # Keep track of these for clean up later
-                    self.streams.add(stream)
+                params = self.reported_params(node)
 
-                except aioredis.ReplyError as e:
-                    logger.debug(f"Issue creating redis stream {e!r}")
+                node.started_at = datetime.datetime.now()
+                await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                             NodeStatusMessage.executing_from_node(node, self.workflow.execution_id,
+                                                                                   started_at=node.started_at,
+                                                                                   parameters=params))
 
-                params = await self.dereference_params(node)
+                await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                             WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
+                                                                                       self.workflow.id_,
+                                                                                       self.workflow.name,
+                                                                                       action_name=node.name,
+                                                                                       app_name=node.app_name,
+                                                                                       label=node.label))
 
-                node.started_at = datetime.datetime.now()
-                await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
+                # The app gets a copy with the parameters' values, the node itself keeps referring to them by id
+                action = copy.copy(node)
+                action.parameters = await self.dereference_params(node)
+                await self.redis.xadd(stream, {node.execution_id: workflow_dumps(action)})
+
+        elif isinstance(node, Condition):
+            node.started_at = datetime.datetime.now()
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
                                          NodeStatusMessage.executing_from_node(node, self.workflow.execution_id,
                                                                                started_at=node.started_at,
-                                                                               parameters=params))
+                                                                               parameters={}))
 
-                await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
                                          WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
                                                                                    self.workflow.id_,
                                                                                    self.workflow.name,
@@ -504,39 +643,22 @@ class Worker:
                                                                                    app_name=node.app_name,
                                                                                    label=node.label))
 
-                await self.redis.xadd(stream, {node.execution_id: workflow_dumps(node)})
-
-        elif isinstance(node, Condition):
-            node.started_at = datetime.datetime.now()
-            await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                     NodeStatusMessage.executing_from_node(node, self.workflow.execution_id,
-                                                                           started_at=node.started_at,
-                                                                           parameters={}))
-
-            await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                     WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
-                                                                               self.workflow.id_,
-                                                                               self.workflow.name,
-                                                                               action_name=node.name,
-                                                                               app_name=node.app_name,
-                                                                               label=node.label))
-
             await self.evaluate_condition(node, parents, children)
 
         elif isinstance(node, Transform):
             node.started_at = datetime.datetime.now()
-            await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                     NodeStatusMessage.executing_from_node(node, self.workflow.execution_id,
-                                                                           started_at=node.started_at,
-                                                                           parameters={}))
-
-            await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                     WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
-                                                                               self.workflow.id_,
-                                                                               self.workflow.name,
-                                                                               action_name=node.name,
-                                                                               app_name=node.app_name,
-                                                                               label=node.label))
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                         NodeStatusMessage.executing_from_node(node, self.workflow.execution_id,
+                                                                               started_at=node.started_at,
+                                                                               parameters={}))
+
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                         WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
+                                                                                   self.workflow.id_,
+                                                                                   self.workflow.name,
+                                                                                   action_name=node.name,
+                                                                                   app_name=node.app_name,
+                                                                                   label=node.label))
 
             await self.execute_transform(node, parents)
 
@@ -554,17 +676,17 @@ class Worker:
                                 f"with {msg}")
 
                     node.started_at = datetime.datetime.now()
-                    await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                             NodeStatusMessage.executing_from_node(node, self.workflow.execution_id,
-                                                                                   started_at=node.started_at))
-
-                    await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_,
-                                             WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
-                                                                                       self.workflow.id_,
-                                                                                       self.workflow.name,
-                                                                                       action_name=node.name,
-                                                                                       app_name=node.app_name,
-                                                                                       label=node.label))
+                    await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                                 NodeStatusMessage.executing_from_node(node, self.workflow.execution_id,
+                                                                                       started_at=node.started_at))
+
+                    await self.publisher.publish(self.workflow.execution_id, self.workflow.id_,
+                                                 WorkflowStatusMessage.execution_continued(self.workflow.execution_id,
+                                                                                           self.workflow.id_,
+                                                                                           self.workflow.name,
+                                                                                           action_name=node.name,
+                                                                                           app_name=node.app_name,
+                                                                                           label=node.label))
                     execution_id_trigger_message, stream, id_ = deref_stream_message(msg)
                     execution_id, trigger_message = execution_id_trigger_message
                     trigger_message = message_loads(trigger_message)
@@ -585,11 +707,16 @@ class Worker:
     async def get_action_results(self):
         """ Continuously monitors the results queue until all scheduled actions have been completed """
 
+        batch_size = config.get_int("WORKER_RESULTS_BATCH_SIZE", 100)
+        block = config.get_int("WORKER_RESULTS_TIMEOUT", 1000)
+
         while len(self.in_process) > 0 or len(self.parallel_in_process) > 0:
             try:
+                # Block for a while so we can notice if there's nothing left in process without a message arriving
                 with await self.redis as redis:
-                    msg = await redis.xread_group(static.REDIS_ACTION_RESULTS_GROUP, static.CONTAINER_ID,
-                                                  streams=[self.results_stream], count=1, latest_ids=['>'])
+                    msgs = await redis.xread_group(static.REDIS_ACTION_RESULTS_GROUP, static.CONTAINER_ID,
+                                                   streams=[self.results_stream], count=batch_size, timeout=block,
+                                                   latest_ids=['>'])
 
             except aioredis.errors.ReplyError:
                 logger.debug(f"Stream {self.workflow.execution_id} doesn't exist. Attempting to create it...")
@@ -598,77 +725,104 @@ class Worker:
                 logger.debug(f"Created stream {self.results_stream}.")
                 continue
 
-            # Dereference the redis stream message and load the status message
-            execution_id_node_message, stream, id_ = deref_stream_message(msg)
-            execution_id, node_message = execution_id_node_message
-            node_message = message_loads(node_message)
+            if len(msgs) < 1:
+                continue
 
-            try:
-                params = await self.dereference_params(self.workflow.nodes[node_message.node_id])
-                node_message.parameters = params
-            except:
-                node_message.parameters = {}
-
-            # Ensure that the received NodeStatusMessage is for an action we launched
-            if node_message.execution_id == self.workflow.execution_id and node_message.node_id in self.in_process:
-                if node_message.status == StatusEnum.EXECUTING:
-                    logger.info(f"App started execution of: {node_message.label}-{node_message.execution_id}")
-
-                elif node_message.status == StatusEnum.SUCCESS:
-                    self.accumulator[node_message.node_id] = node_message.result
-                    logger.info(f"Worker received result for: {node_message.label}-{node_message.execution_id}")
-
-                elif node_message.status == StatusEnum.FAILURE:
-                    self.accumulator[node_message.node_id] = node_message.result
-                    await self.cancel_subgraph(self.workflow.nodes[node_message.node_id])  # kill the children!
-                    logger.info(f"Worker received error \"{node_message.result}\" for: {node_message.label}-"
-                                f"{node_message.execution_id}")
-
-                else:
-                    logger.error(f"Unknown message status received: {node_message}")
-                    node_message = None
-
-                await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_, node_message)
-
-            elif node_message.execution_id == self.workflow.execution_id and node_message.node_id in self.parallel_in_process:
-                if node_message.status == StatusEnum.EXECUTING:
-                    logger.debug(f"App started parallel execution of: {node_message.label}-{node_message.execution_id}")
-
-                elif node_message.status == StatusEnum.SUCCESS:
-                    self.parallel_accumulator[node_message.node_id] = node_message.result
-                    logger.debug(
-                        f"PARALLEL Worker received result for: {node_message.label}-{node_message.execution_id}")
-
-                elif node_message.status == StatusEnum.FAILURE:
-                    # self.parallel_accumulator[node_message.node_id] = node_message.result
-                    self.parallel_accumulator[node_message.node_id] = None
-                    logger.debug(f"PARALLEL Worker received error \"{node_message.result}\" for: {node_message.label}-"
-                                 f"{node_message.execution_id}")
-
-                else:
-                    logger.error(f"Unknown message status received: {node_message}")
-                    node_message = None
-
-                node_message.name = node_message.label
-                await send_status_update(self.redis, self.workflow.execution_id, self.workflow.id_, node_message)
-            else:
-                logger.error(f"Message received for unknown execution: {node_message}")
-
-            # Clean up the redis stream and our in process queue
-            if node_message.status != StatusEnum.EXECUTING and node_message.node_id in self.parallel_in_process:
-                self.parallel_in_process.pop(node_message.node_id, None)
-            elif node_message.status != StatusEnum.EXECUTING:
-                self.in_process.pop(node_message.node_id, None)
-            await self.redis.xack(stream=stream, group_name=static.REDIS_ACTION_RESULTS_GROUP, id=id_)
-            await xdel(self.redis, stream=stream, id_=id_)
+            for _, _, execution_id_node_message in msgs:
+                execution_id, node_message = execution_id_node_message.popitem()
+                await self.handle_action_result(message_loads(node_message))
+
+            # Clean up the whole batch from the redis stream at once
+            await xack_xdel(self.redis, self.results_stream, static.REDIS_ACTION_RESULTS_GROUP,
+                            [id_ for _, id_, _ in msgs])
 
         # Remove the finished results stream and group
         await self.redis.delete(self.results_stream)
         pipe: aioredis.commands.Pipeline = self.redis.pipeline()
-        futs = [pipe.delete(stream) for stream in self.streams]
-        results = await pipe.execute()
+        for stream in self.streams:
+            pipe.delete(stream)
+        await pipe.execute()
+        await unregister_streams(self.redis, self.streams)
         self.streams = set()
 
+    async def join_partials(self, node_id):
+        """ Merges a streamed action's partial results into one dict if they are all dicts, or else lists them """
+        partials = self.partials.pop(node_id, {})
+        chunks = [await result_store.check_out(partials[index]) for index in sorted(partials)]
+        if len(chunks) > 0 and all(isinstance(chunk, dict) for chunk in chunks):
+            result = {k: v for chunk in chunks for k, v in chunk.items()}
+        else:
+            result = chunks
+        return await result_store.check_in(result, self.workflow.execution_id, node_id)
+
+    async def handle_action_result(self, node_message):
+        """ Records a NodeStatusMessage read from the results stream and forwards it on as a status update """
+        try:
+            node_message.parameters = self.reported_params(self.workflow.nodes[node_message.node_id])
+        except:
+            node_message.parameters = {}
+
+        # Apps don't hold on to the partial results a streamed action sends, so put them together as its result here
+        if node_message.status == StatusEnum.EXECUTING and node_message.partial is not None:
+            self.partials.setdefault(node_message.node_id, {})[node_message.partial] = node_message.result
+        elif node_message.status == StatusEnum.SUCCESS and node_message.partial is not None:
+            node_message.result = await self.join_partials(node_message.node_id)
+        else:
+            self.partials.pop(node_message.node_id, None)
+
+        # Ensure that the received NodeStatusMessage is for an action we launched
+        if node_message.execution_id == self.workflow.execution_id and node_message.node_id in self.in_process:
+            if node_message.status == StatusEnum.EXECUTING and node_message.partial is not None:
+                logger.debug(f"Worker received partial result for: {node_message.label}-{node_message.execution_id}")
+
+            elif node_message.status == StatusEnum.EXECUTING:
+                logger.info(f"App started execution of: {node_message.label}-{node_message.execution_id}")
+
+            elif node_message.status == StatusEnum.SUCCESS:
+                self.accumulate(node_message.node_id, node_message.result)
+                logger.info(f"Worker received result for: {node_message.label}-{node_message.execution_id}")
+
+            elif node_message.status == StatusEnum.FAILURE:
+                self.accumulate(node_message.node_id, node_message.result)
+                await self.cancel_subgraph(self.workflow.nodes[node_message.node_id])  # kill the children!
+                logger.info(f"Worker received error \"{node_message.result}\" for: {node_message.label}-"
+                            f"{node_message.execution_id}")
+
+            else:
+                logger.error(f"Unknown message status received: {node_message}")
+                node_message = None
+
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_, node_message)
+
+        elif node_message.execution_id == self.workflow.execution_id and node_message.node_id in self.parallel_in_process:
+            if node_message.status == StatusEnum.EXECUTING:
+                logger.debug(f"App started parallel execution of: {node_message.label}-{node_message.execution_id}")
+
+            elif node_message.status == StatusEnum.SUCCESS:
+                self.finish_shard(node_message.node_id, node_message.result)
+                logger.debug(
+                    f"PARALLEL Worker received result for: {node_message.label}-{node_message.execution_id}")
+
+            elif node_message.status == StatusEnum.FAILURE:
+                self.finish_shard(node_message.node_id, node_message.result, succeeded=False)
+                logger.debug(f"PARALLEL Worker received error \"{node_message.result}\" for: {node_message.label}-"
+                             f"{node_message.execution_id}")
+
+            else:
+                logger.error(f"Unknown message status received: {node_message}")
+                node_message = None
+
+            node_message.name = node_message.label
+            await self.publisher.publish(self.workflow.execution_id, self.workflow.id_, node_message)
+        else:
+            logger.error(f"Message received for unknown execution: {node_message}")
+
+        # Clean up our in process queue
+        if node_message.status != StatusEnum.EXECUTING and node_message.node_id in self.parallel_in_process:
+            self.parallel_in_process.pop(node_message.node_id, None)
+        elif node_message.status != StatusEnum.EXECUTING:
+            self.in_process.pop(node_message.node_id, None)
+
 
 if __name__ == "__main__":
     import argparse